@@ -0,0 +1,23 @@
+"""Access control for operator-only routes: bulk import/export and /metrics.
+
+They answer only requests bearing ADMIN_TOKEN (`Authorization: Bearer
+<token>`); with no ADMIN_TOKEN configured they don't exist at all (404), so
+a deployment has to opt in to exposing them.
+"""
+
+import hmac
+
+from flask import abort, current_app, request
+
+
+def require_admin():
+    """Abort unless the request carries the configured ADMIN_TOKEN; usable
+    as a before_request hook or called at the top of a view."""
+
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        abort(404)
+
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+        abort(401)
@@ -0,0 +1,177 @@
+"""Versioned JSON API for users, posts and tags.
+
+    GET /api/v1/<resource>?fields=id,name&after=<id>&limit=100
+    GET /api/v1/<resource>?ids=1,2,3
+    GET /api/v1/<resource>/<id>?fields=...
+
+Only the requested columns are selected, rows are streamed from the database
+and serialized straight from result tuples (no per-row dicts), and listings
+are sent as a chunked response, so a large page is never held in memory.
+"""
+
+import json
+
+from flask import (
+    Blueprint, Response, abort, jsonify, request, stream_with_context)
+from werkzeug.exceptions import HTTPException
+
+from models import db, Post, Tag, User
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+RESOURCES = {
+    'users': (User, ('id', 'first_name', 'last_name', 'image_url',
+                     'post_count', 'updated_at')),
+    'posts': (Post, ('id', 'title', 'content', 'created_at', 'user_id',
+                     'updated_at')),
+    'tags': (Tag, ('id', 'name', 'post_count', 'updated_at')),
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+MAX_IDS = 1000
+
+# rows per database fetch / response chunk
+CHUNK_SIZE = 500
+
+
+def _encode_value(value, _encode=json.JSONEncoder(ensure_ascii=False).encode):
+    if hasattr(value, 'isoformat'):
+        return '"' + value.isoformat() + '"'
+    return _encode(value)
+
+
+def row_encoder(fields):
+    """Return a function turning a result row into a JSON object string.
+
+    Key prefixes are encoded once up front; each row then costs one string
+    join of its encoded values.
+    """
+
+    prefixes = [
+        ('{' if i == 0 else ',') + json.dumps(field) + ':'
+        for i, field in enumerate(fields)
+    ]
+
+    def encode(row):
+        return ''.join(
+            prefix + _encode_value(value)
+            for prefix, value in zip(prefixes, row)
+        ) + '}'
+
+    return encode
+
+
+def _parse_fields(allowed):
+    """Requested fields (always including id), or every allowed field."""
+
+    text = request.args.get('fields')
+    if not text:
+        return allowed
+
+    fields = ['id']
+    for field in text.split(','):
+        field = field.strip()
+        if field not in allowed:
+            abort(400, f"Unknown field: {field}")
+        if field not in fields:
+            fields.append(field)
+    return tuple(fields)
+
+
+def _parse_ids():
+    text = request.args.get('ids')
+    if text is None:
+        return None
+
+    try:
+        ids = [int(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        abort(400, "ids must be a comma-separated list of integers")
+
+    if len(ids) > MAX_IDS:
+        abort(400, f"At most {MAX_IDS} ids per request")
+    return ids
+
+
+def _resource(name):
+    if name not in RESOURCES:
+        abort(404, f"Unknown resource: {name}")
+    return RESOURCES[name]
+
+
+@bp.errorhandler(HTTPException)
+def api_error(error):
+    """Answer API errors with JSON instead of HTML"""
+
+    return jsonify(error=error.description), error.code
+
+
+@bp.get('/<resource>')
+def list_resource(resource):
+    """Stream a page (or an ?ids= batch) of a resource as JSON"""
+
+    model, allowed = _resource(resource)
+    fields = _parse_fields(allowed)
+    ids = _parse_ids()
+    after = request.args.get('after', type=int)
+    limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1),
+                MAX_LIMIT)
+
+    query = db.select(*(getattr(model, field) for field in fields))
+
+    if ids is not None:
+        query = query.where(model.id.in_(ids))
+    else:
+        if after is not None:
+            query = query.where(model.id > after)
+        # one extra row says whether there is a next page
+        query = query.limit(limit + 1)
+
+    query = query.order_by(model.id).execution_options(yield_per=CHUNK_SIZE)
+    encode = row_encoder(fields)
+    paged = ids is None
+
+    def generate():
+        yield '{"data":['
+
+        sent = 0
+        last_id = None
+        more = False
+
+        for partition in db.session.execute(query).partitions():
+            if paged and sent + len(partition) > limit:
+                partition = partition[:limit - sent]
+                more = True
+
+            if partition:
+                yield (',' if sent else '') + ','.join(
+                    encode(row) for row in partition)
+                sent += len(partition)
+                last_id = partition[-1][0]
+
+        next_cursor = last_id if more else None
+        yield '],"next":' + json.dumps(next_cursor) + '}'
+
+    return Response(
+        stream_with_context(generate()), mimetype='application/json')
+
+
+@bp.get('/<resource>/<int:item_id>')
+def show_resource(resource, item_id):
+    """One item of a resource as JSON"""
+
+    model, allowed = _resource(resource)
+    fields = _parse_fields(allowed)
+
+    row = db.session.execute(
+        db.select(*(getattr(model, field) for field in fields))
+        .where(model.id == item_id)
+    ).first()
+
+    if row is None:
+        abort(404, f"No {resource} with id {item_id}")
+
+    return Response(
+        '{"data":' + row_encoder(fields)(row) + '}',
+        mimetype='application/json')
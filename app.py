@@ -2,55 +2,176 @@
 
 import os
 
-from flask import Flask, request, redirect, render_template, flash
-from flask_debugtoolbar import DebugToolbarExtension
-
-from models import db, connect_db, Post, Tag, User
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
-    "DATABASE_URL", 'postgresql:///blogly')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = True
-
-connect_db(app)
-print('db:', db)
-
-app.config['SECRET_KEY'] = "SECRET!"
-debug = DebugToolbarExtension(app)
-app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
-
-print('This is db.create_all()')
-print(db.create_all())
-
-@app.get("/")
+from flask import (
+    Blueprint, Flask, abort, current_app, request, redirect, render_template,
+    flash)
+
+import api
+import assets
+import bulk
+import feeds
+from cache import page_cache
+from commands import blogly_cli
+from compression import compression
+from config import CONFIGS
+from conditional import make_etag, not_modified, page_validators, with_validators
+from models import db, connect_db, is_blank, touch, Post, PostTag, Tag, User
+from instrumentation import instrumentation
+from loading import load_options
+from pagination import (
+    format_count_cursor, format_time_cursor, keyset_paginate,
+    parse_count_cursor, parse_time_cursor)
+from purge import has_more_posts_than, purge_user_in_background
+from query_audit import query_audit
+from replicas import replicas
+from search import (
+    index_post, search_posts, unindex_post, unindex_user_posts)
+from tagging import (
+    invalid_tag_names, parse_tag_names, resolve_tag_ids, set_post_tags,
+    tag_cache)
+from template_cache import template_cache
+from timeline import TimelineEntry, latest_posts, timeline
+
+bp = Blueprint('blogly', __name__)
+
+
+def create_app(profile=None):
+    """Build the Blogly app for a named config profile (see config.py)."""
+
+    if profile is None:
+        profile = os.environ.get('BLOGLY_CONFIG', 'development')
+
+    app = Flask(__name__)
+    app.config.from_object(CONFIGS[profile])
+
+    connect_db(app)
+    page_cache.init_app(app)
+    replicas.init_app(app)
+    page_cache.replica_lag = replicas.current_lag
+    instrumentation.init_app(app)
+    query_audit.init_app(app)
+    timeline.init_app(app)
+    assets.static_assets.init_app(app)
+    compression.init_app(app)
+
+    if app.config['DEBUG_TOOLBAR']:
+        # only development needs the toolbar installed
+        from flask_debugtoolbar import DebugToolbarExtension
+        DebugToolbarExtension(app)
+
+    app.register_blueprint(bp)
+    app.register_blueprint(bulk.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(feeds.bp)
+    app.register_blueprint(assets.bp)
+    app.cli.add_command(blogly_cli)
+    # last, so warm-up compiles against every registered filter and global
+    template_cache.init_app(app)
+
+    if app.config['CREATE_ALL']:
+        db.create_all()
+
+    return app
+
+
+@bp.get("/")
 def index():
-    """Initial landing page, redirect to user listing page"""
-
-    return redirect("/users")
+    """Home page: the latest posts, from the in-memory timeline"""
+
+    posts = latest_posts()
+
+    etag = make_etag('home', [
+        (post.id, post.title, post.first_name, post.last_name)
+        for post in posts])
+    cached = not_modified(etag, None)
+    if cached:
+        return cached
+
+    return with_validators(
+        render_template('home.html', posts=posts), etag, None)
+
+
+def paginate_listing(model, sort, per_page):
+    """Return (page, (after, before), next cursor, prev cursor) of
+    model.listing_query(), `after` / `before` as parsed from the request.
+
+    Sorted by id, or with `sort='popular'` by post_count, most first; both
+    orders are keyset-paginated over an index.
+    """
+
+    if sort == 'popular':
+        after = parse_count_cursor(request.args.get('after'))
+        before = parse_count_cursor(request.args.get('before'))
+        page = keyset_paginate(
+            model.listing_query(),
+            (model.post_count, model.id),
+            after=after,
+            before=before,
+            per_page=per_page,
+            descending=True,
+        )
+        return (page, (after, before), format_count_cursor(page.next_cursor),
+                format_count_cursor(page.prev_cursor))
+
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    page = keyset_paginate(
+        model.listing_query(),
+        model.id,
+        after=after,
+        before=before,
+        per_page=per_page,
+    )
+    return page, (after, before), page.next_cursor, page.prev_cursor
 
 ##########################################################
 # routes for users
 
-@app.get("/users")
+@bp.get("/users")
 def show_all_users():
-    """List users on page"""
-
-    users = User.query.all()
-    return render_template(
-        '/user/listing.html',
-        users=users
+    """List users on page, one keyset page at a time, optionally sorted by
+    post count"""
+
+    sort = request.args.get('sort')
+    if sort != 'popular':
+        sort = None
+    per_page = current_app.config['USERS_PER_PAGE']
+
+    users, position, next_cursor, prev_cursor = paginate_listing(
+        User, sort, per_page)
+
+    validators = page_validators(users, 'users', sort, per_page)
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
+    def render_body():
+        html = render_template(
+            'user/_listing.html',
+            users=users,
+            sort=sort,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
+        return html, [('users',)]
+
+    body = page_cache.fragment(
+        ('users', sort, *position, per_page), render_body)
+
+    return with_validators(
+        render_template('user/listing.html', body=body),
+        *validators
     )
 
-@app.get("/users/new")
+@bp.get("/users/new")
 def show_new_user_form():
     """Show an add form for users"""
 
     return render_template(
-        '/user/new-form.html'
+        'user/new-form.html'
     )
 
-@app.post("/users/new")
+@bp.post("/users/new")
 def submit_new_user_form():
     """Submit an add form for users"""
 
@@ -62,41 +183,78 @@ def submit_new_user_form():
 
     name_check = True
 
-    if len(new_user.first_name.strip()) == 0:
+    if is_blank(new_user.first_name):
         flash("Invalid first name.")
         name_check = False
 
-    if len(new_user.last_name.strip()) == 0:
+    if is_blank(new_user.last_name):
         flash("Invalid last name.")
         name_check = False
 
     if name_check:
         db.session.add(new_user)
         db.session.commit()
+        page_cache.invalidate(('users',))
         flash('User successfully added!')
 
 
     return redirect("/users")
 
 
-@app.get("/users/<int:user_id>")
+def user_versions(user_id):
+    """Statement for the (version, updated_at) the user page is built on."""
+
+    return db.select(User.version, User.updated_at).where(User.id == user_id)
+
+
+def user_validators(user_id, versions):
+    """(etag, last_modified) of a user page, from user_versions()'s row."""
+
+    version, updated_at = versions
+    return make_etag('user', user_id, version), updated_at
+
+
+def user_fragment(user):
+    """The user page body, and the entities it was built from."""
+
+    html = render_template('user/_detail.html', user=user)
+    return html, [('user', user.id)]
+
+
+@bp.get("/users/<int:user_id>")
 def show_user_id_information(user_id):
     """Show information about the given user"""
 
-    user = User.query.get_or_404(user_id)
+    versions = db.session.execute(user_versions(user_id)).first()
+    if versions is None:
+        abort(404)
+
+    validators = user_validators(user_id, versions)
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
+    def render_body():
+        return user_fragment(
+            User.query.options(*load_options()).get_or_404(user_id))
+
+    body = page_cache.fragment(('user', user_id), render_body)
 
-    return render_template('/user/detail.html', user=user)
+    return with_validators(
+        render_template('user/detail.html', body=body),
+        *validators
+    )
 
 
-@app.get("/users/<int:user_id>/edit")
+@bp.get("/users/<int:user_id>/edit")
 def show_edit_user_form(user_id):
     """Show the edit page for a user"""
 
     user = User.query.get_or_404(user_id)
 
-    return render_template('/user/edit-form.html', user=user)
+    return render_template('user/edit-form.html', user=user)
 
-@app.post("/users/<int:user_id>/edit")
+@bp.post("/users/<int:user_id>/edit")
 def submit_edit_user_form(user_id):
     """Show the edit page for a user"""
 
@@ -107,34 +265,47 @@ def submit_edit_user_form(user_id):
 
     input_check = True
 
-    if len(user.first_name.strip()) == 0:
+    if is_blank(user.first_name):
         flash(f"Invalid first name.")
         input_check = False
 
-    if len(user.last_name.strip()) == 0:
+    if is_blank(user.last_name):
         flash(f"Invalid last name.")
         input_check = False
-    # TODO: validation method can be in model instead, not route
 
     if input_check:
         db.session.add(user)
+        first_name, last_name = user.first_name, user.last_name
         db.session.commit()
+        timeline.rename_user(user_id, first_name, last_name)
+        page_cache.invalidate(('users',), ('user', user_id))
         flash('User successfully edited!')
 
 
     return redirect(f"/users/{user_id}")
 
-@app.post("/users/<int:user_id>/delete")
+@bp.post("/users/<int:user_id>/delete")
 def delete_user(user_id):
-    """Delete the user"""
+    """Delete the user, handing very large accounts to a background purge"""
 
-    user = User.query.get_or_404(user_id)
+    User.listing_query().filter(User.id == user_id).first_or_404()
+
+    threshold = current_app.config['PURGE_IN_BACKGROUND_AFTER']
 
-    for post in user.posts:
-        db.session.delete(post)
+    if threshold is not None and has_more_posts_than(user_id, threshold):
+        purge_user_in_background(
+            current_app._get_current_object(),
+            user_id,
+            current_app.config['PURGE_BATCH_SIZE'])
+        timeline.remove_user(user_id)
+        flash('User is being deleted.')
+        return redirect('/users')
 
-    db.session.delete(user)
+    unindex_user_posts(user_id)
+    User.purge(user_id)
     db.session.commit()
+    timeline.remove_user(user_id)
+    page_cache.invalidate(('users',), ('user', user_id), ('tags',))
 
     flash('User successfully deleted!')
 
@@ -144,18 +315,18 @@ def delete_user(user_id):
 ##########################################################
 # routes for posts
 
-@app.get('/users/<int:user_id>/posts/new')
+@bp.get('/users/<int:user_id>/posts/new')
 def show_new_post_form(user_id):
     '''Show page with form to add a new post'''
 
-    user = User.query.get_or_404(user_id)
+    user = User.listing_query().filter(User.id == user_id).first_or_404()
 
     return render_template(
-        '/post/new-form.html',
+        'post/new-form.html',
         user=user
     )
 
-@app.post('/users/<int:user_id>/posts/new')
+@bp.post('/users/<int:user_id>/posts/new')
 def submit_new_post_form(user_id):
     '''Submit form to create a new post'''
 
@@ -164,46 +335,123 @@ def submit_new_post_form(user_id):
         content=request.form['content'],
         user_id=user_id
     )
+    tag_names = parse_tag_names(request.form.get('tags'))
 
     input_check = True
 
-    if len(new_post.title.strip()) == 0:
+    if is_blank(new_post.title):
         flash(f"Invalid title for post addition.")
         input_check = False
 
-    if len(new_post.content.strip()) == 0:
+    if is_blank(new_post.content):
         flash(f"Invalid content for post addition.")
         input_check = False
-    # TODO: move validation elsewhere
+
+    for name in invalid_tag_names(tag_names):
+        flash(f"Invalid tag name: {name}")
+        input_check = False
 
     if input_check:
+        user = User.query.get_or_404(user_id)
         db.session.add(new_post)
+        touch(user)
+        # incremented in SQL, like the version, so concurrent posts all count
+        user.post_count = User.post_count + 1
+        db.session.flush()
+
+        tag_ids, created_tags = resolve_tag_ids(tag_names)
+        set_post_tags(new_post.id, tag_ids, current=())
+        first_name, last_name = user.first_name, user.last_name
+
         db.session.commit()
+        tag_cache.update(created_tags)
+        index_post(new_post.id, new_post.title, new_post.content)
+        timeline.add(TimelineEntry(
+            new_post.id, new_post.title, new_post.created_at, user_id,
+            first_name, last_name))
+        # ('posts',) and ('tag', id): the site and tag feeds
+        page_cache.invalidate(
+            ('posts',), ('users',), ('user', user_id),
+            *[('tag', tag_id) for tag_id in tag_ids])
+        if tag_ids:
+            page_cache.invalidate(('tags',))
         flash('Post added successfully!')
 
     return redirect(f'/users/{user_id}')
 
-@app.get('/posts/<int:post_id>')
+def post_versions(post_id):
+    """Statements for the versions a post page is built on: the post's and
+    its author's (one row), then its tags'."""
+
+    return (
+        db.select(Post.version, Post.updated_at, User.version, User.updated_at)
+        .join(Post.user)
+        .where(Post.id == post_id),
+        db.select(Tag.id, Tag.version, Tag.updated_at)
+        .join(PostTag, PostTag.tag_id == Tag.id)
+        .where(PostTag.post_id == post_id)
+        .order_by(Tag.id),
+    )
+
+
+def post_validators(post_id, versions, tags):
+    """(etag, last_modified) of a post page, from post_versions()'s rows."""
+
+    post_version, post_updated_at, user_version, user_updated_at = versions
+    return (
+        make_etag(
+            'post', post_id, post_version, user_version,
+            [(tag.id, tag.version) for tag in tags]),
+        max([post_updated_at, user_updated_at]
+            + [tag.updated_at for tag in tags]),
+    )
+
+
+def post_fragment(post):
+    """The post page body, and the entities it was built from."""
+
+    html = render_template('post/_detail.html', post=post)
+    deps = [('post', post.id), ('user', post.user_id)]
+    deps.extend(('tag', tag.id) for tag in post.tags)
+    return html, deps
+
+
+@bp.get('/posts/<int:post_id>')
 def show_post_page(post_id):
     '''Show the post page for a particular post'''
 
-    post = Post.query.get_or_404(post_id)
+    versions_query, tags_query = post_versions(post_id)
+    versions = db.session.execute(versions_query).first()
+    if versions is None:
+        abort(404)
+    tags = db.session.execute(tags_query).all()
 
-    return render_template(
-        '/post/detail.html',
-        post=post
+    validators = post_validators(post_id, versions, tags)
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
+    def render_body():
+        return post_fragment(
+            Post.query.options(*load_options()).get_or_404(post_id))
+
+    body = page_cache.fragment(('post', post_id), render_body)
+
+    return with_validators(
+        render_template('post/detail.html', body=body),
+        *validators
     )
 
-@app.get('/posts/<int:post_id>/edit')
+@bp.get('/posts/<int:post_id>/edit')
 def show_edit_post_form(post_id):
     """Show edit post form"""
 
-    post = Post.query.get_or_404(post_id)
+    post = Post.query.options(*load_options()).get_or_404(post_id)
 
-    return render_template('/post/edit-form.html', post=post)
+    return render_template('post/edit-form.html', post=post)
 
 
-@app.post('/posts/<int:post_id>/edit')
+@bp.post('/posts/<int:post_id>/edit')
 def submit_edit_post_form(post_id):
     """Submits edit for post"""
 
@@ -211,35 +459,62 @@ def submit_edit_post_form(post_id):
 
     post.title = request.form['title']
     post.content = request.form['content']
+    tag_names = parse_tag_names(request.form.get('tags'))
 
     input_check = True
 
-    if len(post.title.strip()) == 0:
+    if is_blank(post.title):
         flash(f"Invalid edit for post title.")
         input_check = False
 
-    if len(post.content.strip()) == 0:
+    if is_blank(post.content):
         flash(f"Invalid edit for post content.")
         input_check = False
 
+    for name in invalid_tag_names(tag_names):
+        flash(f"Invalid tag name: {name}")
+        input_check = False
+
     if input_check:
         db.session.add(post)
+        touch(post.user)
+
+        tag_ids, created_tags = resolve_tag_ids(tag_names)
+        added, removed = set_post_tags(post_id, tag_ids)
+        title, content, user_id = post.title, post.content, post.user_id
+
+        # (the commit expires `post`; reading it afterwards would reload it)
         db.session.commit()
+        tag_cache.update(created_tags)
+        index_post(post_id, title, content)
+        timeline.update(post_id, title)
+        page_cache.invalidate(
+            ('post', post_id), ('user', user_id),
+            *[('tag', tag_id) for tag_id in added | removed])
+        if created_tags or added or removed:
+            page_cache.invalidate(('tags',))
         flash('Post edited successfully!')
 
     return redirect(f'/posts/{post_id}')
 
 
-@app.post("/posts/<int:post_id>/delete")
+@bp.post("/posts/<int:post_id>/delete")
 def delete_post(post_id):
     """Delete post"""
 
-    post = Post.query.get_or_404(post_id)
+    post = Post.query.options(*load_options()).get_or_404(post_id)
 
-    user_id = post.user.id
+    user_id = post.user_id
+    tagged = bool(post.tags)
 
-    db.session.delete(post)
+    # also lowers (and so versions) the author's and tags' post_count
+    Post.purge(Post.id == post_id)
     db.session.commit()
+    unindex_post(post_id)
+    timeline.remove(post_id)
+    page_cache.invalidate(('post', post_id), ('users',), ('user', user_id))
+    if tagged:
+        page_cache.invalidate(('tags',))
 
     flash('Post deleted successfully!')
 
@@ -247,27 +522,77 @@ def delete_post(post_id):
 
 
 #################################################################
-# routes for tags
+# routes for search
 
-@app.get("/tags")
-def show_all_tags():
-    """List tags on page"""
+@bp.get('/search')
+def search():
+    """Search post titles and content"""
+
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    posts, has_more = [], False
+    if query:
+        posts, has_more = search_posts(
+            query, page, current_app.config['POSTS_PER_PAGE'])
 
-    tags = Tag.query.all()
     return render_template(
-        '/tag/listing.html',
-        tags=tags
+        'search.html',
+        query=query,
+        page=page,
+        posts=posts,
+        has_more=has_more,
     )
 
-@app.get("/tags/new")
+
+#################################################################
+# routes for tags
+
+@bp.get("/tags")
+def show_all_tags():
+    """List tags on page, one keyset page at a time, optionally sorted by
+    post count"""
+
+    sort = request.args.get('sort')
+    if sort != 'popular':
+        sort = None
+    per_page = current_app.config['TAGS_PER_PAGE']
+
+    tags, position, next_cursor, prev_cursor = paginate_listing(
+        Tag, sort, per_page)
+
+    validators = page_validators(tags, 'tags', sort, per_page)
+    cached = not_modified(*validators)
+    if cached:
+        return cached
+
+    def render_body():
+        html = render_template(
+            'tag/_listing.html',
+            tags=tags,
+            sort=sort,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor,
+        )
+        return html, [('tags',)]
+
+    body = page_cache.fragment(
+        ('tags', sort, *position, per_page), render_body)
+
+    return with_validators(
+        render_template('tag/listing.html', body=body),
+        *validators
+    )
+
+@bp.get("/tags/new")
 def show_new_tag_form():
     """Show an add form for tags"""
 
     return render_template(
-        '/tag/new-form.html'
+        'tag/new-form.html'
     )
 
-@app.post("/tags/new")
+@bp.post("/tags/new")
 def submit_new_tag_form():
     """Submit an add form for users"""
 
@@ -275,9 +600,11 @@ def submit_new_tag_form():
         name=request.form['name'],
     )
 
-    if len(new_tag.name.strip()) != 0:
+    if not is_blank(new_tag.name):
         db.session.add(new_tag)
         db.session.commit()
+        tag_cache.update({new_tag.name: new_tag.id})
+        page_cache.invalidate(('tags',))
         flash('Tag successfully added!')
     else:
         flash('Invalid tag input.')
@@ -285,41 +612,75 @@ def submit_new_tag_form():
 
     return redirect("/tags")
 
-@app.get('/tags/<int:tag_id>')
+@bp.get('/tags/<int:tag_id>')
 def show_edit_tag_form(tag_id):
     """Show edit tag form"""
 
     tag = Tag.query.get_or_404(tag_id)
 
-    return render_template('/tag/edit-form.html', tag=tag)
+    return render_template('tag/edit-form.html', tag=tag)
+
 
+@bp.get('/tags/<int:tag_id>/posts')
+def show_tag_posts(tag_id):
+    """List the posts for a tag, newest first, one keyset page at a time"""
 
-@app.post('/tags/<int:tag_id>')
+    tag = Tag.listing_query().filter(Tag.id == tag_id).first_or_404()
+
+    posts = keyset_paginate(
+        Post.listing_query()
+        .join(PostTag, PostTag.post_id == Post.id)
+        .filter(PostTag.tag_id == tag_id),
+        (Post.created_at, Post.id),
+        after=parse_time_cursor(request.args.get('after')),
+        before=parse_time_cursor(request.args.get('before')),
+        per_page=current_app.config['POSTS_PER_PAGE'],
+        descending=True,
+    )
+
+    return render_template(
+        'tag/detail.html',
+        tag=tag,
+        posts=posts,
+        next_cursor=format_time_cursor(posts.next_cursor),
+        prev_cursor=format_time_cursor(posts.prev_cursor),
+    )
+
+
+@bp.post('/tags/<int:tag_id>')
 def submit_edit_tag_form(tag_id):
     """Submits edit for post"""
 
     tag = Tag.query.get_or_404(tag_id)
 
+    old_name = tag.name
     tag.name = request.form['name']
 
 
-    if len(tag.name.strip()) != 0:
+    if not is_blank(tag.name):
         db.session.add(tag)
         db.session.commit()
+        tag_cache.discard(old_name)
+        page_cache.invalidate(('tags',), ('tag', tag_id))
         flash('Tag edited successfully!')
 
     return redirect(f'/tags')
 
 
-@app.post('/tags/<int:tag_id>/delete')
+@bp.post('/tags/<int:tag_id>/delete')
 def delete_tag(tag_id):
     """Delete post"""
 
-    tag = Tag.query.get_or_404(tag_id)
+    tag = Tag.listing_query().filter(Tag.id == tag_id).first_or_404()
 
-    db.session.delete(tag)
+    Tag.purge(tag_id)
     db.session.commit()
+    tag_cache.discard(tag.name)
+    page_cache.invalidate(('tags',), ('tag', tag_id))
 
     flash('Tag deleted successfully!')
 
-    return redirect(f'/tags')
\ No newline at end of file
+    return redirect(f'/tags')
+
+
+app = create_app()
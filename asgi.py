@@ -0,0 +1,202 @@
+"""Optional async serving mode.
+
+Serves the read-heavy detail pages from async handlers on SQLAlchemy's
+asyncio engine, so one process can keep many requests waiting on the
+database at once; every other request is passed through to the regular
+Flask app. Run it with an ASGI server, e.g.
+
+    uvicorn asgi:application --workers 4
+
+The async pages still run inside a Flask request context, through the app's
+before/after_request hooks and error handlers, and share the sync routes'
+validators and fragments: they answer conditional GETs with 304, use and
+fill the page cache and are compressed like any other response.
+
+Needs asgiref plus an async driver: asyncpg for PostgreSQL, aiosqlite for
+SQLite.
+"""
+
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, render_template, request_started
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.test import EnvironBuilder
+
+from app import app as flask_app
+from app import (
+    post_fragment, post_validators, post_versions, user_fragment,
+    user_validators, user_versions)
+from cache import page_cache
+from conditional import not_modified, with_validators
+from loading import load_options
+from models import Post, User
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """Swap a sync database URL's driver for its asyncio counterpart."""
+
+    scheme, sep, rest = url.partition('://')
+    dialect = scheme.split('+')[0]
+    return ASYNC_DRIVERS.get(dialect, scheme) + sep + rest
+
+
+def engine_options(url):
+    """The app's engine options, minus pool sizing SQLite can't take."""
+
+    options = dict(flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    if url.startswith('sqlite'):
+        options.pop('pool_size', None)
+        options.pop('max_overflow', None)
+    return options
+
+
+database_url = async_database_url(
+    flask_app.config['SQLALCHEMY_DATABASE_URI'])
+engine = create_async_engine(database_url, **engine_options(database_url))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def show_user(user_id):
+    async with Session() as session:
+        versions = (await session.execute(user_versions(user_id))).first()
+        if versions is None:
+            abort(404)
+
+        validators = user_validators(user_id, versions)
+        cached = not_modified(*validators)
+        if cached:
+            return cached
+
+        async def render_body():
+            user = await session.get(User, user_id, options=load_options())
+            if user is None:
+                abort(404)
+            return user_fragment(user)
+
+        body = await page_cache.fragment_async(('user', user_id), render_body)
+
+    return with_validators(
+        render_template('user/detail.html', body=body), *validators)
+
+
+async def show_post(post_id):
+    async with Session() as session:
+        versions_query, tags_query = post_versions(post_id)
+        versions = (await session.execute(versions_query)).first()
+        if versions is None:
+            abort(404)
+        tags = (await session.execute(tags_query)).all()
+
+        validators = post_validators(post_id, versions, tags)
+        cached = not_modified(*validators)
+        if cached:
+            return cached
+
+        async def render_body():
+            post = await session.get(Post, post_id, options=load_options())
+            if post is None:
+                abort(404)
+            return post_fragment(post)
+
+        body = await page_cache.fragment_async(('post', post_id), render_body)
+
+    return with_validators(
+        render_template('post/detail.html', body=body), *validators)
+
+
+ROUTES = [
+    (re.compile(r'^/users/(\d+)$'), show_user),
+    (re.compile(r'^/posts/(\d+)$'), show_post),
+]
+
+
+def _has_session_cookie(scope):
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME'].encode()
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie' and cookie_name + b'=' in value:
+            return True
+    return False
+
+
+async def application(scope, receive, send):
+    """ASGI entry point"""
+
+    if (scope['type'] == 'http'
+            and scope['method'] in ('GET', 'HEAD')
+            and not _has_session_cookie(scope)):
+
+        for pattern, handler in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                response = await _dispatch(scope, handler, int(match.group(1)))
+                await _send_response(scope, send, response)
+                return
+
+    await wsgi_app(scope, receive, send)
+
+
+def _environ(scope):
+    """A WSGI environ for the (bodiless) HTTP request in `scope`."""
+
+    host, port = scope.get('server') or ('localhost', 80)
+    root_path = scope.get('root_path', '')
+    client = scope.get('client')
+    return EnvironBuilder(
+        path=scope['path'][len(root_path):],
+        base_url=f"{scope.get('scheme', 'http')}://{host}:{port}{root_path}",
+        method=scope['method'],
+        query_string=scope['query_string'].decode('latin-1'),
+        headers=[(name.decode('latin-1'), value.decode('latin-1'))
+                 for name, value in scope.get('headers', ())],
+        environ_overrides={'REMOTE_ADDR': client[0]} if client else None,
+    ).get_environ()
+
+
+async def _dispatch(scope, handler, *args):
+    """Run `handler` the way Flask runs a view: in a request context, after
+    the before_request hooks, with errors going to the app's handlers and
+    the response through the after_request hooks."""
+
+    ctx = flask_app.request_context(_environ(scope))
+    error = None
+    try:
+        ctx.push()
+        try:
+            request_started.send(flask_app)
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = await handler(*args)
+        except Exception as exc:
+            rv = flask_app.handle_user_exception(exc)
+        return flask_app.finalize_request(rv)
+    except Exception as exc:
+        error = exc
+        return flask_app.handle_exception(exc)
+    finally:
+        ctx.pop(error)
+
+
+async def _send_response(scope, send, response):
+    body = b''.join(response.iter_encoded())
+    response.close()
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in response.headers.to_wsgi_list()
+        ],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': body if scope['method'] == 'GET' else b'',
+    })
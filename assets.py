@@ -0,0 +1,462 @@
+"""Self-hosted, fingerprinted static assets.
+
+`flask blogly assets` builds every bundle in ASSET_BUNDLES from the files
+under assets/ (`--fetch` first downloads any missing pinned VENDOR file and
+checks its hash):
+
+1. the sources are concatenated;
+2. CSS rules whose selectors need a class, id or element that no template
+   uses (or ASSET_SAFELIST lists) are dropped, and the rest is minified;
+3. the result is written to static/dist as <name>.<content hash>.<ext>, with
+   .gz (and .br / .zst when brotli / zstandard are installed) beside it;
+4. static/dist/manifest.json maps each bundle name to that file.
+
+Templates link them with `asset_url('blogly.css')`; until a bundle is built
+(e.g. on a fresh checkout), a bundle made of one pinned VENDOR file links
+that file's CDN URL instead. A fingerprinted file never changes, so /assets/
+serves them with an immutable, year-long Cache-Control, choosing a
+precompressed variant by Accept-Encoding. Files from earlier builds are
+still served, for pages and caches that link them.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import urllib.request
+
+from flask import Blueprint, abort, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+bp = Blueprint('assets', __name__)
+
+# path under assets/: (pinned URL, subresource integrity hash)
+VENDOR = {
+    'vendor/bootstrap.min.css': (
+        'https://unpkg.com/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+        'sha384-QWTKZyjpPEjISv5WaRU9OFeRpok6YctnYmDr5pNlyT2bRjXh0JMhjY6hW'
+        '+ALEwIH',
+    ),
+}
+
+MANIFEST = 'manifest.json'
+
+# <name>.<content hash>.<ext>, as build() writes them
+FINGERPRINTED = re.compile(r'^[\w-]+\.[0-9a-f]{12}\.\w+$')
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# (Content-Encoding, file suffix, compressor) for each precompressed
+# variant, best first
+ENCODINGS = []
+if brotli is not None:
+    ENCODINGS.append(('br', '.br', brotli.compress))
+if zstandard is not None:
+    ENCODINGS.append(
+        ('zstd', '.zst', zstandard.ZstdCompressor(level=19).compress))
+ENCODINGS.append(('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0)))
+
+SUFFIXES = {encoding: suffix for encoding, suffix, _ in ENCODINGS}
+
+COMMENT_RE = re.compile(r'/\*(.*?)\*/', re.S)
+STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CLASS_ATTR_RE = re.compile(r'''\bclass\s*=\s*["']([^"']*)["']''')
+ID_ATTR_RE = re.compile(r'''\bid\s*=\s*["']([^"']*)["']''')
+TAG_RE = re.compile(r'<([a-zA-Z][\w-]*)')
+SELECTOR_CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+SELECTOR_ID_RE = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+SELECTOR_ELEMENT_RE = re.compile(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)')
+# at-rules holding nested rules, which are purged in turn
+GROUPING_RULES = ('@media', '@supports', '@layer', '@container')
+
+
+class UsedSelectors:
+    """The classes, ids and elements the templates use."""
+
+    def __init__(self, classes=(), ids=(), elements=()):
+        self.classes = set(classes)
+        self.ids = set(ids)
+        self.elements = set(elements) | {'html', 'body'}
+
+    @classmethod
+    def scan(cls, template_dirs, safelist=()):
+        """Collect names from every template, plus `safelist` names (given
+        as '.class', '#id' or element)."""
+
+        used = cls()
+        for directory in template_dirs:
+            for root, _, files in os.walk(directory):
+                for file in files:
+                    with open(os.path.join(root, file),
+                              encoding='utf-8') as f:
+                        used.add_markup(f.read())
+
+        for name in safelist:
+            if name.startswith('.'):
+                used.classes.add(name[1:])
+            elif name.startswith('#'):
+                used.ids.add(name[1:])
+            else:
+                used.elements.add(name.lower())
+        return used
+
+    def add_markup(self, text):
+        for value in CLASS_ATTR_RE.findall(text):
+            # skip template expressions; safelist classes they produce
+            self.classes.update(
+                name for name in value.split()
+                if '{' not in name and '}' not in name)
+        self.ids.update(ID_ATTR_RE.findall(text))
+        self.elements.update(tag.lower() for tag in TAG_RE.findall(text))
+
+    def matches(self, selector):
+        """False if `selector` needs something no template has.
+
+        Arguments of functional pseudo-classes (:not(), :is()...) and
+        attribute selectors are ignored, which only ever keeps more.
+        """
+
+        if '\\' in selector:
+            return True
+
+        selector = _strip_nested(selector, '(', ')')
+        selector = _strip_nested(selector, '[', ']')
+        selector = re.sub(r'::?[\w-]+', '', selector)
+
+        return (
+            all(name in self.classes
+                for name in SELECTOR_CLASS_RE.findall(selector))
+            and all(name in self.ids
+                    for name in SELECTOR_ID_RE.findall(selector))
+            and all(name.lower() in self.elements
+                    for name in SELECTOR_ELEMENT_RE.findall(selector)))
+
+
+def _strip_nested(text, opening, closing):
+    out = []
+    depth = 0
+    for char in text:
+        if char == opening:
+            depth += 1
+        elif char == closing and depth:
+            depth -= 1
+        elif not depth:
+            out.append(char)
+    return ''.join(out)
+
+
+def _skip_string(css, i):
+    """Index just past the string literal starting at css[i]."""
+
+    match = STRING_RE.match(css, i)
+    return match.end() if match else i + 1
+
+
+def _rules(css):
+    """Yield (prelude, block) per top-level rule; block is None for
+    statements such as @import ...;"""
+
+    i, n = 0, len(css)
+    while i < n:
+        start = i
+        while i < n and css[i] not in '{;':
+            i = _skip_string(css, i) if css[i] in '"\'' else i + 1
+
+        prelude = css[start:i].strip()
+        if i >= n:
+            if prelude:
+                yield prelude, None
+            return
+
+        if css[i] == ';':
+            i += 1
+            if prelude:
+                yield prelude, None
+            continue
+
+        depth, i = 1, i + 1
+        body_start = i
+        while i < n and depth:
+            if css[i] in '"\'':
+                i = _skip_string(css, i)
+                continue
+            if css[i] == '{':
+                depth += 1
+            elif css[i] == '}':
+                depth -= 1
+            i += 1
+
+        yield prelude, css[body_start:i - 1]
+
+
+def _split_selectors(prelude):
+    """Split a selector list on commas outside parentheses."""
+
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and not depth:
+            parts.append(prelude[start:i].strip())
+            start = i + 1
+    parts.append(prelude[start:].strip())
+    return parts
+
+
+def purge_css(css, used):
+    """Drop the rules (and selectors in a list) `used` never matches.
+
+    Comments go too, except /*! ... */ license comments, which move to the
+    top.
+    """
+
+    licenses = [match.group(0) for match in COMMENT_RE.finditer(css)
+                if match.group(1).startswith('!')]
+    css = COMMENT_RE.sub('', css)
+
+    # keyframes only survive if a kept rule still names them
+    kept = _purge_rules(css, used, lambda prelude: False)
+
+    def keyframes_used(prelude):
+        name = prelude.split(None, 1)[-1].strip()
+        return re.search(r'\b' + re.escape(name) + r'\b', kept) is not None
+
+    kept = _purge_rules(css, used, keyframes_used)
+    return '\n'.join(licenses + [kept])
+
+
+def _purge_rules(css, used, keep_keyframes=lambda prelude: True):
+    out = []
+    for prelude, block in _rules(css):
+        if block is None:
+            out.append(prelude + ';')
+            continue
+
+        if prelude.startswith('@'):
+            name = prelude.split(None, 1)[0].split('(')[0].lower()
+            if name in GROUPING_RULES:
+                inner = _purge_rules(block, used, keep_keyframes)
+                if inner:
+                    out.append(f'{prelude}{{{inner}}}')
+            elif name.endswith('keyframes'):
+                if keep_keyframes(prelude):
+                    out.append(f'{prelude}{{{block}}}')
+            else:
+                out.append(f'{prelude}{{{block}}}')
+            continue
+
+        selectors = [selector for selector in _split_selectors(prelude)
+                     if used.matches(selector)]
+        if selectors:
+            out.append(f'{",".join(selectors)}{{{block}}}')
+
+    return ''.join(out)
+
+
+def minify_css(css):
+    """Collapse whitespace and drop comments (but /*! ones) and the last
+    semicolon in each block; string literals are left alone."""
+
+    css = COMMENT_RE.sub(
+        lambda match: match.group(0) + '\n'
+        if match.group(1).startswith('!') else '', css)
+
+    parts = STRING_RE.split(css)
+    for i in range(0, len(parts), 2):
+        text = re.sub(r'\s+', ' ', parts[i])
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        parts[i] = text.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def fetch_vendor(source_dir, vendor=VENDOR):
+    """Download missing vendor files, checking their integrity hashes;
+    return the paths fetched."""
+
+    fetched = []
+    for path, (url, integrity) in vendor.items():
+        target = os.path.join(source_dir, path)
+        if os.path.exists(target):
+            continue
+
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            data = resp.read()
+
+        algorithm, _, expected = integrity.partition('-')
+        digest = base64.b64encode(hashlib.new(algorithm, data).digest())
+        if digest.decode() != expected:
+            raise ValueError(f"{url} does not match its integrity hash")
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        fetched.append(path)
+
+    return fetched
+
+
+def build(source_dir, output_dir, bundles, used):
+    """Build `bundles` ({name: [source paths]}); write them and the
+    manifest to `output_dir` and return {name: sizes}.
+
+    Older fingerprinted files are left in place for pages (and caches)
+    still pointing at them.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {}
+    report = {}
+
+    for name, sources in bundles.items():
+        texts = []
+        for source in sources:
+            with open(os.path.join(source_dir, source),
+                      encoding='utf-8') as f:
+                texts.append(f.read())
+        text = '\n'.join(texts)
+        sizes = {'source': len(text.encode())}
+
+        if name.endswith('.css'):
+            text = minify_css(purge_css(text, used))
+
+        data = text.encode()
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(data)
+        sizes['built'] = len(data)
+
+        for encoding, suffix, compress in ENCODINGS:
+            compressed = compress(data)
+            with open(os.path.join(output_dir, filename + suffix), 'wb') as f:
+                f.write(compressed)
+            sizes[encoding] = len(compressed)
+
+        manifest[name] = filename
+        report[name] = dict(sizes, file=filename)
+
+    with open(os.path.join(output_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return report
+
+
+class AssetManifest:
+    """Map bundle names to their fingerprinted files for templates."""
+
+    def __init__(self):
+        self.output_dir = None
+        self.url_prefix = '/assets/'
+        self.bundles = {}
+        self.files = {}
+        # bundle names already warned about as unbuilt
+        self.missing = set()
+        # fingerprinted file -> encodings it has a precompressed copy in
+        self.encodings = {}
+
+    def init_app(self, app):
+        """Read the manifest from ASSETS_OUTPUT; add asset_url() to Jinja."""
+
+        self.output_dir = os.path.join(
+            app.root_path, app.config['ASSETS_OUTPUT'])
+        self.url_prefix = app.config['ASSETS_URL']
+        self.bundles = app.config['ASSET_BUNDLES']
+        self.load()
+        app.add_template_global(self.url, 'asset_url')
+
+    def load(self):
+        """(Re)read the manifest, e.g. after a build."""
+
+        try:
+            with open(os.path.join(self.output_dir, MANIFEST)) as f:
+                self.files = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+        self.encodings = {}
+        for filename in self.files.values():
+            self.encodings_for(filename)
+
+    def encodings_for(self, filename):
+        """Encodings fingerprinted file `filename` has precompressed copies
+        in, or None if there's no such file (in the manifest or not)."""
+
+        encodings = self.encodings.get(filename)
+        if encodings is not None:
+            return encodings
+
+        path = os.path.join(self.output_dir, filename)
+        if not FINGERPRINTED.match(filename) or not os.path.isfile(path):
+            return None
+
+        encodings = self.encodings[filename] = [
+            encoding for encoding, suffix, _ in ENCODINGS
+            if os.path.exists(os.path.join(self.output_dir, filename + suffix))
+        ]
+        return encodings
+
+    def url(self, name):
+        """URL of the current build of bundle `name`, or if it isn't built,
+        of its pinned vendor file on the CDN."""
+
+        filename = self.files.get(name)
+        if filename is not None:
+            return self.url_prefix + filename
+
+        if name not in self.missing:
+            self.missing.add(name)
+            log.warning("No built asset %r; run `flask blogly assets`", name)
+
+        sources = self.bundles.get(name, ())
+        if len(sources) == 1 and sources[0] in VENDOR:
+            return VENDOR[sources[0]][0]
+        return self.url_prefix + name
+
+
+static_assets = AssetManifest()
+
+
+@bp.get('/assets/<path:filename>')
+def serve_asset(filename):
+    """A fingerprinted asset, precompressed if the client accepts it"""
+
+    encodings = static_assets.encodings_for(filename)
+    if encodings is None:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding in encodings:
+        if request.accept_encodings[encoding]:
+            response = send_from_directory(
+                static_assets.output_dir, filename + SUFFIXES[encoding],
+                mimetype=mimetype,
+                max_age=ONE_YEAR)
+            response.content_encoding = encoding
+            break
+    else:
+        response = send_from_directory(
+            static_assets.output_dir, filename, mimetype=mimetype,
+            max_age=ONE_YEAR)
+
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
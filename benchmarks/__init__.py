@@ -0,0 +1,4 @@
+"""Benchmarks for Blogly. Run each one from the repo root, e.g.
+
+    python -m benchmarks.startup
+"""
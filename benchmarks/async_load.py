@@ -0,0 +1,120 @@
+"""Compare the sync (threaded WSGI) and async (ASGI) servers under load.
+
+Seeds a database, boots each server in its own process and drives the user
+and post detail pages from a pool of client threads:
+
+    python -m benchmarks.async_load --concurrency 8 32 128 --duration 10
+
+Against SQLite the database answers in microseconds, so this mostly shows
+per-request overhead; pass --database-url postgresql:///blogly_bench (and
+have asyncpg installed) to see the async mode keep many requests waiting on
+a real database server at once.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.loadgen import run_load, start_wsgi_server, wait_for_server
+
+USERS = 1000
+POSTS_PER_USER = 10
+
+
+def seed(database_url):
+    """Create the schema and fill it with users and posts."""
+
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['BLOGLY_CONFIG'] = 'production'
+
+    from app import app
+    from models import db, Post, User
+
+    epoch = datetime(2020, 1, 1)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'first_name': f'first{i}', 'last_name': f'last{i}',
+             'image_url': '', 'version': 1}
+            for i in range(1, USERS + 1)
+        ])
+        db.session.execute(Post.__table__.insert(), [
+            {'id': i, 'title': f'post {i}', 'content': 'content ' * 50,
+             'created_at': epoch + timedelta(minutes=i),
+             'user_id': (i - 1) // POSTS_PER_USER + 1, 'version': 1}
+            for i in range(1, USERS * POSTS_PER_USER + 1)
+        ])
+        db.session.commit()
+
+
+def serve(kind, port, database_url):
+    """Start the `kind` ('sync' or 'async') server; return its process."""
+
+    if kind == 'sync':
+        return start_wsgi_server(
+            port, DATABASE_URL=database_url, BLOGLY_CONFIG='production')
+
+    env = dict(os.environ, DATABASE_URL=database_url,
+               BLOGLY_CONFIG='production')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:application',
+         '--port', str(port), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-url')
+    parser.add_argument(
+        '--concurrency', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    database_url = (args.database_url
+                    or f'sqlite:///{tempfile.mkdtemp()}/bench.db')
+    seed(database_url)
+
+    rng = random.Random(0)
+    paths = [
+        rng.choice((f'/users/{rng.randint(1, USERS)}',
+                    f'/posts/{rng.randint(1, USERS * POSTS_PER_USER)}'))
+        for _ in range(1000)
+    ]
+
+    results = []
+    for kind in ('sync', 'async'):
+        server = serve(kind, args.port, database_url)
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_for_server(base_url)
+            for concurrency in args.concurrency:
+                result = run_load(base_url, paths, concurrency=concurrency,
+                                  duration=args.duration)
+                results.append(dict(
+                    server=kind, concurrency=concurrency, **result.as_dict()))
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'server':<8} {'clients':>8} {'req/s':>10} {'p50 ms':>10} "
+          f"{'p99 ms':>10} {'errors':>8}")
+    for row in results:
+        print(f"{row['server']:<8} {row['concurrency']:>8} {row['rps']:>10} "
+              f"{row['p50_ms']:>10} {row['p99_ms']:>10} {row['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Weigh the CPU cost of compressing responses against the bytes it saves.
+
+Seeds synthetic data, fetches a few representative responses uncompressed
+(listing, user page, post, home page, feed, API item), then for every
+available encoding and level reports, per response:
+
+* bytes before and after, and the share saved;
+* CPU microseconds to compress (median of --repeat runs);
+* CPU microseconds per KiB saved, the figure to tune COMPRESS_LEVELS by;
+* CPU microseconds to serve the same body from the compressed-body cache
+  instead (hashing the body and one cache lookup):
+
+    python -m benchmarks.compression --users 1000 --posts 20000 --repeat 50
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+PAGES = (
+    '/users', '/users/1', '/posts/1', '/', '/feed.atom', '/api/v1/posts/1',
+)
+
+# level ranges worth comparing, per encoding
+LEVELS = {
+    'br': (1, 4, 5, 6, 9, 11),
+    'zstd': (1, 3, 6, 9, 19),
+    'gzip': (1, 4, 6, 9),
+}
+
+
+def cpu_us(func, repeat):
+    """Median CPU time of `func()` in microseconds."""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time_ns()
+        func()
+        timings.append(time.process_time_ns() - start)
+    return statistics.median(timings) / 1000
+
+
+def measure(body, encoding, level, repeat):
+    """One result row for compressing `body` with `encoding` at `level`."""
+
+    from compression import CODECS, compression
+
+    compressed = CODECS[encoding](body, level)
+    saved = len(body) - len(compressed)
+    compress_us = cpu_us(lambda: CODECS[encoding](body, level), repeat)
+
+    compression.levels[encoding] = level
+    compression.cache.clear()
+    compression.compress(body, encoding)
+    cached_us = cpu_us(lambda: compression.compress(body, encoding), repeat)
+
+    return {
+        'encoding': encoding,
+        'level': level,
+        'bytes': len(body),
+        'compressed': len(compressed),
+        'saved_pct': round(100 * saved / len(body), 1),
+        'cpu_us': round(compress_us, 1),
+        'us_per_kib_saved': round(compress_us / (saved / 1024), 2)
+        if saved > 0 else None,
+        'cached_us': round(cached_us, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{tempfile.mkdtemp()}/bench.db'
+    os.environ['BLOGLY_CONFIG'] = 'production'
+
+    from app import app
+    from compression import CODECS, compression
+    from models import db
+    from synthetic import generate
+
+    db.create_all()
+    generate(users=args.users, posts=args.posts, tags=args.tags)
+
+    client = app.test_client()
+    bodies = {}
+    for path in PAGES:
+        resp = client.get(path)
+        assert resp.status_code == 200, (path, resp.status_code)
+        bodies[path] = resp.get_data()
+
+    configured = dict(compression.levels)
+    results = {
+        path: [measure(body, encoding, level, args.repeat)
+               for encoding in CODECS for level in LEVELS[encoding]]
+        for path, body in bodies.items()
+    }
+    compression.levels = configured
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"configured levels: {configured}; "
+          f"min size {compression.min_size} bytes")
+    for path, rows in results.items():
+        print(f"\n{path} ({rows[0]['bytes']} bytes)")
+        print(f"{'encoding':<9} {'level':>5} {'bytes':>8} {'saved %':>8} "
+              f"{'cpu us':>9} {'us/KiB saved':>13} {'cached us':>10}")
+        for row in rows:
+            per_kib = row['us_per_kib_saved']
+            per_kib = '-' if per_kib is None else f"{per_kib:.2f}"
+            print(f"{row['encoding']:<9} {row['level']:>5} "
+                  f"{row['compressed']:>8} {row['saved_pct']:>8} "
+                  f"{row['cpu_us']:>9} {per_kib:>13} {row['cached_us']:>10}")
+
+
+if __name__ == '__main__':
+    main()
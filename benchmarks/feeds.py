@@ -0,0 +1,155 @@
+"""Measure what serving Atom/RSS feeds to many pollers costs.
+
+Seeds synthetic data, then
+
+* through the test client, times one feed built from scratch (empty
+  cache), served from the cache, and revalidated with If-None-Match,
+  counting SQL statements for each;
+* unless --no-http, has `--pollers` simulated feed readers (each following
+  one random user, tag or site feed) poll a threaded server, first without
+  and then with the ETag they got last time, as real feed readers do:
+
+    python -m benchmarks.feeds --users 1000 --posts 20000 --pollers 5000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.loadgen import run_load, start_wsgi_server, wait_for_server
+
+
+def time_client(client, url, repeat, before=None, headers=None):
+    """(median ms, SQL statements, body bytes) for GET `url`."""
+
+    from models import db
+    from testing import QueryCounter
+
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            resp = client.get(url, headers=headers)
+            body = resp.get_data()
+            timings.append(time.perf_counter() - start)
+        assert resp.status_code in (200, 304), resp.status_code
+
+    return statistics.median(timings) * 1000, counter.count, len(body)
+
+
+def prime(base_url, paths):
+    """GET each path once; return ({path: ETag}, mean body bytes)."""
+
+    host, port = base_url.split('//')[1].split(':')
+    conn = http.client.HTTPConnection(host, int(port))
+    etags = {}
+    sizes = []
+    for path in paths:
+        conn.request('GET', path)
+        resp = conn.getresponse()
+        sizes.append(len(resp.read()))
+        etags[path] = resp.getheader('ETag')
+    conn.close()
+    return etags, statistics.fmean(sizes)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--tags', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--no-http', action='store_true')
+    parser.add_argument('--pollers', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+    args = parser.parse_args()
+
+    database_url = f'sqlite:///{tempfile.mkdtemp()}/bench.db'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['BLOGLY_CONFIG'] = 'production'
+
+    from app import app
+    from cache import page_cache
+    from models import db
+    from synthetic import generate
+
+    db.create_all()
+    generate(users=args.users, posts=args.posts, tags=args.tags)
+
+    client = app.test_client()
+    url = '/users/1/feed.atom'
+    etag = client.get(url).headers['ETag']
+
+    results = {'client': {
+        'build': time_client(client, url, args.repeat,
+                             before=page_cache.clear),
+        'cached': time_client(client, url, args.repeat),
+        'not_modified': time_client(client, url, args.repeat,
+                                    headers={'If-None-Match': etag}),
+    }}
+
+    if not args.no_http:
+        rng = random.Random(0)
+        feeds = (
+            [f'/users/{n}/feed.atom' for n in range(1, args.users + 1)]
+            + [f'/tags/{n}/feed.rss' for n in range(1, args.tags + 1)]
+            + ['/feed.atom'])
+        paths = [rng.choice(feeds) for _ in range(args.pollers)]
+
+        server = start_wsgi_server(
+            args.port, DATABASE_URL=database_url, BLOGLY_CONFIG='production')
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_for_server(base_url)
+            etags, mean_bytes = prime(base_url, sorted(set(paths)))
+
+            results['http'] = {
+                'feeds': len(etags),
+                'mean_feed_bytes': round(mean_bytes),
+                'unconditional': run_load(
+                    base_url, paths, args.concurrency, args.duration
+                ).as_dict(),
+                'conditional': run_load(
+                    base_url, paths, args.concurrency, args.duration,
+                    headers=lambda path: {'If-None-Match': etags[path]}
+                ).as_dict(),
+            }
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'test client':<14} {'median ms':>10} {'queries':>8} "
+          f"{'bytes':>8}")
+    for mode, (ms, queries, size) in results['client'].items():
+        print(f"{mode:<14} {ms:>10.3f} {queries:>8} {size:>8}")
+
+    if 'http' in results:
+        http = results['http']
+        print(f"\n{args.pollers} pollers over {http['feeds']} feeds "
+              f"(mean feed {http['mean_feed_bytes']} bytes)")
+        print(f"{'mode':<14} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'errors':>7}")
+        for mode in ('unconditional', 'conditional'):
+            row = http[mode]
+            print(f"{mode:<14} {row['rps']:>9} {row['p50_ms']:>8} "
+                  f"{row['p99_ms']:>8} {row['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""A small multi-threaded HTTP load generator for the benchmarks.
+
+Each worker thread keeps one keep-alive connection open and fetches URLs
+round-robin until the run ends, recording every request's latency.
+"""
+
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+WSGI_SERVER = '''
+from werkzeug.serving import run_simple
+from app import app
+run_simple('127.0.0.1', {port}, app, threaded=True)
+'''
+
+
+def start_wsgi_server(port, **env):
+    """Serve the Blogly app from a threaded WSGI server in a new process.
+
+    `env` (e.g. DATABASE_URL, BLOGLY_CONFIG) is added to the environment.
+    """
+
+    return subprocess.Popen(
+        [sys.executable, '-c', WSGI_SERVER.format(port=port)],
+        env=dict(os.environ, **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class LoadResult:
+    """Latencies (seconds) and error count of one load run."""
+
+    def __init__(self, latencies, errors, elapsed):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction):
+        """Latency in milliseconds at `fraction` (e.g. 0.99)."""
+
+        if not self.latencies:
+            return 0.0
+        index = min(int(fraction * len(self.latencies)),
+                    len(self.latencies) - 1)
+        return self.latencies[index] * 1000
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'rps': round(self.throughput, 1),
+            'mean_ms': round(
+                statistics.fmean(self.latencies) * 1000
+                if self.latencies else 0.0, 3),
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p90_ms': round(self.percentile(0.90), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+        }
+
+
+def run_load(base_url, paths, concurrency=8, duration=10.0, requests=None,
+             timeout=30, headers=None):
+    """GET `paths` against `base_url` from `concurrency` threads.
+
+    Runs for `duration` seconds, or until `requests` requests in total have
+    been sent when that is given. `headers(path)`, if given, returns extra
+    request headers for a path (e.g. If-None-Match). Responses other than
+    2xx/3xx count as errors and are left out of the latencies.
+    """
+
+    parts = urlsplit(base_url)
+    prefix = parts.path.rstrip('/')
+    lock = threading.Lock()
+    latencies = []
+    errors = 0
+    remaining = [requests]
+    deadline = time.perf_counter() + duration
+
+    def claim():
+        if requests is None:
+            return time.perf_counter() < deadline
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker(offset):
+        nonlocal errors
+        local = []
+        failed = 0
+        conn = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=timeout)
+        i = offset
+
+        while claim():
+            path = paths[i % len(paths)]
+            extra = headers(path) if headers else {}
+            path = prefix + path
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=extra)
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(
+                    parts.hostname, parts.port or 80, timeout=timeout)
+                continue
+
+            if resp.status < 400:
+                local.append(time.perf_counter() - start)
+            else:
+                failed += 1
+
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [
+        threading.Thread(target=worker, args=(n,), daemon=True)
+        for n in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return LoadResult(latencies, errors, time.perf_counter() - start)
+
+
+def wait_for_server(base_url, timeout=30):
+    """Block until `base_url` accepts connections."""
+
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection(
+                parts.hostname, parts.port or 80, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
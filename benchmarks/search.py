@@ -0,0 +1,175 @@
+"""Query latency of post search over a generated corpus.
+
+Builds an InvertedIndex over synthetic posts whose words follow a Zipfian
+distribution, then times queries drawn from different word-frequency bands:
+
+    python -m benchmarks.search --posts 1000000
+
+With --postgres, the same corpus is also loaded into that database (a
+throwaway one: its tables are dropped and recreated) and the same kinds of
+query are timed through search_posts() on the tsvector / GIN backend, i.e.
+one page of ranked rows as the /search route gets them:
+
+    python -m benchmarks.search --posts 100000 \\
+        --postgres postgresql:///blogly_bench
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import time
+
+from search import InvertedIndex
+
+SYLLABLES = [
+    consonant + vowel
+    for consonant in 'bcdfghjklmnprstvz'
+    for vowel in 'aeiou'
+]
+
+# (label, vocabulary ranks to draw query words from, words per query)
+# posts per INSERT when loading PostgreSQL
+BATCH = 10000
+
+BANDS = [
+    ('very common', (20, 100), 1),
+    ('common', (100, 1000), 1),
+    ('medium', (1000, 10000), 1),
+    ('rare', (10000, 50000), 1),
+    ('two words', (100, 10000), 2),
+    ('three words', (100, 10000), 3),
+]
+
+
+def make_vocabulary(size, rng):
+    """`size` distinct pseudo-words."""
+
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def corpus(count, vocabulary, rng):
+    """Yield (post id, title, content) with Zipf-distributed words."""
+
+    weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    for post_id in range(1, count + 1):
+        title = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(2, 6))
+        length = min(int(rng.lognormvariate(3.0, 0.6)), 400)
+        content = rng.choices(vocabulary, cum_weights=weights, k=length)
+        # posts.title is a VARCHAR(50)
+        yield post_id, ' '.join(title)[:50], ' '.join(content)
+
+
+def load_postgres(url, posts):
+    """Recreate the schema at `url` and insert `posts`; return the app."""
+
+    os.environ['DATABASE_URL'] = url
+    os.environ['BLOGLY_CONFIG'] = 'production'
+
+    from sqlalchemy import text
+
+    from app import app
+    from models import db, Post, User
+
+    app.config['SEARCH_BACKEND'] = 'postgres'
+    db.drop_all()
+    db.create_all()
+
+    user = User(first_name='bench', last_name='user', image_url='')
+    db.session.add(user)
+    db.session.commit()
+
+    batch = []
+    for post_id, title, content in posts:
+        batch.append({'id': post_id, 'title': title, 'content': content,
+                      'user_id': user.id, 'version': 1})
+        if len(batch) == BATCH:
+            db.session.execute(Post.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Post.__table__.insert(), batch)
+    db.session.commit()
+
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return app
+
+
+def time_bands(search, vocabulary, rng, queries):
+    """Print latency per query band; `search(query)` returns a hit count
+    (or None if it can't tell)."""
+
+    print(f"{'query band':<12} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+          f"{'avg hits':>10}")
+    for label, (low, high), words in BANDS:
+        timings = []
+        hits = []
+        for _ in range(queries):
+            query = ' '.join(
+                vocabulary[rng.randrange(low, high)] for _ in range(words))
+            start = time.perf_counter()
+            found = search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+            if found is not None:
+                hits.append(found)
+
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        avg_hits = f"{statistics.mean(hits):.0f}" if hits else '-'
+        print(f"{label:<12} {statistics.median(timings):>8.2f} {p95:>8.2f} "
+              f"{timings[-1]:>8.2f} {avg_hits:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--postgres', metavar='URL',
+                        help='also time the PostgreSQL backend, in this '
+                             '(throwaway) database')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+
+    index = InvertedIndex()
+    start = time.perf_counter()
+    for post_id, title, content in corpus(args.posts, vocabulary, rng):
+        index.add(post_id, f"{title} {content}")
+    print(f"indexed {len(index)} posts in {time.perf_counter() - start:.1f}s")
+
+    print("\nin-memory index (InvertedIndex.search)")
+    time_bands(lambda query: index.search(query, limit=20)[1],
+               vocabulary, rng, args.queries)
+
+    if args.postgres:
+        # the same corpus again, from the same seed
+        rng = random.Random(args.seed)
+        vocabulary = make_vocabulary(args.vocabulary, rng)
+        start = time.perf_counter()
+        app = load_postgres(
+            args.postgres, corpus(args.posts, vocabulary, rng))
+        print(f"\nloaded {args.posts} posts into PostgreSQL in "
+              f"{time.perf_counter() - start:.1f}s")
+
+        from search import search_posts
+
+        def first_page(query):
+            search_posts(query, per_page=20)
+            return None  # only the page, not the total, is fetched
+
+        print("PostgreSQL tsvector / GIN (search_posts, first page)")
+        with app.app_context():
+            time_bands(first_page, vocabulary, rng, args.queries)
+
+if __name__ == '__main__':
+    main()
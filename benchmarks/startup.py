@@ -0,0 +1,144 @@
+"""Compare worker startup time and per-request overhead across profiles.
+
+Each profile is booted in a fresh interpreter (so imports and schema work
+are paid every time, like a new worker) against a throwaway SQLite database,
+timing the boot, the cold first request and the mean of later ones:
+
+    python -m benchmarks.startup --runs 5 --requests 200
+
+A second table boots the production profile without the Jinja bytecode
+cache (with and without warm-up at boot), with a cache precompiled by
+`flask blogly templates`, and with that cache plus warm-up, to show what
+each saves on a cold start.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROFILES = ('development', 'test', 'production')
+
+WORKER = '''
+import json, sys, time
+
+start = time.perf_counter()
+import app
+boot = time.perf_counter() - start
+
+from models import db, User
+db.create_all()
+user = User(first_name='bench', last_name='user', image_url='')
+db.session.add(user)
+db.session.commit()
+client = app.app.test_client()
+
+start = time.perf_counter()
+client.get(f'/users/{{user.id}}')
+first = time.perf_counter() - start
+
+start = time.perf_counter()
+for _ in range({requests}):
+    client.get('/users')
+    client.get(f'/users/{{user.id}}')
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{'boot': boot, 'first': first,
+                  'request': elapsed / ({requests} * 2)}}))
+'''
+
+PRECOMPILE = '''
+import app
+from template_cache import template_cache
+template_cache.compile_all(app.app)
+'''
+
+# (name, TEMPLATE_CACHE_DIR set, precompiled, TEMPLATE_WARMUP)
+TEMPLATE_SCENARIOS = (
+    ('no cache', False, False, False),
+    ('warm', False, False, True),
+    ('bytecode', True, True, False),
+    ('bytecode+warm', True, True, True),
+)
+
+
+def run_worker(profile, requests, **settings):
+    """Boot one worker for `profile` and return its timings; `settings`
+    are extra environment variables, e.g. TEMPLATE_CACHE_DIR."""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f'sqlite:///{tmp}/bench.db'
+        env = dict(
+            os.environ,
+            BLOGLY_CONFIG=profile,
+            # the test profile reads only TEST_DATABASE_URL
+            DATABASE_URL=database_url,
+            TEST_DATABASE_URL=database_url,
+            **settings,
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER.format(requests=requests)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    # SQL echo goes to stdout too; our JSON is always the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_template_scenario(cached, precompiled, warmup, requests):
+    """Boot one production worker with a fresh template cache directory."""
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        settings = {
+            'TEMPLATE_CACHE_DIR': cache_dir if cached else '',
+            'TEMPLATE_WARMUP': '1' if warmup else '0',
+        }
+        if precompiled:
+            with tempfile.TemporaryDirectory() as tmp:
+                subprocess.run(
+                    [sys.executable, '-c', PRECOMPILE],
+                    env=dict(os.environ, BLOGLY_CONFIG='production',
+                             DATABASE_URL=f'sqlite:///{tmp}/bench.db',
+                             **settings),
+                    capture_output=True,
+                    check=True,
+                )
+        return run_worker('production', requests, **settings)
+
+
+def print_row(name, runs):
+    boot = statistics.median(run['boot'] for run in runs) * 1000
+    first = statistics.median(run['first'] for run in runs) * 1000
+    request = statistics.median(run['request'] for run in runs) * 1000
+    print(f"{name:<14} {boot:>10.1f} {first:>10.1f} {request:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'profile':<14} {'boot ms':>10} {'first ms':>10} "
+          f"{'request ms':>12}")
+    for profile in PROFILES:
+        runs = [run_worker(profile, args.requests) for _ in range(args.runs)]
+        print_row(profile, runs)
+
+    print(f"\n{'templates':<14} {'boot ms':>10} {'first ms':>10} "
+          f"{'request ms':>12}")
+    for name, cached, precompiled, warmup in TEMPLATE_SCENARIOS:
+        runs = [run_template_scenario(
+                    cached, precompiled, warmup, args.requests)
+                for _ in range(args.runs)]
+        print_row(name, runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""Benchmark every Blogly route and compare runs against a baseline.
+
+Seeds a database at the requested scale, then
+
+* runs every route (reads and writes) through the Flask test client,
+  recording latency percentiles and SQL statements per request, and
+* unless --no-http, drives every GET route over HTTP against a threaded
+  server in its own process with the threaded load generator.
+
+Results are written as JSON; pass a previous run as --baseline to flag
+routes whose p95 latency or query count got worse:
+
+    python -m benchmarks.suite --users 1000 --posts-per-user 20 \\
+        --output results.json --baseline baseline.json
+
+The exit status is 1 when a regression is found, so CI can gate on it.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.loadgen import (
+    LoadResult, run_load, start_wsgi_server, wait_for_server)
+
+BATCH = 5000
+
+WORDS = ('flask', 'python', 'dogs', 'coffee', 'travel', 'music', 'garden',
+         'recipe', 'review', 'update', 'weekend', 'project')
+
+
+def seed(db, tables, users, posts_per_user, tags, tags_per_post, rng):
+    """Bulk insert a deterministic dataset; return the number of posts."""
+
+    users_table, posts_table, tags_table, post_tags_table = tables
+    epoch = datetime(2020, 1, 1)
+
+    db.session.execute(tags_table.insert(), [
+        {'id': i, 'name': f'tag{i}', 'version': 1}
+        for i in range(1, tags + 1)
+    ])
+
+    for first in range(1, users + 1, BATCH):
+        last = min(first + BATCH, users + 1)
+        db.session.execute(users_table.insert(), [
+            {'id': i, 'first_name': f'first{i}', 'last_name': f'last{i}',
+             'image_url': '', 'version': 1}
+            for i in range(first, last)
+        ])
+
+    post_count = users * posts_per_user
+    for first in range(1, post_count + 1, BATCH):
+        last = min(first + BATCH, post_count + 1)
+        db.session.execute(posts_table.insert(), [
+            {'id': i,
+             'title': ' '.join(rng.choices(WORDS, k=3)),
+             'content': ' '.join(rng.choices(WORDS, k=rng.randint(20, 200))),
+             'created_at': epoch + timedelta(minutes=i),
+             'user_id': (i - 1) // posts_per_user + 1,
+             'version': 1}
+            for i in range(first, last)
+        ])
+        if tags:
+            db.session.execute(post_tags_table.insert(), [
+                {'post_id': i, 'tag_id': tag_id}
+                for i in range(first, last)
+                for tag_id in rng.sample(
+                    range(1, tags + 1), min(tags_per_post, tags))
+            ])
+        db.session.commit()
+
+    db.session.commit()
+    return post_count
+
+
+def routes(db, models, scale):
+    """(name, method, url or url factory, form data) for every route.
+
+    Write routes that consume a row (the deletes) get a factory making a
+    scratch row first; that setup is not timed.
+    """
+
+    User, Post, Tag = models
+    user_id = max(1, scale['users'] // 2)
+    post_id = max(1, scale['posts'] // 2)
+    tag_id = 1
+    counter = itertools.count()
+
+    def scratch(make):
+        def factory():
+            row = make(next(counter))
+            db.session.add(row)
+            db.session.commit()
+            return row.id
+        return factory
+
+    scratch_user = scratch(lambda n: User(
+        first_name='scratch', last_name=str(n), image_url=''))
+    scratch_post = scratch(lambda n: Post(
+        title='scratch', content=str(n), user_id=user_id))
+    scratch_tag = scratch(lambda n: Tag(name=f'scratch-{n}'))
+
+    post_form = {'title': 'benchmark post', 'content': 'content ' * 50,
+                 'tags': 'tag1, tag2, benchmark'}
+    user_form = {'first_name': 'bench', 'last_name': 'user',
+                 'image_url': ''}
+
+    return [
+        ('index', 'GET', '/', None),
+        ('show_all_users', 'GET', '/users', None),
+        ('show_all_users (deep)', 'GET', f'/users?after={user_id}', None),
+        ('show_new_user_form', 'GET', '/users/new', None),
+        ('submit_new_user_form', 'POST', '/users/new', user_form),
+        ('show_user_id_information', 'GET', f'/users/{user_id}', None),
+        ('show_edit_user_form', 'GET', f'/users/{user_id}/edit', None),
+        ('submit_edit_user_form', 'POST', f'/users/{user_id}/edit',
+         user_form),
+        ('delete_user', 'POST',
+         lambda: f'/users/{scratch_user()}/delete', None),
+        ('show_new_post_form', 'GET', f'/users/{user_id}/posts/new', None),
+        ('submit_new_post_form', 'POST', f'/users/{user_id}/posts/new',
+         post_form),
+        ('show_post_page', 'GET', f'/posts/{post_id}', None),
+        ('show_edit_post_form', 'GET', f'/posts/{post_id}/edit', None),
+        ('submit_edit_post_form', 'POST', f'/posts/{post_id}/edit',
+         post_form),
+        ('delete_post', 'POST',
+         lambda: f'/posts/{scratch_post()}/delete', None),
+        ('search', 'GET', '/search?q=flask+coffee', None),
+        ('show_all_tags', 'GET', '/tags', None),
+        ('show_new_tag_form', 'GET', '/tags/new', None),
+        ('submit_new_tag_form', 'POST',
+         lambda: '/tags/new', lambda: {'name': f'new-{next(counter)}'}),
+        ('show_edit_tag_form', 'GET', f'/tags/{tag_id}', None),
+        ('show_tag_posts', 'GET', f'/tags/{tag_id}/posts', None),
+        ('submit_edit_tag_form', 'POST', f'/tags/{tag_id}',
+         {'name': 'tag1'}),
+        ('delete_tag', 'POST',
+         lambda: f'/tags/{scratch_tag()}/delete', None),
+        ('api list_resource', 'GET', '/api/v1/posts?limit=100', None),
+        ('api show_resource', 'GET', f'/api/v1/users/{user_id}', None),
+    ]
+
+
+def bench_client(app, db, spec, repeat):
+    """Time one route through the test client; return its summary."""
+
+    from testing import QueryCounter
+
+    name, method, url, data = spec
+    latencies = []
+    queries = []
+    errors = 0
+
+    # a fresh client per route, so no flashed messages carry over
+    client = app.test_client()
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        target = url() if callable(url) else url
+        form = data() if callable(data) else data
+        db.session.remove()
+
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            resp = client.open(target, method=method, data=form)
+            # streamed responses only run their queries when read
+            resp.get_data()
+            resp.close()
+            latencies.append(time.perf_counter() - start)
+
+        queries.append(counter.count)
+        if resp.status_code >= 400:
+            errors += 1
+
+    result = LoadResult(latencies, errors, time.perf_counter() - started)
+    return dict(result.as_dict(), queries=max(queries))
+
+
+def bench_http(database_url, profile, paths, port, concurrency, duration):
+    """Drive each GET path over HTTP; return {path: summary}."""
+
+    server = start_wsgi_server(
+        port, DATABASE_URL=database_url, BLOGLY_CONFIG=profile)
+    base_url = f'http://127.0.0.1:{port}'
+
+    try:
+        wait_for_server(base_url)
+        return {
+            path: run_load(base_url, [path], concurrency=concurrency,
+                           duration=duration).as_dict()
+            for path in paths
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results, baseline, tolerance):
+    """Return a line per route/mode that regressed against `baseline`."""
+
+    regressions = []
+    for name, modes in results['routes'].items():
+        for mode, current in modes.items():
+            before = baseline.get('routes', {}).get(name, {}).get(mode)
+            if not before:
+                continue
+            if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f"{name} [{mode}]: p95 {before['p95_ms']} -> "
+                    f"{current['p95_ms']} ms")
+            if current.get('queries', 0) > before.get('queries', 0):
+                regressions.append(
+                    f"{name} [{mode}]: queries {before['queries']} -> "
+                    f"{current['queries']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--database-url',
+                        help='default: a throwaway SQLite database')
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--posts-per-user', type=int, default=10)
+    parser.add_argument('--tags', type=int, default=100)
+    parser.add_argument('--tags-per-post', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=50,
+                        help='test client requests per route')
+    parser.add_argument('--no-http', action='store_true')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0,
+                        help='seconds of HTTP load per GET route')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p95 slowdown (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    database_url = (args.database_url
+                    or f'sqlite:///{tempfile.mkdtemp()}/bench.db')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['BLOGLY_CONFIG'] = args.profile
+
+    from app import app
+    from models import db, Post, PostTag, Tag, User
+
+    db.drop_all()
+    db.create_all()
+
+    start = time.perf_counter()
+    post_count = seed(
+        db,
+        (User.__table__, Post.__table__, Tag.__table__, PostTag.__table__),
+        args.users, args.posts_per_user, args.tags, args.tags_per_post,
+        random.Random(args.seed))
+    User.recount_posts()
+    Tag.recount_posts()
+    db.session.commit()
+    print(f"seeded {args.users} users, {post_count} posts in "
+          f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    scale = {'users': args.users, 'posts': post_count, 'tags': args.tags,
+             'tags_per_post': args.tags_per_post}
+    specs = routes(db, (User, Post, Tag), scale)
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': db.engine.dialect.name,
+            'profile': args.profile,
+            'scale': scale,
+        },
+        'routes': {spec[0]: {} for spec in specs},
+    }
+
+    # HTTP first: the write routes below change the data
+    if not args.no_http:
+        get_paths = {name: url for name, method, url, _ in specs
+                     if method == 'GET' and not callable(url)}
+        http = bench_http(database_url, args.profile, list(get_paths.values()),
+                          args.port, args.concurrency, args.duration)
+        for name, path in get_paths.items():
+            results['routes'][name]['http'] = http[path]
+
+    for spec in specs:
+        results['routes'][spec[0]]['client'] = bench_client(
+            app, db, spec, args.repeat)
+
+    print(f"{'route':<28} {'mode':<7} {'req/s':>9} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, modes in results['routes'].items():
+        for mode, row in sorted(modes.items()):
+            print(f"{name:<28} {mode:<7} {row['rps']:>9} {row['p50_ms']:>8} "
+                  f"{row['p95_ms']:>8} {row['p99_ms']:>8} "
+                  f"{row.get('queries', ''):>8}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Show that the tag posts page stays flat as a tag grows.
+
+Seeds a throwaway SQLite database in steps, tagging every post with a
+"popular" tag plus one of --tags other distinct tags, and at each size times
+the popular tag's first page and a deep page, and one of the small tags'
+first page. Then it times creating a post whose tags all exist (answered
+from the tag cache) against one whose tags are all new names (the INSERT ...
+RETURNING path):
+
+    python -m benchmarks.tag_posts --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+BATCH = 10000
+
+# tags per created post
+NEW_POST_TAGS = 3
+
+
+def seed(db, Post, PostTag, user_id, tag_id, tag_ids, start, stop):
+    """Insert posts start..stop-1, all tagged with `tag_id` and each with
+    one of `tag_ids` in turn."""
+
+    epoch = datetime(2020, 1, 1)
+    for first in range(start, stop, BATCH):
+        last = min(first + BATCH, stop)
+        db.session.execute(Post.__table__.insert(), [
+            {
+                'id': i + 1,
+                'title': f'post {i}',
+                'content': 'content',
+                'created_at': epoch + timedelta(minutes=i),
+                'user_id': user_id,
+                'version': 1,
+            }
+            for i in range(first, last)
+        ])
+        db.session.execute(PostTag.__table__.insert(), [
+            {'post_id': i + 1, 'tag_id': tag}
+            for i in range(first, last)
+            for tag in (tag_id, tag_ids[i % len(tag_ids)])
+        ])
+        db.session.commit()
+
+    # refresh planner statistics, as autovacuum would on PostgreSQL, so the
+    # planner knows walking ix_posts_created_at_id beats sorting the tag
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def time_get(client, url, repeat):
+    """Median milliseconds for GET `url`."""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        resp = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert resp.status_code == 200, resp.status_code
+    return statistics.median(timings) * 1000
+
+
+def time_new_posts(client, user_id, tag_names, repeat):
+    """Median milliseconds to create a post tagged with `tag_names()`,
+    called afresh for each post."""
+
+    timings = []
+    for _ in range(repeat):
+        form = {'title': 'new post', 'content': 'content',
+                'tags': ', '.join(tag_names())}
+        start = time.perf_counter()
+        resp = client.post(f'/users/{user_id}/posts/new', data=form)
+        timings.append(time.perf_counter() - start)
+        assert resp.status_code == 302, resp.status_code
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--tags', type=int, default=1000,
+                        help='distinct tags besides "popular"')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['BLOGLY_CONFIG'] = 'production'
+    os.environ['DATABASE_URL'] = f'sqlite:///{tmp}/bench.db'
+
+    from app import app
+    from models import db, Post, PostTag, Tag, User
+    from pagination import format_time_cursor
+
+    db.create_all()
+    user = User(first_name='bench', last_name='user', image_url='')
+    tag = Tag(name='popular')
+    db.session.add_all([user, tag])
+    db.session.commit()
+
+    tag_ids = list(db.session.execute(
+        Tag.__table__.insert().returning(Tag.id),
+        [{'name': f'tag-{n}', 'version': 1}
+         for n in range(args.tags)]).scalars())
+    db.session.commit()
+
+    client = app.test_client()
+    seeded = 0
+
+    print(f"{'posts':>10} {'first page ms':>15} {'deep page ms':>14} "
+          f"{'small tag ms':>14}")
+    for size in sorted(args.sizes):
+        seed(db, Post, PostTag, user.id, tag.id, tag_ids, seeded, size)
+        seeded = size
+
+        # a cursor halfway down the tag's history
+        middle = datetime(2020, 1, 1) + timedelta(minutes=size // 2)
+        deep = format_time_cursor((middle, size // 2 + 1))
+
+        first_ms = time_get(client, f'/tags/{tag.id}/posts', args.repeat)
+        deep_ms = time_get(
+            client, f'/tags/{tag.id}/posts?after={deep}', args.repeat)
+        small_ms = time_get(
+            client, f'/tags/{tag_ids[0]}/posts', args.repeat)
+        print(f"{size:>10} {first_ms:>15.2f} {deep_ms:>14.2f} "
+              f"{small_ms:>14.2f}")
+
+    existing = itertools.cycle(f'tag-{n}' for n in range(args.tags))
+    new = itertools.count()
+
+    existing_ms = time_new_posts(
+        client, user.id,
+        lambda: [next(existing) for _ in range(NEW_POST_TAGS)], args.repeat)
+    new_ms = time_new_posts(
+        client, user.id,
+        lambda: [f'new-{next(new)}' for _ in range(NEW_POST_TAGS)],
+        args.repeat)
+
+    print(f"\nnew post with {NEW_POST_TAGS} tags: existing names "
+          f"{existing_ms:.2f} ms, new names {new_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
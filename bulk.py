@@ -0,0 +1,437 @@
+"""Streaming bulk import and export of Blogly data (CSV and JSON Lines).
+
+Records are read and written one chunk at a time, so memory use stays flat
+whatever the size of the file or table. Imports apply the same validation as
+the form routes, reject records that don't decode, refer to missing rows or
+repeat a unique value, and insert each chunk with a single executemany.
+"""
+
+import csv
+import io
+import json
+from collections import Counter
+from datetime import datetime
+
+from flask import (
+    Blueprint, Response, abort, jsonify, request, stream_with_context)
+from sqlalchemy import bindparam, text, tuple_
+from sqlalchemy.exc import StatementError
+
+from admin import require_admin
+from cache import page_cache
+from models import db, is_blank, Post, PostTag, Tag, User
+from search import reset_search_index
+from timeline import timeline
+
+bp = Blueprint('bulk', __name__, url_prefix='/admin')
+bp.before_request(require_admin)
+
+FORMATS = ('csv', 'jsonl')
+
+# kind: (table, exported/imported columns, required columns)
+TABLES = {
+    'users': (
+        User.__table__,
+        ('id', 'first_name', 'last_name', 'image_url'),
+        ('first_name', 'last_name'),
+    ),
+    'posts': (
+        Post.__table__,
+        ('id', 'title', 'content', 'created_at', 'user_id'),
+        ('title', 'content', 'user_id'),
+    ),
+    'tags': (
+        Tag.__table__,
+        ('id', 'name'),
+        ('name',),
+    ),
+    'post_tags': (
+        PostTag.__table__,
+        ('post_id', 'tag_id'),
+        ('post_id', 'tag_id'),
+    ),
+}
+
+INTEGER_COLUMNS = ('id', 'user_id', 'post_id', 'tag_id')
+
+# kind: {column: table whose ids it must refer to}
+REFERENCES = {
+    'posts': {'user_id': User.__table__},
+    'post_tags': {'post_id': Post.__table__, 'tag_id': Tag.__table__},
+}
+
+# kind: column groups that can't repeat a value already in the table
+UNIQUE = {
+    'users': [('id',)],
+    'posts': [('id',)],
+    'tags': [('id',), ('name',)],
+    'post_tags': [('post_id', 'tag_id')],
+}
+
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportResult:
+    """Counts for one import, plus the first few rejected lines."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': [
+                {'line': line, 'message': message}
+                for line, message in self.errors
+            ],
+        }
+
+
+def format_for(filename, default='csv'):
+    """Guess csv/jsonl from a file name's extension."""
+
+    if filename and filename.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if filename and filename.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+class InvalidRecord:
+    """Stands in for a record that couldn't be decoded, so the import
+    rejects it with `message` instead of failing."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def read_records(stream, fmt):
+    """Yield one dict (or InvalidRecord) per record from a text stream."""
+
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    yield InvalidRecord(f"Invalid JSON: {exc}")
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+
+def _blank(value):
+    return value is None or is_blank(str(value))
+
+
+def _convert(column, value):
+    """`value` as the Python type `column` stores, within its length.
+
+    Raises ValueError for values of the wrong type or too long.
+    """
+
+    name = column.name
+    if name in INTEGER_COLUMNS:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"Invalid {name}.")
+        return int(value)
+
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid {name}.")
+    if name == 'created_at':
+        return datetime.fromisoformat(value)
+
+    length = getattr(column.type, 'length', None)
+    if length is not None and len(value) > length:
+        raise ValueError(
+            f"Invalid {name}: longer than {length} characters.")
+    return value
+
+
+def _row(kind, record):
+    """Pick the known columns out of `record`, converting types.
+
+    Raises ValueError for values that can't be converted or don't fit.
+    """
+
+    table, columns, required = TABLES[kind]
+
+    if isinstance(record, InvalidRecord):
+        raise ValueError(record.message)
+    if not isinstance(record, dict):
+        raise ValueError("Record is not an object.")
+
+    missing = [column for column in required if _blank(record.get(column))]
+    if missing:
+        raise ValueError(f"Invalid {', '.join(missing)}.")
+
+    row = {}
+    for column in columns:
+        value = record.get(column)
+        if _blank(value):
+            continue
+        row[column] = _convert(table.c[column], value)
+
+    if kind == 'users':
+        row.setdefault('image_url', '')
+    if 'version' in table.c:
+        row['version'] = 1
+
+    return row
+
+
+def _existing(table, columns, values):
+    """The subset of `values` (tuples over `columns`) already in `table`."""
+
+    if len(columns) == 1:
+        column = table.c[columns[0]]
+        found = db.session.execute(
+            db.select(column).where(column.in_({v[0] for v in values})))
+    else:
+        key = tuple_(*(table.c[column] for column in columns))
+        found = db.session.execute(
+            db.select(*key.clauses).where(key.in_(values)))
+    return {tuple(row) for row in found}
+
+
+def _check_chunk(kind, chunk, result):
+    """Reject rows of `chunk` ([(line, row)]) that refer to missing rows or
+    repeat a unique value; return the rest. One query per constraint."""
+
+    table = TABLES[kind][0]
+
+    for column, target in REFERENCES.get(kind, {}).items():
+        ids = {(row[column],) for _, row in chunk}
+        found = _existing(target, ('id',), ids) if ids else set()
+        missing = {row_id for row_id, in ids - found}
+        for line, row in chunk:
+            if row[column] in missing:
+                result.reject(line, f"No {target.name} row {row[column]}.")
+        chunk = [(line, row) for line, row in chunk
+                 if row[column] not in missing]
+
+    for columns in UNIQUE.get(kind, ()):
+        keyed = [(line, row) for line, row in chunk
+                 if all(column in row for column in columns)]
+        values = {tuple(row[column] for column in columns)
+                  for _, row in keyed}
+        taken = _existing(table, columns, values) if values else set()
+
+        rejected = set()
+        for line, row in keyed:
+            value = tuple(row[column] for column in columns)
+            if value in taken:
+                result.reject(
+                    line, f"Duplicate {', '.join(columns)}: "
+                          f"{', '.join(map(str, value))}.")
+                rejected.add(line)
+            taken.add(value)
+        chunk = [(line, row) for line, row in chunk if line not in rejected]
+
+    return chunk
+
+
+def _insert_rows(table, rows):
+    """Insert `rows` with one executemany per distinct set of columns."""
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    for group in groups.values():
+        db.session.execute(table.insert(), group)
+
+
+def _insert_chunk(kind, chunk, result):
+    """Check and insert `chunk` ([(line, row)]) in one transaction, adding
+    to `result`.
+
+    Should the database still refuse the chunk (e.g. a row written by
+    someone else meanwhile, or a value it won't take), it's retried row by
+    row so only the offending rows are rejected. Losing the connection
+    isn't any row's fault, and is raised.
+    """
+
+    table = TABLES[kind][0]
+    chunk = _check_chunk(kind, chunk, result)
+
+    try:
+        _insert_rows(table, [row for _, row in chunk])
+        db.session.flush()
+    except StatementError as exc:
+        db.session.rollback()
+        if getattr(exc, 'connection_invalidated', False):
+            raise
+
+        accepted = []
+        for line, row in chunk:
+            try:
+                with db.session.begin_nested():
+                    _insert_rows(table, [row])
+            except StatementError as exc:
+                if getattr(exc, 'connection_invalidated', False):
+                    raise
+                result.reject(line, str(exc.orig))
+            else:
+                accepted.append((line, row))
+        chunk = accepted
+
+    rows = [row for _, row in chunk]
+
+    # new posts and links change their users' and tags' post_count (and so
+    # their pages): one executemany per chunk keeps the counters in step
+    if rows and kind == 'posts':
+        _count_posts(User, Counter(row['user_id'] for row in rows))
+    elif rows and kind == 'post_tags':
+        _count_posts(Tag, Counter(row['tag_id'] for row in rows))
+
+    db.session.commit()
+    result.inserted += len(rows)
+
+
+def _count_posts(model, counts):
+    """Add {id: count} to `model` rows' post_count, bumping their versions."""
+
+    table = model.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == bindparam('row_id'))
+        .values(
+            post_count=table.c.post_count + bindparam('added'),
+            version=table.c.version + 1,
+            updated_at=datetime.utcnow()),
+        [{'row_id': row_id, 'added': added}
+         for row_id, added in counts.items()])
+
+
+def reset_sequence(kind):
+    """Move a PostgreSQL id sequence past ids that were imported explicitly."""
+
+    table = TABLES[kind][0]
+    if db.engine.dialect.name != 'postgresql' or 'id' not in table.c:
+        return
+
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"coalesce(max(id), 1)) FROM {table.name}"))
+    db.session.commit()
+
+
+def import_records(kind, records, chunk_size=1000):
+    """Validate and insert `records` of `kind`; return an ImportResult."""
+
+    result = ImportResult()
+    chunk = []
+    explicit_ids = False
+
+    for line, record in enumerate(records, start=1):
+        try:
+            row = _row(kind, record)
+        except (ValueError, TypeError) as exc:
+            result.reject(line, str(exc))
+            continue
+
+        explicit_ids = explicit_ids or 'id' in row
+        chunk.append((line, row))
+
+        if len(chunk) >= chunk_size:
+            _insert_chunk(kind, chunk, result)
+            chunk = []
+
+    if chunk:
+        _insert_chunk(kind, chunk, result)
+
+    if explicit_ids:
+        reset_sequence(kind)
+
+    page_cache.clear()
+    timeline.clear()
+    if kind == 'posts':
+        reset_search_index()
+
+    return result
+
+
+def export_records(kind, fmt, chunk_size=1000):
+    """Yield the `kind` table as CSV or JSON Lines text, a chunk at a time."""
+
+    table, columns, _ = TABLES[kind]
+
+    rows = db.session.execute(
+        db.select(*(table.c[column] for column in columns))
+        .order_by(*table.primary_key.columns)
+        .execution_options(yield_per=chunk_size))
+
+    buffer = io.StringIO()
+
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for partition in rows.partitions():
+            writer.writerows(partition)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    elif fmt == 'jsonl':
+        for partition in rows.partitions():
+            for row in partition:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                buffer.write('\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+
+    # csv.writer with no rows still needs its header line sent
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+
+@bp.post('/import/<kind>')
+def import_upload(kind):
+    """Import an uploaded CSV / JSONL file; responds with a JSON summary"""
+
+    if kind not in TABLES:
+        abort(404)
+
+    upload = request.files.get('file')
+    if upload is None:
+        abort(400)
+
+    fmt = request.form.get('format') or format_for(upload.filename)
+    if fmt not in FORMATS:
+        abort(400)
+
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    result = import_records(kind, read_records(stream, fmt))
+
+    return jsonify(result.to_dict())
+
+
+@bp.get('/export/<kind>.<fmt>')
+def export_download(kind, fmt):
+    """Stream a table out as CSV / JSONL"""
+
+    if kind not in TABLES or fmt not in FORMATS:
+        abort(404)
+
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+
+    return Response(
+        stream_with_context(export_records(kind, fmt)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={kind}.{fmt}'},
+    )
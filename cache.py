@@ -0,0 +1,240 @@
+"""Rendered-fragment cache for Blogly pages.
+
+Pages are cached as rendered HTML fragments (everything except flashed
+messages and the base layout) keyed by the entity they show. Each cached
+fragment remembers a version token for every entity it was built from; write
+routes call `page_cache.invalidate(...)` for the entities they touch, which
+swaps in new version tokens so every fragment built from the old data misses.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+class CacheBackend:
+    """Interface for fragment cache storage.
+
+    Swap in another backend (e.g. one talking to a shared cache server) by
+    implementing these four methods; values are plain picklable data and a
+    `ttl` of 0 means the entry never expires.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    """In-process LRU cache bounded by entry count, with per-entry TTL."""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MappingCache(CacheBackend):
+    """Backend over any dict-like object, without eviction or TTL.
+
+    Handing it a `multiprocessing.Manager().dict()` gives a local stand-in
+    for a cache shared between worker processes.
+    """
+
+    def __init__(self, mapping=None):
+        self.mapping = {} if mapping is None else mapping
+
+    def get(self, key):
+        return self.mapping.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.mapping[key] = value
+
+    def delete(self, key):
+        self.mapping.pop(key, None)
+
+    def clear(self):
+        self.mapping.clear()
+
+
+def _key(entity):
+    """Turn an entity tuple like ('user', 3) into a backend key."""
+
+    return ':'.join(str(part) for part in entity)
+
+
+class FragmentCache:
+    """Cache rendered fragments and invalidate them by entity."""
+
+    GENERATION_KEY = 'generation'
+    INVALIDATED_AT_KEY = 'invalidated_at'
+
+    def __init__(self, backend=None, enabled=True):
+        self.backend = LRUCache() if backend is None else backend
+        self.enabled = enabled
+        # returns how many seconds the current request's data may lag
+        # behind the latest writes (nonzero when reading from a replica)
+        self.replica_lag = lambda: 0
+
+    def init_app(self, app):
+        """Configure from PAGE_CACHE_* settings on `app`."""
+
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', True)
+        self.backend = app.config.get('PAGE_CACHE_BACKEND') or LRUCache(
+            max_size=app.config.get('PAGE_CACHE_SIZE', 1024),
+            ttl=app.config.get('PAGE_CACHE_TTL', 300),
+        )
+
+    def version(self, entity):
+        """Return the current version token for `entity`.
+
+        A missing token (never set, expired or evicted) is replaced by a new
+        one, so losing a version can only cause misses, never stale hits.
+        """
+
+        key = 'version:' + _key(entity)
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set(key, token, ttl=0)
+        return token
+
+    def invalidate(self, *entities):
+        """Expire every fragment built from any of `entities`."""
+
+        for entity in entities:
+            self.backend.set(
+                'version:' + _key(entity), uuid.uuid4().hex, ttl=0)
+        self.backend.set(self.GENERATION_KEY, uuid.uuid4().hex, ttl=0)
+        self.backend.set(self.INVALIDATED_AT_KEY, time.time(), ttl=0)
+
+    def fragment(self, entity, render):
+        """Return cached HTML for `entity`, calling `render` on a miss.
+
+        `render()` returns `(html, deps)` where `deps` lists the entities the
+        HTML was built from. A render that overlapped a write, or that read
+        from a replica possibly still behind the latest write, is returned
+        but not stored, so a slow reader can't cache pre-write data.
+        """
+
+        if not self.enabled:
+            return Markup(render()[0])
+
+        html = self.get('fragment', entity)
+        if html is None:
+            generation = self.generation()
+            html, deps = render()
+            html = str(html)
+            self.put('fragment', entity, html, deps, generation)
+
+        return Markup(html)
+
+    async def fragment_async(self, entity, render):
+        """fragment() for an async `render()`, e.g. one loading from the
+        asyncio engine."""
+
+        if not self.enabled:
+            return Markup((await render())[0])
+
+        html = self.get('fragment', entity)
+        if html is None:
+            generation = self.generation()
+            html, deps = await render()
+            html = str(html)
+            self.put('fragment', entity, html, deps, generation)
+
+        return Markup(html)
+
+    def get(self, kind, entity):
+        """The cached `kind` value for `entity` if none of its dependencies
+        changed since, else None."""
+
+        if not self.enabled:
+            return None
+
+        entry = self.backend.get(kind + ':' + _key(entity))
+        if entry is not None:
+            value, versions = entry
+            if all(self.version(dep) == token for dep, token in versions):
+                return value
+        return None
+
+    def generation(self):
+        """Token that changes on every invalidation; take it before reading
+        the data a value is built from and pass it to put()."""
+
+        return self.backend.get(self.GENERATION_KEY)
+
+    def put(self, kind, entity, value, deps, generation):
+        """Cache a picklable `value` built from the `deps` entities, unless
+        a write may have overlapped or preceded the read (see fragment())."""
+
+        if (not self.enabled
+                or self.backend.get(self.GENERATION_KEY) != generation
+                or self._may_lag()):
+            return
+
+        versions = [(tuple(dep), self.version(dep)) for dep in deps]
+        self.backend.set(kind + ':' + _key(entity), (value, versions))
+
+    def _may_lag(self):
+        lag = self.replica_lag()
+        if not lag:
+            return False
+
+        invalidated_at = self.backend.get(self.INVALIDATED_AT_KEY)
+        return invalidated_at is not None and time.time() - invalidated_at < lag
+
+    def clear(self):
+        self.backend.clear()
+
+
+page_cache = FragmentCache()
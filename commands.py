@@ -0,0 +1,146 @@
+"""`flask blogly ...` maintenance commands."""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import TemplateError
+
+import assets
+import bulk
+import synthetic
+from cache import page_cache
+from models import db, Tag, User
+from template_cache import template_cache
+
+blogly_cli = AppGroup('blogly', help='Blogly maintenance commands.')
+
+
+@blogly_cli.command('import')
+@click.argument('kind', type=click.Choice(list(bulk.TABLES)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS),
+              help='Input format (default: guessed from the file name).')
+@click.option('--chunk-size', default=1000, show_default=True)
+def import_command(kind, source, fmt, chunk_size):
+    """Stream users, posts, tags or post_tags in from a CSV/JSONL file."""
+
+    fmt = fmt or bulk.format_for(source.name)
+    result = bulk.import_records(
+        kind, bulk.read_records(source, fmt), chunk_size=chunk_size)
+
+    click.echo(f"Inserted {result.inserted}, rejected {result.rejected}.")
+    for line, message in result.errors:
+        click.echo(f"  line {line}: {message}", err=True)
+
+
+@blogly_cli.command('export')
+@click.argument('kind', type=click.Choice(list(bulk.TABLES)))
+@click.argument('dest', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(bulk.FORMATS),
+              help='Output format (default: guessed from the file name).')
+@click.option('--chunk-size', default=1000, show_default=True)
+def export_command(kind, dest, fmt, chunk_size):
+    """Stream a table out to a CSV/JSONL file (default: stdout)."""
+
+    fmt = fmt or bulk.format_for(dest.name)
+    for chunk in bulk.export_records(kind, fmt, chunk_size=chunk_size):
+        dest.write(chunk)
+
+
+@blogly_cli.command('generate')
+@click.option('--users', default=1000, show_default=True)
+@click.option('--posts', default=10000, show_default=True)
+@click.option('--tags', default=500, show_default=True)
+@click.option('--tags-per-post', default=3, show_default=True,
+              help='Mean tags per post (Zipf-distributed over tags).')
+@click.option('--mean-words', default=80, show_default=True,
+              help='Mean post length in words (log-normal).')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--batch-size', default=10000, show_default=True)
+def generate_command(users, posts, tags, tags_per_post, mean_words, seed,
+                     batch_size):
+    """Append deterministic synthetic users, posts and tags."""
+
+    current = [None]
+
+    def progress(kind, done, total):
+        if current[0] not in (None, kind):
+            click.echo(err=True)
+        current[0] = kind
+        click.echo(f"\r{kind}: {done:,} / ~{total:,}", nl=False, err=True)
+
+    inserted = synthetic.generate(
+        users=users, posts=posts, tags=tags, tags_per_post=tags_per_post,
+        mean_words=mean_words, seed=seed, batch_size=batch_size,
+        progress=progress)
+    if current[0] is not None:
+        click.echo(err=True)
+
+    click.echo(', '.join(
+        f"{count:,} {kind}" for kind, count in inserted.items()) + '.')
+
+
+@blogly_cli.command('recount')
+def recount_command():
+    """Repair users' and tags' post_count from the posts themselves."""
+
+    users = User.recount_posts()
+    tags = Tag.recount_posts()
+    db.session.commit()
+
+    if users or tags:
+        # the listings show the counts
+        page_cache.clear()
+
+    click.echo(f"Fixed post_count on {users:,} users and {tags:,} tags.")
+
+
+@blogly_cli.command('assets')
+@click.option('--fetch', is_flag=True,
+              help='First download any missing pinned vendor files.')
+def assets_command(fetch):
+    """Build the purged, minified, fingerprinted static bundles."""
+
+    config = current_app.config
+    source_dir = os.path.join(current_app.root_path, config['ASSETS_SOURCE'])
+    output_dir = os.path.join(current_app.root_path, config['ASSETS_OUTPUT'])
+
+    if fetch:
+        try:
+            for path in assets.fetch_vendor(source_dir):
+                click.echo(f"Fetched {path}.")
+        except (OSError, ValueError) as exc:
+            raise click.ClickException(f"Fetching failed: {exc}")
+
+    used = assets.UsedSelectors.scan(
+        [os.path.join(current_app.root_path, current_app.template_folder)],
+        config['ASSET_SAFELIST'])
+    try:
+        report = assets.build(
+            source_dir, output_dir, config['ASSET_BUNDLES'], used)
+    except FileNotFoundError as exc:
+        raise click.ClickException(
+            f"{exc.filename} is missing (vendor files: use --fetch)")
+    assets.static_assets.load()
+
+    for name, sizes in report.items():
+        compressed = ', '.join(
+            f"{encoding} {sizes[encoding]:,}"
+            for encoding, _, _ in assets.ENCODINGS)
+        click.echo(f"{name}: {sizes['source']:,} -> {sizes['built']:,} "
+                   f"bytes ({compressed}) as {sizes['file']}")
+
+
+@blogly_cli.command('templates')
+def templates_command():
+    """Compile every template into the Jinja bytecode cache."""
+
+    try:
+        names = template_cache.compile_all(current_app)
+    except (ValueError, TemplateError) as exc:
+        raise click.ClickException(f"Compiling templates failed: {exc}")
+
+    click.echo(f"Compiled {len(names)} templates into "
+               f"{template_cache.directory}.")
@@ -0,0 +1,144 @@
+"""Compression of Blogly responses (gzip, plus brotli / zstd if installed).
+
+An after_request hook compresses text responses of at least
+COMPRESS_MIN_SIZE bytes with the best encoding the client accepts. Bodies are
+looked up by their digest in a bounded LRU of their own first, so each
+version of a page (or feed, or API document) is compressed once, not per
+request. (Being content-addressed, they never need invalidating; keeping
+them out of the page cache means large bodies can't evict its version
+tokens.)
+
+Compressed responses get a weak ETag, since the bytes differ from the
+uncompressed representation; conditional GETs still compare equal (If-None-
+Match uses weak comparison). Streamed responses and ones that already have
+a Content-Encoding (e.g. precompressed assets) are left alone.
+"""
+
+import gzip
+import hashlib
+
+from flask import request
+
+from cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(data, level):
+    return gzip.compress(data, level, mtime=0)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# Content-Encoding: compress(data, level), in order of preference
+CODECS = {}
+if brotli is not None:
+    CODECS['br'] = _brotli
+if zstandard is not None:
+    CODECS['zstd'] = _zstd
+CODECS['gzip'] = _gzip
+
+DEFAULT_LEVELS = {'br': 5, 'zstd': 3, 'gzip': 6}
+
+COMPRESSIBLE = frozenset((
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/x-ndjson', 'application/xml',
+    'application/atom+xml', 'application/rss+xml',
+))
+
+
+class Compression:
+    """Negotiate and apply a Content-Encoding to responses."""
+
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 500
+        self.levels = dict(DEFAULT_LEVELS)
+        # (encoding, level, body digest) -> compressed body; None: no cache
+        self.cache = LRUCache(max_size=256, ttl=0)
+
+    def init_app(self, app):
+        """Configure from COMPRESS_* settings and install the hook."""
+
+        self.enabled = app.config.get('COMPRESSION', True)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+        self.levels = dict(
+            DEFAULT_LEVELS, **app.config.get('COMPRESS_LEVELS', {}))
+        size = app.config.get('COMPRESS_CACHE_SIZE', 256)
+        self.cache = LRUCache(max_size=size, ttl=0) if size else None
+        app.after_request(self._after_request)
+
+    def choose(self, accept_encodings):
+        """Our most preferred encoding among those the client accepts
+        with the highest quality, or None."""
+
+        best, best_quality = None, 0
+        for encoding in CODECS:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def compress(self, data, encoding):
+        """Compressed `data`, from the cache if this exact body was
+        compressed before."""
+
+        level = self.levels[encoding]
+        if self.cache is None:
+            return CODECS[encoding](data, level)
+
+        key = (encoding, level, hashlib.blake2b(data, digest_size=16).digest())
+        compressed = self.cache.get(key)
+        if compressed is None:
+            compressed = CODECS[encoding](data, level)
+            self.cache.set(key, compressed)
+        return compressed
+
+    def _after_request(self, response):
+        if (not self.enabled
+                or response.mimetype not in COMPRESSIBLE
+                or response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = self.choose(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        compressed = self.compress(data, encoding)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.content_encoding = encoding
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,95 @@
+"""HTTP conditional GET (ETag / Last-Modified) helpers for Blogly.
+
+Read routes build their validators from the `version` / `updated_at` columns
+with a cheap query, call `not_modified()` *before* rendering and return its
+304 if it gives one, then wrap the rendered page with `with_validators()`.
+"""
+
+import hashlib
+from datetime import timezone
+
+from flask import make_response, request, session
+from flask.globals import request_ctx
+from werkzeug.wrappers import Response
+
+
+def make_etag(*parts):
+    """Return a strong ETag value for the versions in `parts`."""
+
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def page_validators(page, *parts):
+    """Return (etag, last_modified) for a KeysetPage of versioned rows."""
+
+    etag = make_etag(
+        *parts,
+        page.prev_cursor,
+        page.next_cursor,
+        [(row.id, row.version) for row in page],
+    )
+    last_modified = max((row.updated_at for row in page), default=None)
+
+    return etag, last_modified
+
+
+def _has_flashes():
+    """Flashed messages make the page unique to this one response."""
+
+    # once rendered, get_flashed_messages() moves them off the session
+    flashes = request_ctx.flashes
+    if flashes is None:
+        flashes = session.get('_flashes')
+    return bool(flashes)
+
+
+def _to_http_date(last_modified):
+    """Drop sub-second precision and mark as UTC, like an HTTP date."""
+
+    return last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+
+def not_modified(etag, last_modified, shows_flashes=True):
+    """Return a 304 response if the client's copy is current, else None.
+
+    Pass `shows_flashes=False` for responses that never include flashed
+    messages (e.g. feeds), so they can 304 whatever is in the session.
+    """
+
+    if shows_flashes and _has_flashes():
+        return None
+
+    # weak comparison, so a compressed copy (weak ETag) still matches
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        matched = _to_http_date(last_modified) <= request.if_modified_since
+    else:
+        matched = False
+
+    if not matched:
+        return None
+
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _to_http_date(last_modified)
+    return response
+
+
+def with_validators(body, etag, last_modified, shows_flashes=True):
+    """Make a response from `body` carrying the ETag / Last-Modified headers.
+
+    Pages showing flashed messages are left without validators so a later
+    request can't revalidate into a copy that still has the message.
+    """
+
+    response = make_response(body)
+
+    if not (shows_flashes and _has_flashes()):
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = _to_http_date(last_modified)
+        response.cache_control.no_cache = True
+
+    return response
@@ -0,0 +1,170 @@
+"""Configuration profiles for Blogly.
+
+Pick one with the BLOGLY_CONFIG environment variable (or pass its name to
+`create_app`): development (the default), test or production.
+"""
+
+import os
+
+
+class Config:
+    """Settings shared by every profile."""
+
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        "DATABASE_URL", 'postgresql:///blogly')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ECHO = False
+
+    # read replicas for GET requests, e.g.
+    # DATABASE_REPLICA_URLS=postgresql://replica1/blogly,postgresql://replica2/blogly
+    SQLALCHEMY_REPLICA_URIS = [
+        url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+        if url
+    ]
+    # assumed upper bound on replication lag: reads stay on the primary this
+    # long after a write, and replica reads don't fill the page cache this
+    # long after an invalidation
+    REPLICA_MAX_LAG = 5
+    # seconds to skip a replica that failed, and between health checks
+    REPLICA_RETRY_AFTER = 30
+    REPLICA_CHECK_INTERVAL = 5
+
+    SECRET_KEY = os.environ.get('SECRET_KEY', "SECRET!")
+
+    # bearer token for operator-only routes (/admin/*, /metrics); unset:
+    # they 404
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+    USERS_PER_PAGE = 50
+    TAGS_PER_PAGE = 50
+    POSTS_PER_PAGE = 20
+
+    # 'postgres' (tsvector + GIN), 'memory' (in-process inverted index) or
+    # 'auto' to pick by database
+    SEARCH_BACKEND = 'auto'
+
+    # posts per page of an Atom/RSS feed
+    FEED_SIZE = 20
+
+    # posts on the home page timeline, and whether to load it at startup
+    # rather than on the first visit; each worker reloads its copy when it's
+    # TIMELINE_MAX_AGE seconds old, to pick up other workers' writes
+    TIMELINE_SIZE = 20
+    TIMELINE_PRELOAD = False
+    TIMELINE_MAX_AGE = 30
+
+    # static bundles built by `flask blogly assets` from files under
+    # ASSETS_SOURCE into ASSETS_OUTPUT and served from ASSETS_URL; classes
+    # only ever added from template expressions must be safelisted
+    ASSETS_SOURCE = 'assets'
+    ASSETS_OUTPUT = 'static/dist'
+    ASSETS_URL = '/assets/'
+    ASSET_BUNDLES = {
+        'blogly.css': ['vendor/bootstrap.min.css'],
+    }
+    ASSET_SAFELIST = []
+
+    # compress text responses of at least COMPRESS_MIN_SIZE bytes with br,
+    # zstd (if installed) or gzip; the last COMPRESS_CACHE_SIZE compressed
+    # bodies are kept (0: none). Levels per encoding tune CPU against bytes
+    # saved (see benchmarks/compression.py)
+    COMPRESSION = True
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_CACHE_SIZE = 256
+    COMPRESS_LEVELS = {'br': 5, 'zstd': 3, 'gzip': 6}
+
+    # directory (relative to the app) for compiled Jinja bytecode, filled
+    # ahead of time by `flask blogly templates` (None: no bytecode cache);
+    # warm-up loads every template while the app is built
+    TEMPLATE_CACHE_DIR = None
+    TEMPLATE_WARMUP = False
+
+    # users with more posts than this are deleted by a background purge
+    # (None: always delete inline)
+    PURGE_IN_BACKGROUND_AFTER = 10000
+    PURGE_BATCH_SIZE = 1000
+
+    # per-request SQL/render timings, Server-Timing headers and /metrics
+    INSTRUMENTATION = False
+
+    # log requests that repeat a statement (N+1) or run slow ones; strict
+    # mode raises instead, failing the test that made the request
+    QUERY_AUDIT = False
+    QUERY_AUDIT_STRICT = False
+    SLOW_QUERY_SECONDS = 0.25
+    DUPLICATE_QUERY_THRESHOLD = 2
+
+    # install flask-debugtoolbar / run db.create_all() when the app is built
+    DEBUG_TOOLBAR = False
+    CREATE_ALL = False
+
+
+class DevelopmentConfig(Config):
+    """Local development: echo SQL, debug toolbar, create missing tables."""
+
+    DEBUG = True
+    SQLALCHEMY_ECHO = True
+    DEBUG_TOOLBAR = True
+    DEBUG_TB_INTERCEPT_REDIRECTS = False
+    CREATE_ALL = True
+    QUERY_AUDIT = True
+
+
+def per_worker_database(url):
+    """Give each pytest-xdist worker its own database.
+
+    postgresql:///blogly_test becomes blogly_test_gw0, blogly_test_gw1...;
+    sqlite:////tmp/test.db becomes /tmp/test_gw0.db and so on.
+    """
+
+    worker = os.environ.get('PYTEST_XDIST_WORKER')
+    if not worker:
+        return url
+
+    from sqlalchemy.engine import make_url
+
+    url = make_url(url)
+    if url.database in (None, '', ':memory:'):
+        return url.render_as_string(hide_password=False)
+
+    root, ext = os.path.splitext(url.database)
+    return url.set(database=f'{root}_{worker}{ext}').render_as_string(
+        hide_password=False)
+
+
+class TestConfig(Config):
+    """Test suites: quiet, and the suites manage the schema themselves."""
+
+    TESTING = True
+    PURGE_IN_BACKGROUND_AFTER = None
+    QUERY_AUDIT = True
+    QUERY_AUDIT_STRICT = True
+    ADMIN_TOKEN = 'test-admin-token'
+    # never DATABASE_URL: the suites drop and recreate every table, so
+    # they only run against a database named for them
+    SQLALCHEMY_DATABASE_URI = per_worker_database(
+        os.environ.get('TEST_DATABASE_URL', 'postgresql:///blogly_test'))
+
+
+class ProductionConfig(Config):
+    """Production: no echo, no toolbar, no schema work at boot; tuned pool."""
+
+    INSTRUMENTATION = True
+    TIMELINE_PRELOAD = True
+    TEMPLATE_CACHE_DIR = os.environ.get(
+        'TEMPLATE_CACHE_DIR', 'instance/jinja-cache')
+    TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', '1') == '1'
+
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    }
+
+
+CONFIGS = {
+    'development': DevelopmentConfig,
+    'test': TestConfig,
+    'production': ProductionConfig,
+}
@@ -0,0 +1,253 @@
+"""Atom and RSS feeds of the newest posts: site-wide, per user and per tag.
+
+    GET /feed.atom                  GET /feed.rss
+    GET /users/<id>/feed.atom       GET /users/<id>/feed.rss
+    GET /tags/<id>/feed.atom        GET /tags/<id>/feed.rss
+
+A feed is one keyset page of posts, newest first by (created_at, id);
+`?after=` pages back through older posts and each page links to the next.
+
+The serialized bytes of every feed page are kept in the page cache with
+their ETag, depending on the posts and authors they list plus the feed's own
+entity: ('posts',) for the site feed, ('user', id) or ('tag', id) for the
+others. Pollers revalidating an unchanged feed get a 304 straight from the
+cache, without a database query. Entries are cached one by one as well, so
+rebuilding a feed after a new post only serializes the new post.
+"""
+
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+
+from flask import Blueprint, current_app, request
+
+from cache import page_cache
+from conditional import not_modified, with_validators
+from models import db, Post, PostTag, Tag, User
+from pagination import format_time_cursor, keyset_paginate, parse_time_cursor
+
+bp = Blueprint('feeds', __name__)
+
+MIMETYPES = {
+    'atom': 'application/atom+xml',
+    'rss': 'application/rss+xml',
+}
+
+# characters XML 1.0 doesn't allow, even escaped
+INVALID_XML_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# <updated> is required; a feed with no posts yet has never changed
+EMPTY_FEED_UPDATED = datetime(1970, 1, 1)
+
+
+def _text(value):
+    return escape(INVALID_XML_RE.sub('', value))
+
+
+def _timestamp(value, fmt):
+    """RFC 3339 for Atom, RFC 822 for RSS; stored times are UTC."""
+
+    value = value.replace(tzinfo=timezone.utc)
+    if fmt == 'atom':
+        return value.isoformat()
+    return format_datetime(value, usegmt=True)
+
+
+def _entry(fmt, row, base_url):
+    link = f"{base_url}posts/{row.id}"
+    author = _text(f"{row.first_name} {row.last_name}")
+
+    if fmt == 'atom':
+        return (
+            f"<entry>"
+            f"<title>{_text(row.title)}</title>"
+            f"<id>{escape(link)}</id>"
+            f"<link href={quoteattr(link)}/>"
+            f"<published>{_timestamp(row.created_at, fmt)}</published>"
+            f"<updated>{_timestamp(row.updated_at, fmt)}</updated>"
+            f"<author><name>{author}</name></author>"
+            f"<content type=\"text\">{_text(row.content)}</content>"
+            f"</entry>\n")
+
+    return (
+        f"<item>"
+        f"<title>{_text(row.title)}</title>"
+        f"<link>{escape(link)}</link>"
+        f"<guid isPermaLink=\"true\">{escape(link)}</guid>"
+        f"<pubDate>{_timestamp(row.created_at, fmt)}</pubDate>"
+        f"<dc:creator>{author}</dc:creator>"
+        f"<description>{_text(row.content)}</description>"
+        f"</item>\n")
+
+
+def _document(fmt, title, html_url, self_url, next_url, updated, entries):
+    title, html_url = _text(title), escape(html_url)
+
+    if fmt == 'atom':
+        head = (
+            f"<feed xmlns=\"http://www.w3.org/2005/Atom\">\n"
+            f"<title>{title}</title>"
+            f"<id>{escape(self_url)}</id>"
+            f"<link rel=\"self\" href={quoteattr(self_url)}/>"
+            f"<link rel=\"alternate\" href=\"{html_url}\"/>")
+        if next_url:
+            head += f"<link rel=\"next\" href={quoteattr(next_url)}/>"
+        head += f"<updated>{_timestamp(updated, fmt)}</updated>\n"
+        tail = "</feed>\n"
+    else:
+        head = (
+            f"<rss version=\"2.0\" "
+            f"xmlns:atom=\"http://www.w3.org/2005/Atom\" "
+            f"xmlns:dc=\"http://purl.org/dc/elements/1.1/\">\n<channel>"
+            f"<title>{title}</title>"
+            f"<link>{html_url}</link>"
+            f"<description>{title}</description>"
+            f"<atom:link rel=\"self\" href={quoteattr(self_url)}/>")
+        if next_url:
+            head += f"<atom:link rel=\"next\" href={quoteattr(next_url)}/>"
+        head += f"<lastBuildDate>{_timestamp(updated, fmt)}</lastBuildDate>\n"
+        tail = "</channel>\n</rss>\n"
+
+    return ''.join((
+        '<?xml version="1.0" encoding="utf-8"?>\n', head, *entries, tail,
+    )).encode()
+
+
+def _entries(fmt, post_ids, base_url):
+    """Serialized entries for `post_ids`, from the cache where possible;
+    the rest are read with one query."""
+
+    entries = {
+        post_id: page_cache.get('feed-entry', (fmt, base_url, post_id))
+        for post_id in post_ids
+    }
+    missing = [post_id for post_id, entry in entries.items() if entry is None]
+
+    if missing:
+        generation = page_cache.generation()
+        rows = db.session.execute(
+            db.select(
+                Post.id, Post.title, Post.content, Post.created_at,
+                Post.updated_at, Post.user_id, User.first_name,
+                User.last_name)
+            .join(Post.user)
+            .where(Post.id.in_(missing)))
+
+        for row in rows:
+            entry = entries[row.id] = _entry(fmt, row, base_url)
+            page_cache.put(
+                'feed-entry', (fmt, base_url, row.id), entry,
+                [('post', row.id), ('user', row.user_id)], generation)
+
+    return [entries[post_id] for post_id in post_ids if entries[post_id]]
+
+
+def _subject(kind, subject_id):
+    """(feed title, HTML page path, posts query, feed entity)."""
+
+    posts = db.session.query(
+        Post.id, Post.created_at, Post.updated_at, Post.user_id)
+
+    if kind == 'user':
+        user = (User.listing_query()
+                .filter(User.id == subject_id).first_or_404())
+        return (
+            f"Posts by {user.first_name} {user.last_name}",
+            f"users/{subject_id}",
+            posts.filter(Post.user_id == subject_id),
+            ('user', subject_id),
+        )
+
+    if kind == 'tag':
+        tag = (Tag.listing_query()
+               .filter(Tag.id == subject_id).first_or_404())
+        return (
+            f"Posts tagged {tag.name}",
+            f"tags/{subject_id}/posts",
+            posts.join(PostTag, PostTag.post_id == Post.id)
+            .filter(PostTag.tag_id == subject_id),
+            ('tag', subject_id),
+        )
+
+    return "Blogly: latest posts", "", posts, ('posts',)
+
+
+def build_feed(fmt, kind, subject_id, after, base_url, self_url):
+    """Return ((body, etag, last modified), the entities it depends on)."""
+
+    title, html_path, query, entity = _subject(kind, subject_id)
+
+    page = keyset_paginate(
+        query,
+        (Post.created_at, Post.id),
+        after=after,
+        per_page=current_app.config['FEED_SIZE'],
+        descending=True,
+    )
+
+    next_url = None
+    if page.next_cursor:
+        next_url = (f"{base_url}{request.path.lstrip('/')}"
+                    f"?after={format_time_cursor(page.next_cursor)}")
+
+    updated = max((row.updated_at for row in page), default=None)
+    body = _document(
+        fmt, title, base_url + html_path, self_url, next_url,
+        updated or EMPTY_FEED_UPDATED,
+        _entries(fmt, [row.id for row in page], base_url))
+
+    deps = [entity]
+    deps.extend(('post', row.id) for row in page)
+    deps.extend({('user', row.user_id) for row in page})
+
+    return (body, hashlib.sha1(body).hexdigest(), updated), deps
+
+
+def serve_feed(fmt, kind, subject_id=None):
+    """Serve a feed page from the cache, building it on a miss."""
+
+    after = parse_time_cursor(request.args.get('after'))
+    base_url = request.host_url
+    self_url = request.base_url
+    if after:
+        self_url += f"?after={format_time_cursor(after)}"
+
+    key = (fmt, kind, subject_id, self_url)
+    cached = page_cache.get('feed', key)
+    if cached is None:
+        generation = page_cache.generation()
+        cached, deps = build_feed(
+            fmt, kind, subject_id, after, base_url, self_url)
+        page_cache.put('feed', key, cached, deps, generation)
+
+    body, etag, last_modified = cached
+
+    response = not_modified(etag, last_modified, shows_flashes=False)
+    if response is None:
+        response = with_validators(
+            body, etag, last_modified, shows_flashes=False)
+        response.mimetype = MIMETYPES[fmt]
+    return response
+
+
+@bp.get('/feed.<any(atom, rss):fmt>')
+def site_feed(fmt):
+    """The newest posts from everyone"""
+
+    return serve_feed(fmt, 'site')
+
+
+@bp.get('/users/<int:user_id>/feed.<any(atom, rss):fmt>')
+def user_feed(user_id, fmt):
+    """The newest posts by a user"""
+
+    return serve_feed(fmt, 'user', user_id)
+
+
+@bp.get('/tags/<int:tag_id>/feed.<any(atom, rss):fmt>')
+def tag_feed(tag_id, fmt):
+    """The newest posts with a tag"""
+
+    return serve_feed(fmt, 'tag', tag_id)
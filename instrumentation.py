@@ -0,0 +1,226 @@
+"""Per-request performance instrumentation.
+
+While enabled, every request records its SQL statement count, time spent in
+the database, time spent rendering templates and response size. Each
+response gets a `Server-Timing` header (shown in the browser's network
+panel) and the numbers are aggregated into per-endpoint histograms served in
+Prometheus text format at /metrics.
+
+When disabled no engine or template listeners are installed, so the SQL and
+render paths cost nothing extra; the request hooks return immediately.
+/metrics is an operator-only route: scrapers send ADMIN_TOKEN (see admin.py).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import (
+    Response, abort, before_render_template, g, has_app_context, request,
+    template_rendered)
+
+from admin import require_admin
+from statement_timing import StatementTimer
+
+SECONDS_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# name -> (help text, buckets, RequestMetrics attribute)
+METRICS = {
+    'blogly_request_seconds': (
+        'Request duration in seconds.', SECONDS_BUCKETS, 'total'),
+    'blogly_db_seconds': (
+        'Time spent executing SQL per request.', SECONDS_BUCKETS, 'db_time'),
+    'blogly_db_statements': (
+        'SQL statements executed per request.', COUNT_BUCKETS, 'statements'),
+    'blogly_render_seconds': (
+        'Template render time per request.', SECONDS_BUCKETS, 'render_time'),
+    'blogly_response_bytes': (
+        'Response body size.', BYTES_BUCKETS, 'response_bytes'),
+}
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestMetrics:
+    """What one request spent, filled in by the engine and template hooks."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.total = 0.0
+        self.response_bytes = None
+        self._render_depth = 0
+        self._render_started = 0.0
+
+
+def current_metrics():
+    """The RequestMetrics of the request being served, if any."""
+
+    if has_app_context():
+        return g.get('request_metrics')
+    return None
+
+
+class Instrumentation:
+    """Collect RequestMetrics and aggregate them per endpoint."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        # (metric name, endpoint) -> Histogram
+        self._histograms = {}
+
+    def init_app(self, app):
+        """Install request hooks and /metrics; enable per INSTRUMENTATION."""
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+        if app.config.get('INSTRUMENTATION', False):
+            self.enable()
+
+    def enable(self):
+        if self.enabled:
+            return
+        statement_timer.listen()
+        before_render_template.connect(_before_render)
+        template_rendered.connect(_after_render)
+        self.enabled = True
+
+    def disable(self):
+        if not self.enabled:
+            return
+        statement_timer.remove()
+        before_render_template.disconnect(_before_render)
+        template_rendered.disconnect(_after_render)
+        self.enabled = False
+
+    def reset(self):
+        """Forget every aggregated observation."""
+
+        with self._lock:
+            self._histograms.clear()
+
+    def _before_request(self):
+        # app contexts can outlive one request, so always reset
+        g.request_metrics = RequestMetrics() if self.enabled else None
+
+    def _after_request(self, response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+
+        metrics.total = time.perf_counter() - metrics.started
+        if not response.is_streamed:
+            metrics.response_bytes = response.calculate_content_length()
+
+        response.headers['Server-Timing'] = server_timing(metrics)
+        self.record(request.endpoint or 'unmatched', metrics)
+        return response
+
+    def record(self, endpoint, metrics):
+        """Add one request's metrics to the endpoint's histograms."""
+
+        with self._lock:
+            for name, (_, buckets, attribute) in METRICS.items():
+                value = getattr(metrics, attribute)
+                if value is None:
+                    continue
+                histogram = self._histograms.get((name, endpoint))
+                if histogram is None:
+                    histogram = Histogram(buckets)
+                    self._histograms[(name, endpoint)] = histogram
+                histogram.observe(value)
+
+    def exposition(self):
+        """All histograms in Prometheus text exposition format."""
+
+        lines = []
+        with self._lock:
+            for name, (help_text, _, _) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, endpoint), histogram in sorted(
+                        self._histograms.items()):
+                    if metric == name:
+                        lines.extend(
+                            histogram.lines(name, f'endpoint="{endpoint}"'))
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        """Serve the histograms to a Prometheus scraper"""
+
+        if not self.enabled:
+            abort(404)
+        require_admin()
+
+        return Response(
+            self.exposition(), mimetype='text/plain; version=0.0.4')
+
+
+instrumentation = Instrumentation()
+
+
+def server_timing(metrics):
+    """Format RequestMetrics as a Server-Timing header value."""
+
+    return ', '.join((
+        f'db;dur={metrics.db_time * 1000:.2f};'
+        f'desc="{metrics.statements} queries"',
+        f'render;dur={metrics.render_time * 1000:.2f}',
+        f'total;dur={metrics.total * 1000:.2f}',
+    ))
+
+
+def _add_statement(metrics, statement, seconds):
+    metrics.statements += 1
+    metrics.db_time += seconds
+
+
+statement_timer = StatementTimer(
+    'instrumentation_started', current_metrics, _add_statement)
+
+
+def _before_render(app, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None:
+        # fragments are rendered on their own, but count nested renders once
+        if not metrics._render_depth:
+            metrics._render_started = time.perf_counter()
+        metrics._render_depth += 1
+
+
+def _after_render(app, template, context, **extra):
+    metrics = current_metrics()
+    if metrics is not None and metrics._render_depth:
+        metrics._render_depth -= 1
+        if not metrics._render_depth:
+            metrics.render_time += (
+                time.perf_counter() - metrics._render_started)
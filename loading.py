@@ -0,0 +1,42 @@
+"""Per-route eager-loading plans for Blogly.
+
+Every relationship in models.py is lazy, so a template that walks
+`user.posts`, `post.user` or `post.tags` would otherwise issue one query per
+row. Routes look their loader options up here by endpoint name instead of
+choosing them inline, which keeps the statement count of each page small and
+fixed and puts every plan in one place. Keys are full endpoint names,
+i.e. blueprint-qualified.
+"""
+
+from flask import request
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+
+from models import Post, User
+
+# backrefs (Post.user, Post.tags) only exist once the mappers are configured
+configure_mappers()
+
+LOAD_PLANS = {
+    'blogly.show_user_id_information': (
+        selectinload(User.posts),
+    ),
+    'blogly.show_post_page': (
+        joinedload(Post.user),
+        selectinload(Post.tags),
+    ),
+    'blogly.show_edit_post_form': (
+        selectinload(Post.tags),
+    ),
+    'blogly.delete_post': (
+        joinedload(Post.user),
+    ),
+}
+
+
+def load_options(endpoint=None):
+    """Return the loader options for `endpoint` (default: current request)."""
+
+    if endpoint is None:
+        endpoint = request.endpoint
+
+    return LOAD_PLANS.get(endpoint, ())
@@ -1,8 +1,14 @@
 """Models for Blogly."""
 
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 DEFAULT_IMAGE_URL = 'https://upload.wikimedia.org/wikipedia/commons/d/d9/Collage_of_Nine_Dogs.jpg'
 
@@ -13,6 +19,47 @@ def connect_db(app):
     db.app = app
     db.init_app(app)
 
+
+def is_blank(value):
+    """Validation rule for required text fields, shared by forms and imports."""
+
+    return value is None or len(value.strip()) == 0
+
+
+def touch(*instances):
+    """Bump updated_at, and with it version (see _bump_version()), e.g. on a
+    user whose posts changed."""
+
+    now = datetime.utcnow()
+    for instance in instances:
+        instance.updated_at = now
+
+def _decrement(model, ids, removed):
+    """Lower post_count for the `model` rows in `ids` by the correlated
+    `removed` count, bumping their versions as any change does."""
+
+    db.session.execute(
+        db.update(model)
+        .where(model.id.in_(ids))
+        .values(
+            post_count=model.post_count - removed.scalar_subquery(),
+            version=model.version + 1,
+            updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False})
+
+
+def _recount(model, actual):
+    result = db.session.execute(
+        db.update(model)
+        .where(model.post_count != actual)
+        .values(
+            post_count=actual,
+            version=model.version + 1,
+            updated_at=datetime.utcnow()),
+        execution_options={'synchronize_session': False})
+    return result.rowcount
+
+
 class User(db.Model):
     """Users table."""
 
@@ -36,10 +83,73 @@ class User(db.Model):
 
     image_url = db.Column(
         db.String(500),
+        nullable=True,
+    )
+
+    # denormalized count of the user's posts, kept in step by every path
+    # that adds or removes posts (see recount_posts() to repair it)
+    post_count = db.Column(
+        db.Integer,
         nullable=False,
+        default=0,
+        server_default='0',
     )
 
-    posts = db.relationship("Post", backref='user')
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=1,
+        server_default='1',
+    )
+
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    __table_args__ = (
+        # keyset pages of users by popularity
+        db.Index('ix_users_post_count_id', 'post_count', 'id'),
+    )
+
+    posts = db.relationship("Post", backref='user', passive_deletes=True)
+
+    @classmethod
+    def listing_query(cls):
+        """Query of lightweight (id, first_name, last_name, post_count,
+        version, updated_at) rows.
+
+        Rows are plain named tuples: no identity map or change tracking, so
+        use this for read-only views instead of hydrating full Users. The
+        users listing pages it by keyset cursors, like Tag.listing_query().
+        """
+
+        return db.session.query(
+            cls.id, cls.first_name, cls.last_name, cls.post_count,
+            cls.version, cls.updated_at)
+
+    @classmethod
+    def recount_posts(cls):
+        """Recompute post_count from the posts table; return rows fixed."""
+
+        actual = (db.select(db.func.count(Post.id))
+                  .where(Post.user_id == cls.id)
+                  .scalar_subquery())
+        return _recount(cls, actual)
+
+    @classmethod
+    def purge(cls, user_id):
+        """Delete a user, their posts and those posts' tags, set-based.
+
+        A fixed number of statements however many posts the user has.
+        """
+
+        Post.purge(Post.user_id == user_id, count_authors=False)
+        db.session.execute(
+            db.delete(cls).where(cls.id == user_id),
+            execution_options={'synchronize_session': False})
 
 
 class Post(db.Model):
@@ -71,10 +181,77 @@ class Post(db.Model):
 
     user_id = db.Column(
         db.Integer,
-        db.ForeignKey("users.id"),
+        db.ForeignKey("users.id", ondelete='CASCADE'),
+        nullable=False,
+        index=True,
+    )
+
+    version = db.Column(
+        db.Integer,
         nullable=False,
+        default=1,
+        server_default='1',
+    )
+
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
+    __table_args__ = (
+        # keyset pages of posts newest-first, e.g. the posts for a tag
+        db.Index('ix_posts_created_at_id', 'created_at', 'id'),
     )
 
+    @classmethod
+    def listing_query(cls):
+        """Query of lightweight (id, title, created_at) rows."""
+
+        return db.session.query(cls.id, cls.title, cls.created_at)
+
+    @classmethod
+    def search_vector(cls):
+        """PostgreSQL tsvector of title and content, as the GIN index has it."""
+
+        return db.func.to_tsvector(
+            db.text("'english'"), cls.title + ' ' + cls.content)
+
+    @classmethod
+    def purge(cls, *criteria, count_authors=True):
+        """Delete the posts matching `criteria` and their post_tags rows.
+
+        The tags' and (unless `count_authors` is false, e.g. because the
+        authors are being deleted too) the authors' post_count go down by the
+        number of their posts removed, in one UPDATE each.
+        """
+
+        post_ids = db.select(cls.id).where(*criteria)
+
+        links = db.select(PostTag.tag_id).where(PostTag.post_id.in_(post_ids))
+        _decrement(Tag, links, db.select(db.func.count()).where(
+            PostTag.tag_id == Tag.id, PostTag.post_id.in_(post_ids)))
+        db.session.execute(
+            db.delete(PostTag).where(PostTag.post_id.in_(post_ids)),
+            execution_options={'synchronize_session': False})
+
+        if count_authors:
+            authors = db.select(cls.user_id).where(*criteria)
+            _decrement(User, authors, db.select(db.func.count(cls.id)).where(
+                cls.user_id == User.id, *criteria))
+        db.session.execute(
+            db.delete(cls).where(*criteria),
+            execution_options={'synchronize_session': False})
+
+
+# full-text search index; only PostgreSQL has tsvector / GIN
+db.Index(
+    'ix_posts_search',
+    Post.search_vector(),
+    postgresql_using='gin',
+).ddl_if(dialect='postgresql')
+
 
 class Tag(db.Model):
     """Tags  table """
@@ -93,8 +270,88 @@ class Tag(db.Model):
         nullable=False,
     )
 
+    # denormalized count of posts with this tag, kept in step by every path
+    # that links or unlinks posts (see recount_posts() to repair it)
+    post_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=1,
+        server_default='1',
+    )
+
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+    )
+
     posts = db.relationship(
-        'Post', secondary='post_tags', backref='tags')
+        'Post', secondary='post_tags', backref='tags', passive_deletes=True)
+
+    __table_args__ = (
+        # keyset pages of tags by popularity
+        db.Index('ix_tags_post_count_id', 'post_count', 'id'),
+    )
+
+    @classmethod
+    def listing_query(cls):
+        """Query of lightweight (id, name, post_count, version, updated_at)
+        rows for read-only views.
+
+        The tags listing pages it by keyset cursors on id, or on (post_count,
+        id) when sorted by popularity (see paginate_listing()); the primary
+        key and ix_tags_post_count_id serve those, so no page needs an
+        OFFSET scan.
+        """
+
+        return db.session.query(
+            cls.id, cls.name, cls.post_count, cls.version, cls.updated_at)
+
+    @classmethod
+    def count_posts(cls, deltas):
+        """Add {tag id: delta} to the tags' post_count in a single UPDATE."""
+
+        deltas = {tag_id: delta for tag_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id.in_(deltas))
+            .values(
+                post_count=cls.post_count + db.case(deltas, value=cls.id),
+                version=cls.version + 1,
+                updated_at=datetime.utcnow()),
+            execution_options={'synchronize_session': False})
+
+    @classmethod
+    def recount_posts(cls):
+        """Recompute post_count from the post_tags table; return rows fixed."""
+
+        actual = (db.select(db.func.count())
+                  .select_from(PostTag)
+                  .where(PostTag.tag_id == cls.id)
+                  .scalar_subquery())
+        return _recount(cls, actual)
+
+    @classmethod
+    def purge(cls, tag_id):
+        """Delete a tag and its post_tags rows without loading its posts."""
+
+        db.session.execute(
+            db.delete(PostTag).where(PostTag.tag_id == tag_id),
+            execution_options={'synchronize_session': False})
+        db.session.execute(
+            db.delete(cls).where(cls.id == tag_id),
+            execution_options={'synchronize_session': False})
 
 class PostTag(db.Model):
     """Tags  table """
@@ -103,12 +360,29 @@ class PostTag(db.Model):
 
     post_id = db.Column(
         db.Integer,
-        db.ForeignKey('posts.id'),
+        db.ForeignKey('posts.id', ondelete='CASCADE'),
         primary_key=True,
     )
 
     tag_id = db.Column(
         db.Integer,
-        db.ForeignKey('tags.id'),
+        db.ForeignKey('tags.id', ondelete='CASCADE'),
         primary_key=True,
-    )
\ No newline at end of file
+    )
+
+    __table_args__ = (
+        # the primary key leads with post_id; this one serves "posts for tag"
+        db.Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id'),
+    )
+
+def _bump_version(mapper, connection, target):
+    """Bump `version` in the UPDATE itself, as version + 1, so overlapping
+    writers to a row each count rather than one failing as stale."""
+
+    session = object_session(target)
+    if session.is_modified(target, include_collections=False):
+        target.version = mapper.class_.version + 1
+
+
+for _model in (User, Post, Tag):
+    event.listen(_model, 'before_update', _bump_version)
@@ -0,0 +1,138 @@
+"""Keyset (cursor) pagination for Blogly listings."""
+
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+class KeysetPage:
+    """One page of rows plus the cursors to the neighbouring pages.
+
+    `next_cursor` / `prev_cursor` are the key values to pass back as
+    `?after=` / `?before=`, or None when there is no page in that direction.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def keyset_paginate(query, key, after=None, before=None, per_page=50,
+                    descending=False):
+    """Return a KeysetPage of `query` ordered by the unique `key`.
+
+    `key` is a column, or a tuple of columns that is unique together (e.g.
+    `(Post.created_at, Post.id)`), in which case cursors are tuples too.
+
+    Only `per_page + 1` rows are ever fetched: the extra row tells us whether
+    there is another page, so no COUNT or OFFSET scan is needed and the cost
+    stays flat however large the table grows.
+    """
+
+    columns = key if isinstance(key, tuple) else (key,)
+
+    def beyond(cursor, forward):
+        """Filter for rows strictly past `cursor` in the given direction."""
+
+        if len(columns) > 1:
+            sort_key, cursor = tuple_(*columns), tuple_(*cursor)
+        else:
+            sort_key = columns[0]
+
+        if forward != descending:
+            return sort_key > cursor
+        return sort_key < cursor
+
+    def order(forward):
+        if forward != descending:
+            return [column.asc() for column in columns]
+        return [column.desc() for column in columns]
+
+    if before is not None:
+        rows = (query
+                .filter(beyond(before, forward=False))
+                .order_by(*order(forward=False))
+                .limit(per_page + 1)
+                .all())
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+
+        return KeysetPage(
+            items,
+            next_cursor=_key_of(items[-1], columns) if items else None,
+            prev_cursor=_key_of(items[0], columns) if has_more else None,
+        )
+
+    if after is not None:
+        query = query.filter(beyond(after, forward=True))
+
+    rows = query.order_by(*order(forward=True)).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    return KeysetPage(
+        items,
+        next_cursor=_key_of(items[-1], columns) if has_more else None,
+        prev_cursor=_key_of(items[0], columns) if after is not None and items
+        else None,
+    )
+
+
+def _key_of(row, columns):
+    """Read the cursor value off an ORM object or result row."""
+
+    values = tuple(getattr(row, column.key) for column in columns)
+    return values if len(values) > 1 else values[0]
+
+
+def format_time_cursor(cursor):
+    """Render a (datetime, id) cursor for a query string."""
+
+    if cursor is None:
+        return None
+
+    created_at, row_id = cursor
+    return f"{created_at.isoformat()}_{row_id}"
+
+
+def parse_time_cursor(text):
+    """Parse format_time_cursor() output; None if missing or malformed."""
+
+    if not text:
+        return None
+
+    created_at, _, row_id = text.rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+
+def format_count_cursor(cursor):
+    """Render a (post_count, id) cursor for a query string."""
+
+    if cursor is None:
+        return None
+
+    count, row_id = cursor
+    return f"{count}_{row_id}"
+
+
+def parse_count_cursor(text):
+    """Parse format_count_cursor() output; None if missing or malformed."""
+
+    if not text:
+        return None
+
+    count, _, row_id = text.partition('_')
+    try:
+        return int(count), int(row_id)
+    except ValueError:
+        return None
@@ -0,0 +1,81 @@
+"""Background purging of very large user accounts.
+
+Deleting a prolific author in one request holds locks on a huge number of
+rows; instead `delete_user` hands such accounts to a single worker thread
+that removes their posts in small batches, each its own short transaction.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import page_cache
+from models import db, Post, User
+from search import unindex_post
+from timeline import timeline
+
+log = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+
+
+def has_more_posts_than(user_id, count):
+    """True if the user has more than `count` posts; never counts them all."""
+
+    return db.session.execute(
+        db.select(Post.id)
+        .where(Post.user_id == user_id)
+        .offset(count)
+        .limit(1)
+    ).first() is not None
+
+
+def purge_user_in_batches(user_id, batch_size=1000):
+    """Delete a user's posts `batch_size` at a time, then the user."""
+
+    while True:
+        post_ids = db.session.scalars(
+            db.select(Post.id)
+            .where(Post.user_id == user_id)
+            .limit(batch_size)
+        ).all()
+
+        if not post_ids:
+            break
+
+        Post.purge(Post.id.in_(post_ids))
+        db.session.commit()
+        for post_id in post_ids:
+            unindex_post(post_id)
+
+    User.purge(user_id)
+    db.session.commit()
+
+
+def _purge_in_app_context(app, user_id, batch_size):
+    with app.app_context():
+        purge_user_in_batches(user_id, batch_size)
+        # a rebuild during the purge may have picked their posts up again
+        timeline.remove_user(user_id)
+        page_cache.invalidate(('users',), ('user', user_id), ('tags',))
+
+
+def _log_failure(user_id, future):
+    exc = future.exception()
+    if exc is not None:
+        log.error("Background purge of user %s failed", user_id,
+                  exc_info=exc)
+
+
+def purge_user_in_background(app, user_id, batch_size=1000):
+    """Queue a batched purge of `user_id`; returns its Future. A purge
+    that fails is logged, since nothing waits on the Future."""
+
+    future = _executor.submit(_purge_in_app_context, app, user_id, batch_size)
+    future.add_done_callback(lambda future: _log_failure(user_id, future))
+    return future
+
+
+def wait_for_purges():
+    """Block until every queued purge has finished (the worker is FIFO)."""
+
+    _executor.submit(lambda: None).result()
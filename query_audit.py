@@ -0,0 +1,188 @@
+"""Slow-query and N+1 detection.
+
+While enabled, every SQL statement a request runs is normalized (literals
+and IN lists collapsed, whitespace squeezed) and tallied along with the
+line of Blogly code that caused it. After the request, statements run
+DUPLICATE_QUERY_THRESHOLD or more times (the shape of a lazy load in a
+loop) and any single statement slower than SLOW_QUERY_SECONDS are logged as
+one compact report.
+
+In strict mode (the test profile) a request with duplicate statements
+raises DuplicateQueryError instead, failing whichever test made it.
+"""
+
+import os
+import re
+import sys
+import threading
+
+from flask import current_app, g, has_app_context, request
+
+import statement_timing
+from statement_timing import StatementTimer
+
+ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+# frames that are the audit itself, not the code being audited
+OWN_FILES = (__file__, statement_timing.__file__)
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAM_LIST_RE = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,?)+\)')
+SPACE_RE = re.compile(r'\s+')
+
+
+class DuplicateQueryError(AssertionError):
+    """Strict mode: a request ran the same statement more than once."""
+
+
+def normalize(statement):
+    """Reduce a statement to its shape, for spotting repeats."""
+
+    statement = STRING_RE.sub('?', statement)
+    statement = NUMBER_RE.sub('?', statement)
+    statement = PARAM_LIST_RE.sub('(?)', statement)
+    return SPACE_RE.sub(' ', statement).strip()
+
+
+def call_site():
+    """'file.py:line in function' of the innermost Blogly frame."""
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(ROOT)
+                and filename not in OWN_FILES
+                and not filename.startswith(ROOT + 'benchmarks')):
+            return (f'{filename[len(ROOT):]}:{frame.f_lineno} '
+                    f'in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryTally:
+    """Statements seen during one request, by normalized SQL."""
+
+    def __init__(self):
+        # normalized SQL -> [count, total seconds, call sites]
+        self.statements = {}
+        # (seconds, normalized SQL, call site) of each slow statement
+        self.slow = []
+
+    def add(self, statement, elapsed, site, slow_after):
+        shape = normalize(statement)
+        entry = self.statements.get(shape)
+        if entry is None:
+            entry = self.statements[shape] = [0, 0.0, []]
+        entry[0] += 1
+        entry[1] += elapsed
+        if site not in entry[2]:
+            entry[2].append(site)
+
+        if slow_after is not None and elapsed >= slow_after:
+            self.slow.append((elapsed, shape, site))
+
+    def duplicates(self, threshold):
+        return [
+            (shape, count, total, sites)
+            for shape, (count, total, sites) in self.statements.items()
+            if count >= threshold
+        ]
+
+
+class QueryAudit:
+    """Watch each request's statements and report duplicates and slow ones."""
+
+    def __init__(self):
+        self.enabled = False
+        self.strict = False
+        self.slow_after = 0.25
+        self.threshold = 2
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Install request hooks; enable per the QUERY_AUDIT* settings."""
+
+        self.strict = app.config.get('QUERY_AUDIT_STRICT', False)
+        self.slow_after = app.config.get('SLOW_QUERY_SECONDS', 0.25)
+        self.threshold = app.config.get('DUPLICATE_QUERY_THRESHOLD', 2)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        if app.config.get('QUERY_AUDIT', False):
+            self.enable()
+
+    def enable(self):
+        with self._lock:
+            if not self.enabled:
+                statement_timer.listen()
+                self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            if self.enabled:
+                statement_timer.remove()
+                self.enabled = False
+
+    def _before_request(self):
+        # app contexts can outlive one request, so always reset
+        g.query_tally = QueryTally() if self.enabled else None
+
+    def _after_request(self, response):
+        tally = g.pop('query_tally', None)
+        if tally is None:
+            return response
+
+        duplicates = tally.duplicates(self.threshold)
+        if duplicates or tally.slow:
+            report = format_report(
+                f'{request.method} {request.full_path.rstrip("?")} '
+                f'({request.endpoint})',
+                duplicates, tally.slow)
+
+            if duplicates and self.strict:
+                raise DuplicateQueryError(report)
+            current_app.logger.warning(report)
+
+        return response
+
+
+query_audit = QueryAudit()
+
+
+def format_report(route, duplicates, slow):
+    """One log entry listing a request's duplicate and slow statements."""
+
+    lines = [f'Query report for {route}:']
+    for shape, count, total, sites in duplicates:
+        lines.append(
+            f'  duplicate x{count} ({total * 1000:.1f} ms) '
+            f'from {", ".join(sites)}')
+        lines.append(f'    {shape}')
+    for elapsed, shape, site in slow:
+        lines.append(f'  slow {elapsed * 1000:.1f} ms from {site}')
+        lines.append(f'    {shape}')
+    return '\n'.join(lines)
+
+
+def _current_tally():
+    if has_app_context():
+        return g.get('query_tally')
+    return None
+
+
+def _begin_statement():
+    tally = _current_tally()
+    if tally is not None:
+        return tally, call_site()
+    return None
+
+
+def _end_statement(token, statement, seconds):
+    tally, site = token
+    tally.add(statement, seconds, site, query_audit.slow_after)
+
+
+statement_timer = StatementTimer(
+    'audit_started', _begin_statement, _end_statement)
@@ -0,0 +1,170 @@
+"""Read-replica routing.
+
+GET and HEAD requests read from a replica (round-robin over the healthy
+ones listed in SQLALCHEMY_REPLICA_URIS); everything else uses the primary.
+Writes always go to the primary, and so does every read after a write:
+
+* within a request, once the session has flushed or run a DML statement;
+* across requests, for REPLICA_MAX_LAG seconds after the browser's last
+  write request, tracked in its session cookie (read-your-writes).
+
+A replica that fails a `SELECT 1` health check, or drops a connection
+mid-request, is skipped for REPLICA_RETRY_AFTER seconds. With no healthy
+replica, reads fall back to the primary.
+"""
+
+import itertools
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+
+# session key holding the time until which reads stay on the primary
+PIN_KEY = '_primary_until'
+
+READ_METHODS = frozenset(('GET', 'HEAD'))
+
+
+class ReplicaRouter:
+    """Pick a replica engine for each read-only request."""
+
+    def __init__(self):
+        self.engines = []
+        self.max_lag = 5
+        self.retry_after = 30
+        self.check_interval = 5
+        self._lock = threading.Lock()
+        self._cycle = iter(())
+        self._down_until = {}
+        self._checked_at = {}
+
+    def init_app(self, app):
+        """Configure from REPLICA_* settings and install request hooks."""
+
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', 5)
+        self.retry_after = app.config.get('REPLICA_RETRY_AFTER', 30)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 5)
+        self.set_replicas(
+            app.config.get('SQLALCHEMY_REPLICA_URIS', ()),
+            echo=app.config.get('SQLALCHEMY_ECHO', False),
+            **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        )
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def set_replicas(self, urls, **engine_options):
+        """Replace the replica engines with new ones for `urls`."""
+
+        engines = [sa.create_engine(url, **engine_options) for url in urls]
+        for engine in engines:
+            sa.event.listen(engine, 'handle_error', self._on_error)
+
+        with self._lock:
+            old, self.engines = self.engines, engines
+            self._cycle = itertools.cycle(engines)
+            self._down_until.clear()
+            self._checked_at.clear()
+
+        for engine in old:
+            engine.dispose()
+
+    def choose(self):
+        """Return the next healthy replica engine, or None for the primary."""
+
+        for _ in range(len(self.engines)):
+            with self._lock:
+                engine = next(self._cycle)
+                if self._down_until.get(engine, 0) > time.monotonic():
+                    continue
+            if self._healthy(engine):
+                return engine
+
+        return None
+
+    def _healthy(self, engine):
+        """Ping `engine` at most every check_interval seconds."""
+
+        now = time.monotonic()
+        if now - self._checked_at.get(engine, float('-inf')) < \
+                self.check_interval:
+            return True
+
+        self._checked_at[engine] = now
+        try:
+            with engine.connect() as conn:
+                conn.execute(sa.text('SELECT 1'))
+        except sa.exc.DBAPIError:
+            self.mark_down(engine)
+            return False
+        return True
+
+    def mark_down(self, engine):
+        with self._lock:
+            self._down_until[engine] = time.monotonic() + self.retry_after
+
+    def _on_error(self, context):
+        if context.is_disconnect and context.engine is not None:
+            self.mark_down(context.engine)
+
+    def current(self):
+        """The replica the current request reads from, if any."""
+
+        if has_app_context():
+            return g.get('read_replica')
+        return None
+
+    def current_lag(self):
+        """Seconds the current request's data may lag behind the primary."""
+
+        return self.max_lag if self.current() is not None else 0
+
+    def _before_request(self):
+        # app contexts can outlive one request (e.g. the test suites push
+        # one for good), so always reset the choice
+        g.read_replica = None
+        if (self.engines
+                and request.method in READ_METHODS
+                and session.get(PIN_KEY, 0) < time.time()):
+            g.read_replica = self.choose()
+
+    def _after_request(self, response):
+        if self.engines and request.method not in READ_METHODS:
+            session[PIN_KEY] = time.time() + self.max_lag
+        return response
+
+    def _teardown_request(self, exc):
+        g.pop('read_replica', None)
+
+
+replicas = ReplicaRouter()
+
+
+def _is_write(clause):
+    """True for DML and raw SQL text, which could be anything."""
+
+    return clause is not None and (
+        getattr(clause, 'is_dml', False) or isinstance(clause, sa.TextClause))
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the request's replica, if it has one."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = replicas.current()
+
+        if replica is not None and bind is None:
+            if self._flushing or _is_write(clause):
+                g.read_replica = None
+            else:
+                return replica
+
+        # a session bound to one connection (e.g. by the test harness)
+        # keeps using it
+        if bind is None and self.bind is not None:
+            return self.bind
+
+        return super().get_bind(mapper, clause, bind, **kwargs)
@@ -0,0 +1,322 @@
+"""Full-text search over post titles and content.
+
+On PostgreSQL, searches use `to_tsvector` backed by the GIN index declared
+on Post. Elsewhere (SQLite, tests) an in-process inverted index is built from
+the posts table on the first search and then kept current by the post write
+routes through `index_post()` / `unindex_post()`, by user deletes through
+`unindex_user_posts()`, and by bulk writes with `reset_search_index()`.
+"""
+
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from flask import current_app
+
+from models import db, Post
+
+TOKEN_RE = re.compile(r'\w+')
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its of on
+or that the their there these they this to was were will with you your
+""".split())
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MAX_UINT16 = 65535
+
+
+def tokenize(text):
+    """Lowercased word tokens, without stopwords or one-letter words."""
+
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class InvertedIndex:
+    """Compact in-memory inverted index with BM25 ranking.
+
+    Each indexed version of a post gets a new, increasing doc number, so
+    every posting list stays sorted and can be binary-searched. Editing or
+    deleting a post just marks its old doc number stale; stale postings are
+    skipped at query time and dropped by an occasional compaction.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self._reset()
+
+    def _reset(self):
+        # term -> (doc numbers, term frequencies), parallel arrays
+        self._postings = {}
+        # doc number -> post id (0 once stale) and token count
+        self._post_ids = array('I')
+        self._lengths = array('H')
+        # post id -> current doc number
+        self._doc_numbers = {}
+        self._total_length = 0
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._doc_numbers)
+
+    def add(self, post_id, text):
+        """Index (or re-index) a post."""
+
+        tokens = tokenize(text)
+
+        with self._lock:
+            self._drop(post_id)
+
+            # the total must add what's stored, so _drop() takes back as much
+            length = min(len(tokens), MAX_UINT16)
+            number = len(self._post_ids)
+            self._post_ids.append(post_id)
+            self._lengths.append(length)
+            self._doc_numbers[post_id] = number
+            self._total_length += length
+
+            for term, count in Counter(tokens).items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = (array('I'), array('H'))
+                postings[0].append(number)
+                postings[1].append(min(count, MAX_UINT16))
+
+    def remove(self, post_id):
+        """Remove a post from the index."""
+
+        with self._lock:
+            self._drop(post_id)
+            if self._stale > 1000 and self._stale > len(self._doc_numbers):
+                self._compact()
+
+    def _drop(self, post_id):
+        number = self._doc_numbers.pop(post_id, None)
+        if number is not None:
+            self._post_ids[number] = 0
+            self._total_length -= self._lengths[number]
+            self._stale += 1
+
+    def _compact(self):
+        """Renumber live docs and rebuild posting lists without stale ones."""
+
+        renumbered = array('I', [0]) * len(self._post_ids)
+        post_ids = array('I')
+        lengths = array('H')
+
+        for number, post_id in enumerate(self._post_ids):
+            if post_id:
+                renumbered[number] = len(post_ids)
+                post_ids.append(post_id)
+                lengths.append(self._lengths[number])
+
+        postings = {}
+        for term, (numbers, counts) in self._postings.items():
+            live = [
+                (renumbered[number], count)
+                for number, count in zip(numbers, counts)
+                if self._post_ids[number]
+            ]
+            if live:
+                postings[term] = (
+                    array('I', (number for number, _ in live)),
+                    array('H', (count for _, count in live)),
+                )
+
+        self._postings = postings
+        self._post_ids = post_ids
+        self._lengths = lengths
+        self._total_length = sum(lengths)
+        self._doc_numbers = {
+            post_id: number for number, post_id in enumerate(post_ids)}
+        self._stale = 0
+
+    def rebuild(self, rows):
+        """Replace the index contents with (id, title, content) `rows`."""
+
+        with self._lock:
+            self._reset()
+            for post_id, title, content in rows:
+                self.add(post_id, f"{title} {content}")
+            self.built = True
+
+    def search(self, query, limit=20, offset=0):
+        """Return (post ids of the best matches, total match count).
+
+        Every term must match; candidates come from the rarest term's
+        postings and are checked against the others by binary search.
+        """
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            lists = []
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    return [], 0
+                lists.append(postings)
+
+            lists.sort(key=lambda postings: len(postings[0]))
+
+            doc_count = len(self._doc_numbers)
+            average_length = (
+                self._total_length / doc_count if doc_count else 0) or 1
+            idfs = [
+                math.log(1 + (doc_count - len(numbers) + 0.5)
+                         / (len(numbers) + 0.5))
+                for numbers, _ in lists
+            ]
+
+            post_ids = self._post_ids
+            lengths = self._lengths
+            (rare_numbers, rare_counts), rest = lists[0], lists[1:]
+
+            # BM25 length normalisation is K1 * (1 - B + B * length / avg)
+            norm_base = K1 * (1 - B)
+            norm_per_token = K1 * B / average_length
+
+            if not rest:
+                # one term: a single generator pass, the hot path for
+                # very common words
+                idf = idfs[0] * (K1 + 1)
+                best = heapq.nlargest(offset + limit, (
+                    (idf * count
+                     / (count + norm_base + norm_per_token * lengths[number]),
+                     post_ids[number])
+                    for number, count in zip(rare_numbers, rare_counts)
+                    if post_ids[number]
+                ))
+                total = len(rare_numbers)
+                if self._stale:
+                    total = sum(1 for number in rare_numbers
+                                if post_ids[number])
+                return [post_id for _, post_id in best[offset:]], total
+
+            scored = []
+            for number, count in zip(rare_numbers, rare_counts):
+                post_id = post_ids[number]
+                if not post_id:
+                    continue
+
+                norm = norm_base + norm_per_token * lengths[number]
+                score = idfs[0] * count * (K1 + 1) / (count + norm)
+
+                for (numbers, counts), idf in zip(rest, idfs[1:]):
+                    j = bisect_left(numbers, number)
+                    if j == len(numbers) or numbers[j] != number:
+                        break
+                    count = counts[j]
+                    score += idf * count * (K1 + 1) / (count + norm)
+                else:
+                    scored.append((score, post_id))
+
+        best = heapq.nlargest(offset + limit, scored)
+        return [post_id for _, post_id in best[offset:]], len(scored)
+
+
+search_index = InvertedIndex()
+
+
+def backend():
+    """'postgres' or 'memory', from the SEARCH_BACKEND setting."""
+
+    setting = current_app.config.get('SEARCH_BACKEND', 'auto')
+    if setting == 'auto':
+        if db.engine.dialect.name == 'postgresql':
+            return 'postgres'
+        return 'memory'
+    return setting
+
+
+def ensure_index_built():
+    """Build the in-memory index from the posts table if it isn't yet."""
+
+    if search_index.built:
+        return
+
+    with search_index._lock:
+        if not search_index.built:
+            search_index.rebuild(db.session.execute(
+                db.select(Post.id, Post.title, Post.content)
+                .execution_options(yield_per=5000)))
+
+
+def index_post(post_id, title, content):
+    """Keep the in-memory index current after a post is added or edited."""
+
+    if backend() == 'memory' and search_index.built:
+        search_index.add(post_id, f"{title} {content}")
+
+
+def unindex_post(post_id):
+    """Keep the in-memory index current after a post is deleted."""
+
+    if backend() == 'memory' and search_index.built:
+        search_index.remove(post_id)
+
+
+def unindex_user_posts(user_id):
+    """Drop a user's posts from the in-memory index before they're purged;
+    one query, and only while that index is in use."""
+
+    if backend() == 'memory' and search_index.built:
+        for post_id in db.session.scalars(
+                db.select(Post.id).where(Post.user_id == user_id)):
+            search_index.remove(post_id)
+
+
+def reset_search_index():
+    """Have the in-memory index rebuilt on the next search, after writes
+    too many to index one by one (imports, generated data)."""
+
+    with search_index._lock:
+        search_index.built = False
+
+
+def search_posts(query, page=1, per_page=20):
+    """Return (ranked post rows for `page`, whether there are more pages).
+
+    Rows are Post.listing_query() rows. Ids of posts deleted without going
+    through this process's index (e.g. by another worker) drop out here.
+    """
+
+    offset = (page - 1) * per_page
+
+    if backend() == 'postgres':
+        vector = Post.search_vector()
+        tsquery = db.func.websearch_to_tsquery(
+            db.text("'english'"), query)
+        rank = db.func.ts_rank_cd(vector, tsquery)
+
+        rows = (Post.listing_query()
+                .filter(vector.op('@@')(tsquery))
+                .order_by(rank.desc(), Post.id.desc())
+                .offset(offset)
+                .limit(per_page + 1)
+                .all())
+        return rows[:per_page], len(rows) > per_page
+
+    ensure_index_built()
+    post_ids, total = search_index.search(query, per_page, offset)
+
+    found = {
+        row.id: row
+        for row in Post.listing_query().filter(Post.id.in_(post_ids))
+    }
+    rows = [found[post_id] for post_id in post_ids if post_id in found]
+
+    return rows, offset + per_page < total
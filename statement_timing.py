@@ -0,0 +1,79 @@
+"""Timing of SQL statements for the per-request engine listeners.
+
+A StatementTimer times each statement from before_cursor_execute to
+after_cursor_execute. The start of each statement in flight is kept on its
+connection, tagged with the statement's execution context, so a statement
+run while another is executing still pairs with its own start. A statement
+that fails never reaches after_cursor_execute, so handle_error drops its
+entry rather than leaving it on the (pooled) connection for good.
+"""
+
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StatementTimer:
+    """Engine listeners calling `begin()` before each statement and
+    `end(token, statement, seconds)` once it has run.
+
+    `begin()` returns a token for `end()`, or None to leave the statement
+    untimed. `key` names the timer's entries in each connection's info.
+    """
+
+    def __init__(self, key, begin, end):
+        self.key = key
+        self.begin = begin
+        self.end = end
+        self.listening = False
+
+    def listen(self):
+        """Install the listeners on every Engine."""
+
+        if self.listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        self.listening = True
+
+    def remove(self):
+        """Uninstall the listeners."""
+
+        if not self.listening:
+            return
+        event.remove(Engine, 'before_cursor_execute', self._before_execute)
+        event.remove(Engine, 'after_cursor_execute', self._after_execute)
+        event.remove(Engine, 'handle_error', self._handle_error)
+        self.listening = False
+
+    def in_flight(self, conn):
+        """How many statements on `conn` have started but not finished."""
+
+        return len(conn.info.get(self.key, ()))
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        token = self.begin()
+        if token is not None:
+            conn.info.setdefault(self.key, []).append(
+                (context, time.perf_counter(), token))
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        entry = self._pop(conn, context)
+        if entry is not None:
+            _, started, token = entry
+            self.end(token, statement, time.perf_counter() - started)
+
+    def _handle_error(self, exception_context):
+        conn = exception_context.connection
+        if conn is not None:
+            self._pop(conn, exception_context.execution_context)
+
+    def _pop(self, conn, context):
+        stack = conn.info.get(self.key)
+        if stack and stack[-1][0] is context:
+            return stack.pop()
+        return None
@@ -0,0 +1,222 @@
+"""Deterministic synthetic data for scale testing.
+
+`generate()` appends users, posts, tags and post_tags links to whatever is
+already in the database:
+
+* post authors and tag choices follow Zipf distributions, so a few users
+  write much of the content and a few tags are on most posts;
+* post lengths are log-normal (most posts are short, some are very long)
+  and their words are Zipf-distributed too, which makes search realistic;
+* rows are generated lazily and written with one executemany per batch, so
+  memory stays flat at any volume; users' and tags' post_count are then
+  recounted in one statement each.
+
+The same `seed` and parameters always produce the same rows.
+"""
+
+import math
+import random
+from datetime import datetime, timedelta
+
+import bulk
+from cache import page_cache
+from models import db, Post, Tag, User
+from search import reset_search_index
+from timeline import timeline
+
+SYLLABLES = (
+    'ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'bra', 'cho',
+    'dri', 'fle', 'gro', 'ple', 'sto', 'tra', 'qui', 'mon', 'lan')
+
+FIRST_NAMES = (
+    'Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie',
+    'Avery', 'Quinn', 'Rowan', 'Skyler', 'Dakota', 'Emerson', 'Harper')
+LAST_NAMES = (
+    'Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Kim', 'Haddad',
+    'Larsen', 'Patel', 'Rossi', 'Murphy', 'Tanaka', 'Dubois', 'Kowalski')
+
+VOCABULARY_SIZE = 5000
+
+EPOCH = datetime(2015, 1, 1)
+
+
+def zipf_rank(rng, n, exponent=1.0):
+    """Draw a rank in 1..n with probability roughly proportional to
+    1 / rank ** exponent, in constant time and memory (inverse CDF of the
+    continuous approximation)."""
+
+    # sample x in [1, n + 1) with density ~ x ** -exponent, then floor it
+    u = rng.random()
+    if exponent == 1.0:
+        rank = (n + 1) ** u
+    else:
+        power = 1 - exponent
+        rank = (((n + 1) ** power - 1) * u + 1) ** (1 / power)
+    return min(int(rank), n)
+
+
+def vocabulary(seed, size=VOCABULARY_SIZE):
+    """`size` distinct pseudo-words; index 0 is the most common."""
+
+    rng = random.Random(f'{seed}-vocabulary')
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = ''.join(rng.choices(SYLLABLES, k=rng.randint(1, 4)))
+        if len(word) > 1 and word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def _text(rng, words, count):
+    return ' '.join(
+        words[zipf_rank(rng, len(words)) - 1] for _ in range(count))
+
+
+def _title(rng, words):
+    """A few words, cut at a word boundary to fit Post.title."""
+
+    title = _text(rng, words, rng.randint(2, 8)).capitalize()
+    if len(title) > Post.title.type.length:
+        title = title[:Post.title.type.length + 1].rsplit(' ', 1)[0]
+    return title
+
+
+def _users(rng, first_id, count):
+    for user_id in range(first_id, first_id + count):
+        yield {
+            'id': user_id,
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'image_url': '',
+            'version': 1,
+        }
+
+
+def _tags(first_id, count):
+    # names depend only on the id, so repeated runs never clash
+    words = vocabulary('tags')
+    for tag_id in range(first_id, first_id + count):
+        word = words[(tag_id - 1) % len(words)]
+        name = word if tag_id <= len(words) else f'{word}{tag_id}'
+        yield {'id': tag_id, 'name': name, 'version': 1}
+
+
+def _posts(rng, words, first_id, count, first_user_id, user_count,
+           mean_words):
+    mu = math.log(mean_words) - 0.5  # log-normal with sigma 1
+    for offset in range(count):
+        length = max(3, min(int(rng.lognormvariate(mu, 1.0)), 5000))
+        user_rank = zipf_rank(rng, user_count, 1.1)
+        yield {
+            'id': first_id + offset,
+            'title': _title(rng, words),
+            'content': _text(rng, words, length),
+            'created_at': EPOCH + timedelta(
+                minutes=offset * 7 + rng.randint(0, 6)),
+            'user_id': first_user_id + user_rank - 1,
+            'version': 1,
+        }
+
+
+def _post_tags(rng, first_post_id, post_count, first_tag_id, tag_count,
+               tags_per_post):
+    for post_id in range(first_post_id, first_post_id + post_count):
+        wanted = min(rng.randint(0, 2 * tags_per_post), tag_count)
+        tag_ranks = set()
+        while len(tag_ranks) < wanted:
+            tag_ranks.add(zipf_rank(rng, tag_count))
+        for rank in sorted(tag_ranks):
+            yield {'post_id': post_id, 'tag_id': first_tag_id + rank - 1}
+
+
+def _next_id(model):
+    return (db.session.scalar(db.select(db.func.max(model.id))) or 0) + 1
+
+
+def _write(kind, rows, total, batch_size, progress):
+    """Insert `rows` of `kind` in batches, reporting progress per batch."""
+
+    table = bulk.TABLES[kind][0]
+    batch = []
+    done = 0
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(table.insert(), batch)
+            db.session.commit()
+            done += len(batch)
+            progress(kind, done, total)
+            batch = []
+
+    if batch:
+        db.session.execute(table.insert(), batch)
+        db.session.commit()
+        done += len(batch)
+        progress(kind, done, total)
+
+    return done
+
+
+def generate(users=1000, posts=10000, tags=500, tags_per_post=3,
+             mean_words=80, seed=0, batch_size=10000,
+             progress=lambda kind, done, total: None):
+    """Append synthetic rows; return {kind: rows inserted}.
+
+    `progress(kind, done, total)` is called after every batch. post_tags
+    has no exact total up front (posts get 0..2*tags_per_post tags), so its
+    total is the expected count.
+    """
+
+    words = vocabulary(seed)
+    rng = random.Random(seed)
+
+    first_user_id = _next_id(User)
+    first_post_id = _next_id(Post)
+    first_tag_id = _next_id(Tag)
+
+    inserted = {}
+    inserted['users'] = _write(
+        'users', _users(rng, first_user_id, users), users, batch_size,
+        progress)
+    inserted['tags'] = _write(
+        'tags', _tags(first_tag_id, tags), tags, batch_size, progress)
+
+    if users:
+        inserted['posts'] = _write(
+            'posts',
+            _posts(rng, words, first_post_id, posts, first_user_id, users,
+                   mean_words),
+            posts, batch_size, progress)
+    else:
+        inserted['posts'] = 0
+
+    if inserted['posts'] and tags and tags_per_post:
+        inserted['post_tags'] = _write(
+            'post_tags',
+            _post_tags(rng, first_post_id, posts, first_tag_id, tags,
+                       tags_per_post),
+            posts * tags_per_post, batch_size, progress)
+    else:
+        inserted['post_tags'] = 0
+
+    # one set-based pass each, rather than counting row by row while writing
+    User.recount_posts()
+    Tag.recount_posts()
+    db.session.commit()
+
+    for kind in ('users', 'posts', 'tags'):
+        bulk.reset_sequence(kind)
+
+    # refresh planner statistics for the new volumes
+    if db.engine.dialect.name in ('postgresql', 'sqlite'):
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+    page_cache.clear()
+    timeline.clear()
+    reset_search_index()
+
+    return inserted
@@ -0,0 +1,140 @@
+"""Tagging posts by name, with batched writes and a tag-name cache.
+
+Post forms send tags as one comma-separated field. All names are resolved
+with at most one SELECT (none when every name is in `tag_cache`), missing
+tags are created with a single executemany that returns their ids, and only
+the post_tags rows that actually changed are inserted or deleted (along with
+one UPDATE of the changed tags' post_count).
+"""
+
+import threading
+
+from models import db, is_blank, PostTag, Tag
+
+MAX_TAG_NAME_LENGTH = Tag.name.type.length
+
+
+class TagNameCache:
+    """In-process tag name -> id map.
+
+    Only ever holds names known to exist; the tag routes drop names that are
+    renamed or deleted. Bounded so a flood of one-off tags can't grow it
+    forever (it is simply emptied when full).
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, names):
+        """Return {name: id} for whichever of `names` are cached."""
+
+        with self._lock:
+            return {
+                name: self._ids[name] for name in names if name in self._ids}
+
+    def update(self, ids_by_name):
+        with self._lock:
+            if len(self._ids) + len(ids_by_name) > self.max_size:
+                self._ids.clear()
+            self._ids.update(ids_by_name)
+
+    def discard(self, name):
+        with self._lock:
+            self._ids.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+
+tag_cache = TagNameCache()
+
+
+def parse_tag_names(text):
+    """Split a comma-separated tag field into unique, stripped names."""
+
+    names = []
+    for name in (text or '').split(','):
+        name = name.strip()
+        if not is_blank(name) and name not in names:
+            names.append(name)
+    return names
+
+
+def invalid_tag_names(names):
+    """Return the names too long to store."""
+
+    return [name for name in names if len(name) > MAX_TAG_NAME_LENGTH]
+
+
+def _select_ids(names):
+    return dict(db.session.execute(
+        db.select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+
+def resolve_tag_ids(names):
+    """Return (tag ids for `names`, {name: id} of tags that had to be created).
+
+    Only tags that already existed go into `tag_cache` here; the caller adds
+    the created ones once its transaction has committed, so a rollback can't
+    leave ids of tags that were never stored in the cache.
+    """
+
+    ids = tag_cache.lookup(names)
+    missing = [name for name in names if name not in ids]
+    created = {}
+
+    if missing:
+        found = _select_ids(missing)
+        tag_cache.update(found)
+        new_names = [name for name in missing if name not in found]
+
+        if new_names:
+            # RETURNING hands back the new ids without a second SELECT
+            created = dict(db.session.execute(
+                Tag.__table__.insert().returning(Tag.name, Tag.id),
+                [{'name': name, 'version': 1} for name in new_names]).all())
+
+        ids.update(found)
+        ids.update(created)
+
+    return [ids[name] for name in names], created
+
+
+def set_post_tags(post_id, tag_ids, current=None):
+    """Make `tag_ids` the post's tags, writing only the rows that changed.
+
+    Pass `current=()` for a brand new post to skip reading its links. The
+    tags' post_count follow the links in the same transaction.
+    Returns (added tag ids, removed tag ids).
+    """
+
+    if current is None:
+        current = db.session.scalars(
+            db.select(PostTag.tag_id).where(PostTag.post_id == post_id))
+
+    current = set(current)
+    wanted = set(tag_ids)
+
+    added = wanted - current
+    removed = current - wanted
+
+    if added:
+        db.session.execute(
+            PostTag.__table__.insert(),
+            [{'post_id': post_id, 'tag_id': tag_id} for tag_id in added])
+
+    if removed:
+        db.session.execute(
+            db.delete(PostTag)
+            .where(PostTag.post_id == post_id)
+            .where(PostTag.tag_id.in_(removed)),
+            execution_options={'synchronize_session': False})
+
+    Tag.count_posts(
+        {**{tag_id: 1 for tag_id in added},
+         **{tag_id: -1 for tag_id in removed}})
+
+    return added, removed
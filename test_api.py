@@ -0,0 +1,88 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+
+from app import app, db
+from models import User
+from testing import DatabaseTestCase, QueryCountMixin
+
+
+class ApiTestCase(QueryCountMixin, DatabaseTestCase):
+    """Test the JSON API."""
+
+    def setUp(self):
+        """Clear tables and add three users."""
+
+        super().setUp()
+
+        self.users = [
+            User(first_name=f'api{i}', last_name='user', image_url='')
+            for i in range(3)
+        ]
+        db.session.add_all(self.users)
+        db.session.commit()
+
+        self.user_ids = [user.id for user in self.users]
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_list_users_fields_and_cursor(self):
+        """Listing should project fields and page with a cursor"""
+
+        with app.test_client() as c:
+            resp = c.get("/api/v1/users?fields=first_name&limit=2")
+            body = resp.get_json()
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(body['data'], [
+                {'id': self.user_ids[0], 'first_name': 'api0'},
+                {'id': self.user_ids[1], 'first_name': 'api1'},
+            ])
+            self.assertEqual(body['next'], self.user_ids[1])
+
+            body = c.get(
+                f"/api/v1/users?fields=first_name&after={body['next']}"
+            ).get_json()
+
+            self.assertEqual(
+                [user['first_name'] for user in body['data']], ['api2'])
+            self.assertIsNone(body['next'])
+
+    def test_batch_fetch_by_ids(self):
+        """?ids= should fetch several users in one query"""
+
+        ids = f"{self.user_ids[0]},{self.user_ids[2]},99999999"
+
+        with app.test_client() as c:
+            with self.assertMaxQueries(1):
+                resp = c.get(f"/api/v1/users?ids={ids}")
+                body = resp.get_json()
+
+        self.assertEqual(
+            [user['id'] for user in body['data']],
+            [self.user_ids[0], self.user_ids[2]])
+        self.assertIn('updated_at', body['data'][0])
+
+    def test_show_user_and_errors(self):
+        """Single items and errors should come back as JSON"""
+
+        with app.test_client() as c:
+            resp = c.get(f"/api/v1/users/{self.user_ids[1]}?fields=last_name")
+            self.assertEqual(
+                resp.get_json(),
+                {'data': {'id': self.user_ids[1], 'last_name': 'user'}})
+
+            resp = c.get("/api/v1/users/99999999")
+            self.assertEqual(resp.status_code, 404)
+            self.assertIn('error', resp.get_json())
+
+            resp = c.get("/api/v1/users?fields=password")
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(resp.get_json()['error'], 'Unknown field: password')
+
+            resp = c.get("/api/v1/widgets")
+            self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,173 @@
+import asyncio
+import gzip
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+from unittest import TestCase, skipIf
+
+from werkzeug.datastructures import Headers
+
+from app import app, db
+from cache import page_cache
+from models import Post, PostTag, Tag, User
+from testing import ensure_schema, reset_caches
+
+try:
+    from asgiref.testing import ApplicationCommunicator
+    import asgi
+except ImportError:
+    # no asgiref, or no async driver (asyncpg / aiosqlite) for the database
+    asgi = None
+
+
+async def call(path, headers=()):
+    """Make one GET request of the ASGI app: (status, headers, body)."""
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in headers],
+        'server': ('localhost', 80),
+    }
+    communicator = ApplicationCommunicator(asgi.application, scope)
+    await communicator.send_input({'type': 'http.request', 'body': b''})
+
+    start = await communicator.receive_output()
+    body = b''
+    while True:
+        message = await communicator.receive_output()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    await communicator.wait()
+
+    return (start['status'],
+            Headers([(name.decode(), value.decode())
+                     for name, value in start['headers']]),
+            body)
+
+
+@skipIf(asgi is None, "asgiref or the async database driver isn't installed")
+class AsgiTestCase(TestCase):
+    """Test the async detail pages served by asgi.application.
+
+    The asyncio engine has connections of its own, so these tests commit
+    their rows (and delete them again) instead of using DatabaseTestCase's
+    rolled-back transaction.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ensure_schema()
+
+    def setUp(self):
+        """Commit a user with enough posts to compress, one of them tagged."""
+
+        reset_caches()
+        self.addCleanup(self._delete_rows)
+
+        user = User(first_name='async', last_name='reader', image_url='')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+        posts = [Post(title=f'awaited post {n}', content='x', user_id=user.id)
+                 for n in range(20)]
+        tag = Tag(name='asyncio')
+        posts[0].tags.append(tag)
+        db.session.add_all(posts)
+        db.session.commit()
+        self.post_id = posts[0].id
+
+    def _delete_rows(self):
+        db.session.rollback()
+        for model in (PostTag, Post, Tag, User):
+            db.session.execute(db.delete(model))
+        db.session.commit()
+        reset_caches()
+
+    def run_requests(self, coroutine):
+        """Run `coroutine` on a fresh event loop, then close the asyncio
+        engine's connections, which belong to that loop."""
+
+        async def run():
+            try:
+                return await coroutine
+            finally:
+                await asgi.engine.dispose()
+
+        return asyncio.run(run())
+
+    def test_user_page(self):
+        """The user page should match Flask's, 304 and fill the cache"""
+
+        url = f"/users/{self.user_id}"
+
+        async def requests():
+            first = await call(url)
+            again = await call(url, [('If-None-Match', first[1]['ETag'])])
+            return first, again
+
+        (status, headers, body), again = self.run_requests(requests())
+
+        self.assertEqual(status, 200)
+        self.assertIn(b'awaited post 7', body)
+        self.assertIsNotNone(
+            page_cache.get('fragment', ('user', self.user_id)))
+
+        with app.test_client() as c:
+            resp = c.get(url)
+            self.assertEqual(resp.headers['ETag'], headers['ETag'])
+            self.assertEqual(resp.get_data(), body)
+
+        status, headers, body = again
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+
+    def test_post_page(self):
+        """The post page should 304 on its validators and be compressed"""
+
+        url = f"/posts/{self.post_id}"
+
+        async def requests():
+            first = await call(url, [('Accept-Encoding', 'gzip')])
+            etag = first[1]['ETag']
+            again = await call(url, [('Accept-Encoding', 'gzip'),
+                                     ('If-None-Match', etag)])
+            modified = await call(
+                url, [('If-Modified-Since', first[1]['Last-Modified'])])
+            return first, again, modified
+
+        first, again, modified = self.run_requests(requests())
+
+        status, headers, body = first
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertTrue(headers['ETag'].startswith('W/'))
+        html = gzip.decompress(body)
+        self.assertIn(b'awaited post 0', html)
+        self.assertIn(b'asyncio', html)
+
+        self.assertEqual(again[0], 304)
+        self.assertEqual(modified[0], 304)
+
+    def test_missing_pages(self):
+        """Unknown ids should get the app's 404"""
+
+        async def requests():
+            return (await call("/users/99999999"),
+                    await call("/posts/99999999"))
+
+        for status, headers, body in self.run_requests(requests()):
+            self.assertEqual(status, 404)
@@ -0,0 +1,169 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+import gzip
+import json
+import tempfile
+from unittest import TestCase
+
+from flask import render_template_string
+
+from app import app
+from assets import (
+    VENDOR, UsedSelectors, build, minify_css, purge_css, static_assets)
+
+CSS = """/*! Framework v1 | MIT */
+:root { --gap: 0.5rem; }
+/* plain comment */
+*, ::before { box-sizing: border-box; }
+body { margin: 0; }
+table { border-collapse: collapse; }
+.d-flex { display: flex !important; }
+.d-grid, .gap-2 { gap: var(--gap); }
+.btn:not(.disabled):hover, .unused { color: red; }
+a[href^="http"]::after { content: " {external}"; }
+@media (min-width: 576px) {
+  .container { max-width: 540px; }
+  .unused { display: none; }
+}
+@media print { .unused { display: none; } }
+@keyframes spin { to { transform: rotate(360deg); } }
+@keyframes fade { to { opacity: 0; } }
+.spinner { animation: spin 1s; }
+.d-flex.fading { animation: fade 1s; }
+"""
+
+
+class AssetsTestCase(TestCase):
+    """Test the static asset build and how the assets are served."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.used = UsedSelectors(classes={'d-flex', 'gap-2', 'container'},
+                                  elements={'a'})
+
+    def tearDown(self):
+        static_assets.output_dir = os.path.join(
+            app.root_path, app.config['ASSETS_OUTPUT'])
+        static_assets.load()
+
+    def test_scan_templates(self):
+        """Classes, ids and tags in markup should count as used"""
+
+        used = UsedSelectors.scan(
+            [os.path.join(app.root_path, 'templates')], ['.spinner'])
+
+        self.assertIn('d-flex', used.classes)
+        self.assertIn('spinner', used.classes)
+        self.assertIn('button', used.elements)
+        self.assertNotIn('table', used.elements)
+
+    def test_purge_css(self):
+        """Unused rules, selectors, media blocks and keyframes should go"""
+
+        css = purge_css(CSS, self.used)
+
+        self.assertTrue(css.startswith('/*! Framework v1 | MIT */'))
+        self.assertNotIn('plain comment', css)
+        for kept in (':root', '*,::before', 'body', '.d-flex{',
+                     '.gap-2{', '(min-width: 576px){.container',
+                     'a[href^="http"]::after{ content: " {external}"'):
+            self.assertIn(kept, css)
+        for dropped in ('table', '.d-grid', '.btn', '.unused', 'print',
+                        'fade', 'spin'):
+            self.assertNotIn(dropped, css)
+
+    def test_minify_css(self):
+        """Whitespace and plain comments go; strings stay as they were"""
+
+        self.assertEqual(
+            minify_css('/* x */ a > b ,  c {\n  content: "a  ;  b";\n'
+                       '  margin: 0 auto;\n}\n'),
+            'a>b,c{content: "a  ;  b";margin: 0 auto}')
+
+    def test_unbuilt_bundle_falls_back_to_cdn(self):
+        """Before a build, pages should link the pinned vendor file and
+        warn about it only once"""
+
+        static_assets.output_dir = os.path.join(self.tmp.name, 'dist')
+        static_assets.load()
+        static_assets.missing.clear()
+
+        with app.test_request_context():
+            with self.assertLogs('assets', 'WARNING') as logs:
+                for _ in range(2):
+                    self.assertEqual(
+                        render_template_string("{{ asset_url('blogly.css') }}"),
+                        VENDOR['vendor/bootstrap.min.css'][0])
+        self.assertEqual(len(logs.records), 1)
+
+    def test_build_and_serve(self):
+        """Bundles should be fingerprinted, precompressed and immutable"""
+
+        source_dir = os.path.join(self.tmp.name, 'src')
+        output_dir = os.path.join(self.tmp.name, 'dist')
+        os.makedirs(os.path.join(source_dir, 'vendor'))
+        with open(os.path.join(source_dir, 'vendor', 'fw.css'), 'w') as f:
+            f.write(CSS)
+
+        report = build(source_dir, output_dir, {'site.css': ['vendor/fw.css']},
+                       self.used)
+        filename = report['site.css']['file']
+
+        self.assertRegex(filename, r'^site\.[0-9a-f]{12}\.css$')
+        self.assertLess(report['site.css']['built'],
+                        report['site.css']['source'])
+        with open(os.path.join(output_dir, 'manifest.json')) as f:
+            self.assertEqual(json.load(f), {'site.css': filename})
+        with open(os.path.join(output_dir, filename), 'rb') as f:
+            built = f.read()
+
+        static_assets.output_dir = output_dir
+        static_assets.load()
+
+        with app.test_request_context():
+            self.assertEqual(
+                render_template_string("{{ asset_url('site.css') }}"),
+                f'/assets/{filename}')
+
+        with app.test_client() as c:
+            resp = c.get(f'/assets/{filename}',
+                         headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(resp.get_data()), built)
+            self.assertEqual(resp.mimetype, 'text/css')
+            self.assertIn('immutable', resp.headers['Cache-Control'])
+            self.assertIn('max-age=31536000', resp.headers['Cache-Control'])
+            self.assertIn('Accept-Encoding', resp.headers['Vary'])
+            resp.close()
+
+            resp = c.get(f'/assets/{filename}',
+                         headers={'Accept-Encoding': 'identity'})
+            self.assertNotIn('Content-Encoding', resp.headers)
+            self.assertEqual(resp.get_data(), built)
+            resp.close()
+
+            self.assertEqual(c.get('/assets/site.css').status_code, 404)
+
+        # a rebuild leaves the old file servable for pages still linking it
+        with open(os.path.join(source_dir, 'vendor', 'fw.css'), 'a') as f:
+            f.write('.container { margin: 0 }\n')
+        report = build(source_dir, output_dir, {'site.css': ['vendor/fw.css']},
+                       self.used)
+        static_assets.load()
+        self.assertNotEqual(report['site.css']['file'], filename)
+        self.assertNotIn(filename, static_assets.files.values())
+
+        with app.test_client() as c:
+            resp = c.get(f'/assets/{filename}',
+                         headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(gzip.decompress(resp.get_data()), built)
+            self.assertIn('immutable', resp.headers['Cache-Control'])
+            resp.close()
+
+            self.assertEqual(
+                c.get('/assets/site.000000000000.css').status_code, 404)
@@ -0,0 +1,182 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+
+from app import app, db
+from commands import blogly_cli
+from models import Post, Tag, User
+from testing import ADMIN_HEADERS, DatabaseTestCase
+
+
+class BulkTestCase(DatabaseTestCase):
+    """Test bulk import and export."""
+
+    def setUp(self):
+        """Clear tables and add a user with a post."""
+
+        super().setUp()
+
+        user = User(first_name='bulk', last_name='author', image_url='')
+        db.session.add(user)
+        db.session.commit()
+
+        post = Post(title='bulk post', content='bulk content', user_id=user.id)
+        db.session.add(post)
+        db.session.commit()
+
+        self.user_id = user.id
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_import_users_csv(self):
+        """Upload should insert valid rows and report invalid ones"""
+
+        data = (
+            "first_name,last_name,image_url\n"
+            "Ada,Lovelace,\n"
+            "   ,Nameless,\n"
+            "Grace,Hopper,http://example.com/grace.jpg\n"
+        )
+
+        with app.test_client() as c:
+            resp = c.post(
+                "/admin/import/users",
+                data={'file': (io.BytesIO(data.encode()), 'users.csv')},
+                content_type='multipart/form-data', headers=ADMIN_HEADERS)
+            summary = resp.get_json()
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(summary['inserted'], 2)
+            self.assertEqual(summary['rejected'], 1)
+            self.assertEqual(summary['errors'][0]['line'], 2)
+
+            html = c.get("/users").get_data(as_text=True)
+            self.assertIn('Lovelace', html)
+            self.assertIn('Hopper', html)
+            self.assertNotIn('Nameless', html)
+
+    def test_import_posts_jsonl_chunked(self):
+        """CLI import should insert posts across several chunks"""
+
+        lines = "".join(
+            json.dumps({
+                'title': f'imported {i}',
+                'content': 'imported content',
+                'user_id': self.user_id,
+            }) + "\n"
+            for i in range(5)
+        )
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.jsonl', delete=False) as f:
+            f.write(lines)
+            path = f.name
+
+        try:
+            result = app.test_cli_runner().invoke(
+                blogly_cli, ['import', 'posts', path, '--chunk-size', '2'])
+        finally:
+            os.remove(path)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Inserted 5, rejected 0.', result.output)
+        self.assertEqual(Post.query.filter_by(user_id=self.user_id).count(), 6)
+
+    def test_import_rejects_bad_records(self):
+        """Malformed lines, orphans and duplicates should be reported, not
+        crash the import or be stored"""
+
+        db.session.add(Tag(name='taken'))
+        db.session.commit()
+
+        posts = "".join(line + "\n" for line in (
+            json.dumps({'title': 'good', 'content': 'x',
+                        'user_id': self.user_id}),
+            '{"title": "broken',
+            '[1, 2]',
+            json.dumps({'title': 'orphan', 'content': 'x',
+                        'user_id': 99999999}),
+            json.dumps({'title': 'x' * 51, 'content': 'x',
+                        'user_id': self.user_id}),
+            json.dumps({'title': 'dated', 'content': 'x',
+                        'created_at': 20240101, 'user_id': self.user_id}),
+            json.dumps({'title': ['list'], 'content': 'x',
+                        'user_id': self.user_id}),
+            json.dumps({'title': 'flag', 'content': 'x', 'user_id': True}),
+        ))
+        tags = "name\ntaken\nfresh\nfresh\n"
+
+        with app.test_client() as c:
+            resp = c.post(
+                "/admin/import/posts",
+                data={'file': (io.BytesIO(posts.encode()), 'posts.jsonl')},
+                content_type='multipart/form-data', headers=ADMIN_HEADERS)
+            summary = resp.get_json()
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(summary['inserted'], 1)
+            self.assertEqual(
+                sorted(error['line'] for error in summary['errors']),
+                [2, 3, 4, 5, 6, 7, 8])
+
+            resp = c.post(
+                "/admin/import/tags",
+                data={'file': (io.BytesIO(tags.encode()), 'tags.csv')},
+                content_type='multipart/form-data', headers=ADMIN_HEADERS)
+            summary = resp.get_json()
+
+            self.assertEqual(summary['inserted'], 1)
+            self.assertEqual(
+                [error['line'] for error in summary['errors']], [1, 3])
+
+        self.assertFalse(Post.query.filter_by(title='orphan').count())
+        self.assertEqual(Tag.query.filter_by(name='fresh').count(), 1)
+
+    def test_admin_routes_need_token(self):
+        """Import and export should refuse requests without ADMIN_TOKEN,
+        and not exist at all when none is configured"""
+
+        with app.test_client() as c:
+            resp = c.get("/admin/export/posts.jsonl")
+            self.assertEqual(resp.status_code, 401)
+
+            resp = c.get("/admin/export/posts.jsonl",
+                         headers={'Authorization': 'Bearer wrong'})
+            self.assertEqual(resp.status_code, 401)
+
+            resp = c.post("/admin/import/users", data={
+                'file': (io.BytesIO(b"first_name,last_name\nNo,Token\n"),
+                         'users.csv')})
+            self.assertEqual(resp.status_code, 401)
+            self.assertFalse(User.query.filter_by(first_name='No').count())
+
+            with mock.patch.dict(app.config, ADMIN_TOKEN=None):
+                resp = c.get("/admin/export/posts.jsonl",
+                             headers=ADMIN_HEADERS)
+                self.assertEqual(resp.status_code, 404)
+
+    def test_export_posts_jsonl(self):
+        """Export should stream one JSON object per post"""
+
+        with app.test_client() as c:
+            resp = c.get("/admin/export/posts.jsonl", headers=ADMIN_HEADERS)
+            records = [
+                json.loads(line)
+                for line in resp.get_data(as_text=True).splitlines()
+            ]
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(len(records), 1)
+            self.assertEqual(records[0]['title'], 'bulk post')
+            self.assertEqual(records[0]['user_id'], self.user_id)
+
+            resp = c.get("/admin/export/nothing.csv",
+                         headers=ADMIN_HEADERS)
+            self.assertEqual(resp.status_code, 404)
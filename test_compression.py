@@ -0,0 +1,114 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+import gzip
+from unittest import mock
+
+from werkzeug.datastructures import Accept
+
+import compression as compression_module
+from app import app, db
+from cache import page_cache
+from compression import compression
+from models import Post, User
+from testing import DatabaseTestCase
+
+
+class CompressionTestCase(DatabaseTestCase):
+    """Test response compression and its cache of compressed bodies."""
+
+    def setUp(self):
+        """Add a user with enough posts for a page worth compressing."""
+
+        super().setUp()
+
+        user = User(first_name='squeeze', last_name='me', image_url='')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+        db.session.add_all([
+            Post(title=f'compressible post {n}', content='x', user_id=user.id)
+            for n in range(20)])
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_negotiates_gzip(self):
+        """Pages should be gzipped for clients accepting it, and still 304"""
+
+        url = f"/users/{self.user_id}"
+
+        with app.test_client() as c:
+            plain = c.get(url)
+            self.assertIsNone(plain.content_encoding)
+            self.assertIn('Accept-Encoding', plain.vary)
+
+            resp = c.get(url, headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(resp.content_encoding, 'gzip')
+            self.assertIn('Accept-Encoding', resp.vary)
+            self.assertEqual(gzip.decompress(resp.get_data()),
+                             plain.get_data())
+
+            etag, weak = resp.get_etag()
+            self.assertTrue(weak)
+            self.assertEqual(etag, plain.get_etag()[0])
+
+            resp = c.get(url, headers={
+                'Accept-Encoding': 'gzip',
+                'If-None-Match': resp.headers['ETag']})
+            self.assertEqual(resp.status_code, 304)
+
+            refused = c.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+            self.assertIsNone(refused.content_encoding)
+
+    def test_small_responses_left_alone(self):
+        """Bodies under COMPRESS_MIN_SIZE aren't worth compressing"""
+
+        with app.test_client() as c:
+            resp = c.get("/users/9999999", headers={'Accept-Encoding': 'gzip'})
+            self.assertIsNone(resp.content_encoding)
+
+        with mock.patch.object(compression, 'min_size', 10 ** 9):
+            with app.test_client() as c:
+                resp = c.get(f"/users/{self.user_id}",
+                             headers={'Accept-Encoding': 'gzip'})
+            self.assertIsNone(resp.content_encoding)
+
+    def test_compresses_each_version_once(self):
+        """An unchanged page should reuse its compressed body"""
+
+        url = f"/users/{self.user_id}"
+        gzip_codec = mock.Mock(wraps=compression_module.CODECS['gzip'])
+
+        with mock.patch.dict(compression_module.CODECS, gzip=gzip_codec):
+            with app.test_client() as c:
+                first = c.get(url, headers={'Accept-Encoding': 'gzip'})
+                second = c.get(url, headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual(gzip_codec.call_count, 1)
+                self.assertEqual(first.get_data(), second.get_data())
+                # kept apart from the page cache and its version tokens
+                self.assertGreater(len(compression.cache), 0)
+                self.assertFalse(any(
+                    key.startswith('compressed')
+                    for key in page_cache.backend._entries))
+
+                c.post(f"/users/{self.user_id}/edit", data={
+                    'first_name': 'squeezed', 'last_name': 'me',
+                    'image_url': ''})
+                c.get(url)  # consume the flashed message
+                resp = c.get(url, headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(gzip_codec.call_count, 2)
+        self.assertIn(b'squeezed', gzip.decompress(resp.get_data()))
+
+    def test_prefers_our_order_among_equals(self):
+        """Encodings the client rates equally go by server preference"""
+
+        encodings = Accept([('gzip', 1), ('identity', 1)])
+        self.assertEqual(compression.choose(encodings), 'gzip')
+        self.assertIsNone(compression.choose(Accept([('compress', 1)])))
@@ -0,0 +1,145 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+from app import app, db
+from models import Post, Tag, User
+from testing import DatabaseTestCase, QueryCounter
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+def atom_titles(resp):
+    feed = ElementTree.fromstring(resp.get_data())
+    return [entry.find(f'{ATOM}title').text
+            for entry in feed.iter(f'{ATOM}entry')]
+
+
+class FeedsTestCase(DatabaseTestCase):
+    """Test the Atom/RSS feeds and their caching."""
+
+    def setUp(self):
+        """Add two users, one with tagged posts."""
+
+        super().setUp()
+
+        self.writer = User(first_name='feed', last_name='writer',
+                           image_url='')
+        self.other = User(first_name='other', last_name='writer',
+                          image_url='')
+        self.tag = Tag(name='feedtag')
+        db.session.add_all([self.writer, self.other, self.tag])
+        db.session.commit()
+
+        start = datetime(2024, 1, 1)
+        for n in range(3):
+            post = Post(title=f'post {n}', content=f'content <{n}> & more',
+                        created_at=start + timedelta(days=n),
+                        user_id=self.writer.id)
+            post.tags.append(self.tag)
+            db.session.add(post)
+        db.session.commit()
+
+        self.writer_id, self.other_id = self.writer.id, self.other.id
+        self.tag_id = self.tag.id
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_feeds_list_newest_first(self):
+        """Every feed should be well-formed and newest first"""
+
+        with app.test_client() as c:
+            for url in ("/feed.atom", f"/users/{self.writer_id}/feed.atom",
+                        f"/tags/{self.tag_id}/feed.atom"):
+                resp = c.get(url)
+                self.assertEqual(resp.mimetype, 'application/atom+xml')
+                self.assertEqual(
+                    atom_titles(resp), ['post 2', 'post 1', 'post 0'])
+
+            resp = c.get(f"/users/{self.writer_id}/feed.rss")
+            channel = ElementTree.fromstring(resp.get_data()).find('channel')
+            self.assertEqual(resp.mimetype, 'application/rss+xml')
+            self.assertEqual(channel.find('title').text,
+                             'Posts by feed writer')
+            self.assertEqual(
+                [item.find('description').text
+                 for item in channel.iter('item')][0], 'content <2> & more')
+
+            self.assertEqual(c.get(f"/users/{self.other_id}/feed.atom")
+                             .status_code, 200)
+            self.assertEqual(c.get("/users/9999999/feed.atom").status_code,
+                             404)
+
+    def test_feed_pages(self):
+        """Each feed page should link to the next, older one"""
+
+        app.config['FEED_SIZE'] = 2
+
+        try:
+            with app.test_client() as c:
+                resp = c.get("/feed.atom")
+                self.assertEqual(atom_titles(resp), ['post 2', 'post 1'])
+
+                feed = ElementTree.fromstring(resp.get_data())
+                next_url = [link.get('href')
+                            for link in feed.iter(f'{ATOM}link')
+                            if link.get('rel') == 'next'][0]
+
+                resp = c.get(next_url)
+                self.assertEqual(atom_titles(resp), ['post 0'])
+        finally:
+            app.config['FEED_SIZE'] = 20
+
+    def test_polling_hits_cache(self):
+        """Unchanged feeds should be served, or 304'd, without queries"""
+
+        url = f"/users/{self.writer_id}/feed.atom"
+
+        with app.test_client() as c:
+            etag = c.get(url).headers['ETag']
+
+            with QueryCounter(db.engine) as counter:
+                self.assertEqual(c.get(url).status_code, 200)
+                resp = c.get(url, headers={'If-None-Match': etag})
+
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.get_data(), b'')
+            self.assertEqual(counter.count, 0)
+
+    def test_invalidated_by_relevant_posts_only(self):
+        """A feed should change only when one of its posts does"""
+
+        writer_url = f"/users/{self.writer_id}/feed.atom"
+        tag_url = f"/tags/{self.tag_id}/feed.atom"
+
+        with app.test_client() as c:
+            etags = {url: c.get(url).headers['ETag']
+                     for url in (writer_url, tag_url, "/feed.atom")}
+
+            c.post(f"/users/{self.other_id}/posts/new",
+                   data={'title': 'unrelated', 'content': 'x', 'tags': ''})
+
+            self.assertEqual(c.get(writer_url, headers={
+                'If-None-Match': etags[writer_url]}).status_code, 304)
+            self.assertEqual(c.get(tag_url, headers={
+                'If-None-Match': etags[tag_url]}).status_code, 304)
+            self.assertIn('unrelated', atom_titles(c.get("/feed.atom")))
+
+            post_id = Post.query.filter_by(title='post 1').one().id
+            c.post(f"/posts/{post_id}/edit",
+                   data={'title': 'retitled', 'content': 'x', 'tags': ''})
+
+            resp = c.get(writer_url, headers={
+                'If-None-Match': etags[writer_url]})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(atom_titles(resp), ['post 2', 'retitled',
+                                                 'post 0'])
+            # untagged by the edit
+            self.assertEqual(atom_titles(c.get(tag_url)),
+                             ['post 2', 'post 0'])
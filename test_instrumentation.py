@@ -0,0 +1,99 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app import app, db
+from instrumentation import instrumentation, statement_timer
+from models import Post, User
+from testing import ADMIN_HEADERS, DatabaseTestCase
+
+
+class InstrumentationTestCase(DatabaseTestCase):
+    """Test per-request timings and the /metrics endpoint."""
+
+    def setUp(self):
+        """Enable instrumentation and add a user with a post."""
+
+        super().setUp()
+
+        user = User(first_name='timed', last_name='user', image_url='')
+        db.session.add(user)
+        db.session.commit()
+
+        post = Post(title='timed post', content='content', user_id=user.id)
+        db.session.add(post)
+        db.session.commit()
+
+        self.post_id = post.id
+        db.session.expunge_all()
+
+        instrumentation.reset()
+        instrumentation.enable()
+
+    def tearDown(self):
+        """Back to the test profile's default: disabled."""
+
+        instrumentation.disable()
+        db.session.rollback()
+
+    def test_server_timing_header(self):
+        """Responses should report SQL and render timings"""
+
+        with app.test_client() as c:
+            resp = c.get(f"/posts/{self.post_id}")
+
+        timing = resp.headers['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'render;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+')
+
+    def test_metrics_histograms_per_endpoint(self):
+        """/metrics should aggregate requests per endpoint"""
+
+        with app.test_client() as c:
+            c.get(f"/posts/{self.post_id}")
+            c.get(f"/posts/{self.post_id}")
+            c.get("/users")
+            self.assertEqual(c.get("/metrics").status_code, 401)
+            text = c.get("/metrics", headers=ADMIN_HEADERS).get_data(
+                as_text=True)
+
+        self.assertIn("# TYPE blogly_request_seconds histogram", text)
+        self.assertIn(
+            'blogly_request_seconds_count{endpoint="blogly.show_post_page"} 2',
+            text)
+        self.assertIn(
+            'blogly_db_statements_count{endpoint="blogly.show_all_users"} 1',
+            text)
+        self.assertIn(
+            'blogly_response_bytes_bucket{endpoint="blogly.show_all_users",'
+            'le="+Inf"} 1', text)
+
+    def test_disabled(self):
+        """Disabled instrumentation should leave responses alone"""
+
+        instrumentation.disable()
+
+        with app.test_client() as c:
+            resp = c.get(f"/posts/{self.post_id}")
+            self.assertNotIn('Server-Timing', resp.headers)
+            self.assertEqual(
+                c.get("/metrics", headers=ADMIN_HEADERS).status_code, 404)
+
+    def test_failed_statement_not_left_on_connection(self):
+        """A statement that errors shouldn't leave its start time behind"""
+
+        connection = db.session.connection()
+        with app.test_request_context():
+            app.preprocess_request()
+            with self.assertRaises(DBAPIError):
+                with db.session.begin_nested():
+                    db.session.execute(text("SELECT * FROM no_such_table"))
+            db.session.execute(text("SELECT 1"))
+
+            self.assertEqual(statement_timer.in_flight(connection), 0)
@@ -1,11 +1,19 @@
+import io
 import os
+from datetime import datetime, timedelta
+from unittest import mock
 
-os.environ["DATABASE_URL"] = "postgresql:///blogly_test"
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
 
-from unittest import TestCase
 
 from app import app, db
-from models import Post, User
+from models import Post, PostTag, Tag, User
+from purge import purge_user_in_background, wait_for_purges
+from search import InvertedIndex, search_index
+from tagging import resolve_tag_ids, tag_cache
+from testing import (
+    ADMIN_HEADERS, DatabaseTestCase, QueryCounter, QueryCountMixin)
 # from models import  DEFAULT_IMAGE_URL
 
 
@@ -15,22 +23,15 @@ app.config['TESTING'] = True
 # This is a bit of hack, but don't use Flask DebugToolbar
 app.config['DEBUG_TB_HOSTS'] = ['dont-show-debug-toolbar']
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.drop_all()
-db.create_all()
-
-class PostsTestCase(TestCase):
+class PostsTestCase(QueryCountMixin, DatabaseTestCase):
     """Test views for users."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
+        super().setUp()
+
         # Clear tables and make sure there is test user with test post
-        Post.query.delete()
-        User.query.delete()
 
         test_user = User(
             first_name='test',
@@ -189,4 +190,387 @@ class PostsTestCase(TestCase):
             self.assertNotIn(self.user_last_name, html)
 
             resp = c.post("/users/9999999999/delete")
-            self.assertEqual(resp.status_code, 404)
\ No newline at end of file
+            self.assertEqual(resp.status_code, 404)
+
+    def test_user_page_query_count(self):
+        """User page should not issue a query per post"""
+
+        for i in range(5):
+            db.session.add(Post(
+                title=f'extra post {i}',
+                content='extra content',
+                user_id=self.user_id
+            ))
+        db.session.commit()
+        db.session.expunge_all()
+
+        with app.test_client() as c:
+            with self.assertMaxQueries(3):
+                resp = c.get(f"/users/{self.user_id}")
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('extra post 4', resp.get_data(as_text=True))
+
+    def test_post_page_query_count(self):
+        """Post page should load author and tags in a fixed number of queries"""
+
+        post = db.session.get(Post, self.test_post_id)
+        for i in range(3):
+            post.tags.append(Tag(name=f'query tag {i}'))
+        db.session.commit()
+        db.session.expunge_all()
+
+        with app.test_client() as c:
+            with self.assertMaxQueries(4):
+                resp = c.get(f"/posts/{self.test_post_id}")
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('query tag 2', resp.get_data(as_text=True))
+
+    def test_post_page_conditional_get(self):
+        """Post page should answer a matching If-None-Match with 304"""
+
+        with app.test_client() as c:
+            resp = c.get(f"/posts/{self.test_post_id}")
+            etag = resp.headers['ETag']
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIsNotNone(resp.last_modified)
+
+            resp = c.get(
+                f"/posts/{self.test_post_id}",
+                headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+
+            c.post(
+                f"/posts/{self.test_post_id}/edit",
+                data={'title': 'changed title', 'content': 'changed'},
+                follow_redirects=True)
+
+            resp = c.get(
+                f"/posts/{self.test_post_id}",
+                headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp.headers['ETag'], etag)
+
+    def test_delete_user_with_tagged_posts(self):
+        """Deleting a user should remove their posts' post_tags rows"""
+
+        post = db.session.get(Post, self.test_post_id)
+        post.tags.append(Tag(name='doomed'))
+        db.session.commit()
+
+        with app.test_client() as c:
+            # (the fifth statement lowers the tags' post_count)
+            with self.assertMaxQueries(5):
+                resp = c.post(f"/users/{self.user_id}/delete")
+
+            self.assertEqual(resp.status_code, 302)
+
+        self.assertEqual(Post.query.count(), 0)
+        self.assertEqual(PostTag.query.count(), 0)
+        self.assertEqual(Tag.query.count(), 1)
+
+    def test_delete_user_in_background(self):
+        """Users over the post threshold should be purged in the background"""
+
+        app.config['PURGE_IN_BACKGROUND_AFTER'] = 0
+        app.config['PURGE_BATCH_SIZE'] = 1
+
+        for i in range(3):
+            db.session.add(Post(
+                title=f'batch post {i}',
+                content='batch content',
+                user_id=self.user_id
+            ))
+        db.session.commit()
+
+        try:
+            with app.test_client() as c:
+                c.get("/search?q=batch")  # build the index
+
+                resp = c.post(f"/users/{self.user_id}/delete")
+                self.assertEqual(resp.status_code, 302)
+
+                # the purge shares this test's connection, so let it finish
+                # before making another request
+                wait_for_purges()
+
+                resp = c.get(resp.location)
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn('User is being deleted.',
+                              resp.get_data(as_text=True))
+
+            db.session.expire_all()
+
+            self.assertIsNone(db.session.get(User, self.user_id))
+            self.assertEqual(Post.query.count(), 0)
+            self.assertEqual(search_index.search('batch'), ([], 0))
+        finally:
+            app.config['PURGE_IN_BACKGROUND_AFTER'] = None
+            app.config['PURGE_BATCH_SIZE'] = 1000
+
+    def test_failed_background_purge_is_logged(self):
+        """An exception in a background purge shouldn't pass silently"""
+
+        with mock.patch('purge.purge_user_in_batches',
+                        side_effect=RuntimeError('disk on fire')):
+            with self.assertLogs('purge', 'ERROR') as logs:
+                purge_user_in_background(app, self.user_id)
+                wait_for_purges()
+
+        self.assertIn(f'user {self.user_id} failed', logs.output[0])
+        self.assertIn('disk on fire', logs.output[0])
+
+    def test_submit_new_post_with_tags(self):
+        """New post form should create missing tags and link them"""
+
+        db.session.add(Tag(name='existing'))
+        db.session.commit()
+
+        with app.test_client() as c:
+            resp = c.post(
+                f"/users/{self.user_id}/posts/new",
+                data={
+                    'title': self.new_post_title,
+                    'content': self.new_post_content,
+                    'tags': 'existing, fresh, , existing'
+                })
+
+            self.assertEqual(resp.status_code, 302)
+
+        post = Post.query.filter_by(title=self.new_post_title).one()
+        self.assertEqual(
+            sorted(tag.name for tag in post.tags), ['existing', 'fresh'])
+        self.assertEqual(Tag.query.count(), 2)
+
+    def test_post_counts_follow_writes(self):
+        """Creating, retagging and deleting posts should keep post_count"""
+
+        # the fixture post was added directly, so its author is off by one
+        self.assertEqual(User.recount_posts(), 1)
+        self.assertEqual(User.recount_posts(), 0)
+        db.session.commit()
+
+        def counts():
+            db.session.expire_all()
+            return (
+                db.session.get(User, self.user_id).post_count,
+                dict(db.session.execute(db.select(Tag.name, Tag.post_count))
+                     .all()))
+
+        with app.test_client() as c:
+            c.post(f"/users/{self.user_id}/posts/new", data={
+                'title': self.new_post_title,
+                'content': self.new_post_content,
+                'tags': 'red, blue'
+            })
+            self.assertEqual(counts(), (2, {'red': 1, 'blue': 1}))
+
+            new_post_id = Post.query.filter_by(
+                title=self.new_post_title).one().id
+            c.post(f"/posts/{self.test_post_id}/edit", data={
+                'title': self.test_post_title,
+                'content': self.test_post_content,
+                'tags': 'red'
+            })
+            c.post(f"/posts/{new_post_id}/edit", data={
+                'title': self.new_post_title,
+                'content': self.new_post_content,
+                'tags': 'red, green'
+            })
+            self.assertEqual(
+                counts(), (2, {'red': 2, 'blue': 0, 'green': 1}))
+
+            resp = c.get("/tags?sort=popular")
+            html = resp.get_data(as_text=True)
+            self.assertLess(html.index('red'), html.index('green'))
+            self.assertLess(html.index('green'), html.index('blue'))
+            self.assertIn('(2 posts)', html)
+
+            c.post(f"/posts/{new_post_id}/delete")
+            self.assertEqual(
+                counts(), (1, {'red': 1, 'blue': 0, 'green': 0}))
+
+        self.assertEqual(User.recount_posts(), 0)
+        self.assertEqual(Tag.recount_posts(), 0)
+
+    def test_submit_edit_post_tags_diff(self):
+        """Editing tags should only write changed links, using the tag cache"""
+
+        post = db.session.get(Post, self.test_post_id)
+        post.tags.extend([Tag(name='keep'), Tag(name='drop')])
+        db.session.add(Tag(name='add'))
+        db.session.commit()
+
+        data = {
+            'title': self.test_post_title,
+            'content': self.test_post_content,
+            'tags': 'keep, add'
+        }
+
+        with app.test_client() as c:
+            c.post(f"/posts/{self.test_post_id}/edit", data=data)
+
+            # every name is cached now, so tags are never looked up
+            with QueryCounter(db.engine) as counter:
+                resp = c.post(f"/posts/{self.test_post_id}/edit", data=data)
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertFalse(any(
+                'FROM tags' in statement for statement in counter.statements))
+
+        db.session.expire_all()
+        post = db.session.get(Post, self.test_post_id)
+        self.assertEqual(sorted(tag.name for tag in post.tags), ['add', 'keep'])
+
+    def test_created_tags_cached_only_once_committed(self):
+        """A rolled-back tag must not stay in the tag name cache"""
+
+        resolve_tag_ids(['doomed'])
+        db.session.rollback()
+        self.assertEqual(tag_cache.lookup(['doomed']), {})
+
+        tag_ids, created = resolve_tag_ids(['kept'])
+        db.session.commit()
+        tag_cache.update(created)
+        self.assertEqual(tag_cache.lookup(['kept']), {'kept': tag_ids[0]})
+
+    def test_show_tag_posts_paginated(self):
+        """Tag page should list its posts newest first, page by page"""
+
+        tag = Tag(name='paged')
+        start = datetime(2023, 1, 1)
+        for i in range(3):
+            post = Post(
+                title=f'tagged post {i}',
+                content='tagged content',
+                user_id=self.user_id,
+                created_at=start + timedelta(days=i)
+            )
+            post.tags.append(tag)
+            db.session.add(post)
+        db.session.commit()
+
+        app.config['POSTS_PER_PAGE'] = 2
+
+        try:
+            with app.test_client() as c:
+                resp = c.get(f"/tags/{tag.id}/posts")
+                html = resp.get_data(as_text=True)
+
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn('<!-- Test: detail.html', html)
+                self.assertLess(
+                    html.index('tagged post 2'), html.index('tagged post 1'))
+                self.assertNotIn('tagged post 0', html)
+                self.assertNotIn(self.test_post_title, html)
+
+                older = html.split('?after=')[1].split('"')[0]
+                resp = c.get(f"/tags/{tag.id}/posts?after={older}")
+                html = resp.get_data(as_text=True)
+
+                self.assertIn('tagged post 0', html)
+                self.assertNotIn('tagged post 1', html)
+                self.assertIn('?before=', html)
+                self.assertNotIn('?after=', html)
+
+                resp = c.get("/tags/99999999/posts")
+                self.assertEqual(resp.status_code, 404)
+        finally:
+            app.config['POSTS_PER_PAGE'] = 20
+
+    def test_list_tags_empty_page_not_cached_as_first(self):
+        """An empty ?after= page mustn't be served for the first page"""
+
+        db.session.add(Tag(name='listed'))
+        db.session.commit()
+
+        with app.test_client() as c:
+            html = c.get("/tags?after=99999999").get_data(as_text=True)
+            self.assertNotIn('listed', html)
+
+            html = c.get("/tags").get_data(as_text=True)
+            self.assertIn('listed', html)
+
+    def test_search_posts(self):
+        """Search should find new and edited posts and drop deleted ones"""
+
+        with app.test_client() as c:
+            resp = c.get("/search?q=test")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('<!-- Test: search.html', html)
+            self.assertIn(self.test_post_title, html)
+
+            c.post(
+                f"/users/{self.user_id}/posts/new",
+                data={'title': 'Zebra facts', 'content': 'stripes'})
+            html = c.get("/search?q=zebra+stripes").get_data(as_text=True)
+            self.assertIn('Zebra facts', html)
+
+            c.post(
+                f"/posts/{self.test_post_id}/edit",
+                data={'title': 'Renamed', 'content': 'nothing here'})
+            html = c.get("/search?q=test").get_data(as_text=True)
+            self.assertIn('No posts found.', html)
+
+            zebra = Post.query.filter_by(title='Zebra facts').one()
+            c.post(f"/posts/{zebra.id}/delete")
+            html = c.get("/search?q=zebra").get_data(as_text=True)
+            self.assertIn('No posts found.', html)
+
+    def test_search_follows_imports_and_user_deletes(self):
+        """Imported posts should be found; a deleted user's posts should
+        leave the index"""
+
+        posts = (
+            '{"title": "Imported zebra", "content": "stripes", '
+            f'"user_id": {self.user_id}}}\n')
+
+        with app.test_client() as c:
+            c.get("/search?q=zebra")  # build the index
+
+            c.post(
+                "/admin/import/posts",
+                data={'file': (io.BytesIO(posts.encode()), 'posts.jsonl')},
+                content_type='multipart/form-data', headers=ADMIN_HEADERS)
+            html = c.get("/search?q=zebra").get_data(as_text=True)
+            self.assertIn('Imported zebra', html)
+
+            c.post(f"/users/{self.user_id}/delete")
+            self.assertEqual(search_index.search('zebra'), ([], 0))
+            self.assertEqual(search_index.search('test'), ([], 0))
+
+    def test_inverted_index_ranking(self):
+        """Index should rank by BM25 and require every term"""
+
+        index = InvertedIndex()
+        index.add(1, 'python tips')
+        index.add(2, 'python python python tricks')
+        index.add(3, 'java tips')
+
+        self.assertEqual(index.search('python')[0], [2, 1])
+        self.assertEqual(index.search('python tips'), ([1], 1))
+        self.assertEqual(index.search('the'), ([], 0))
+
+        index.add(1, 'rust tips')
+        index.remove(2)
+        self.assertEqual(index.search('python'), ([], 0))
+        self.assertEqual(index.search('tips', limit=1, offset=1)[1], 2)
+
+    def test_inverted_index_caps_long_posts_consistently(self):
+        """A post too long to store its length should add and take back the
+        same capped length"""
+
+        index = InvertedIndex()
+        index.add(1, 'word ' * 70000)
+        index.add(2, 'short post')
+        self.assertEqual(index._total_length, 65535 + 2)
+
+        index.remove(1)
+        self.assertEqual(index._total_length, 2)
+        index._compact()
+        self.assertEqual(index._total_length, 2)
+        self.assertEqual(index.search('short')[0], [2])
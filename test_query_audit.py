@@ -0,0 +1,114 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+
+from flask import Response
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app import app, db
+from models import Post, User
+from query_audit import (
+    DuplicateQueryError, normalize, query_audit, statement_timer)
+from testing import DatabaseTestCase
+
+
+class QueryAuditTestCase(DatabaseTestCase):
+    """Test duplicate and slow statement detection."""
+
+    def setUp(self):
+        """Add two users with a post each."""
+
+        super().setUp()
+
+        users = [
+            User(first_name=f'audit{i}', last_name='user', image_url='')
+            for i in range(2)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+
+        db.session.add_all([
+            Post(title=f'post {i}', content='content', user_id=user.id)
+            for i, user in enumerate(users)
+        ])
+        db.session.commit()
+        db.session.expunge_all()
+
+    def tearDown(self):
+        """Restore the test profile's audit settings."""
+
+        db.session.rollback()
+        query_audit.strict = True
+        query_audit.slow_after = app.config['SLOW_QUERY_SECONDS']
+
+    def audit(self, work):
+        """Run `work` as if it were a request, through the audit hooks."""
+
+        with app.test_request_context('/audited'):
+            query_audit._before_request()
+            work()
+            return query_audit._after_request(Response())
+
+    def test_normalize(self):
+        """Literals and IN lists should not make statements differ"""
+
+        self.assertEqual(
+            normalize("SELECT * FROM posts\n WHERE id IN (?, ?, ?) "
+                      "AND title = 'x''y' LIMIT 10"),
+            "SELECT * FROM posts WHERE id IN (?) AND title = ? LIMIT ?")
+
+    def test_lazy_loads_in_a_loop_fail_in_strict_mode(self):
+        """An N+1 should fail the request in strict mode"""
+
+        def n_plus_one():
+            for post in Post.query.all():
+                post.user.first_name
+
+        with self.assertRaises(DuplicateQueryError) as caught:
+            self.audit(n_plus_one)
+
+        report = str(caught.exception)
+        self.assertIn("duplicate x2", report)
+        self.assertIn("test_query_audit.py", report)
+        self.assertIn("FROM users WHERE users.id = ?", report)
+
+    def test_report_logged_when_not_strict(self):
+        """Outside strict mode duplicates and slow statements are logged"""
+
+        query_audit.strict = False
+        query_audit.slow_after = 0
+
+        def queries():
+            User.query.count()
+            User.query.count()
+
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            self.audit(queries)
+
+        self.assertIn("duplicate x2", logs.output[0])
+        self.assertIn("slow", logs.output[0])
+
+    def test_failed_statement_not_left_on_connection(self):
+        """A statement that errors should be dropped, not left for the
+        next one to be paired with"""
+
+        query_audit.strict = False
+        query_audit.slow_after = 0
+        connection = db.session.connection()
+
+        def queries():
+            with self.assertRaises(DBAPIError):
+                with db.session.begin_nested():
+                    db.session.execute(text("SELECT * FROM no_such_table"))
+            self.assertEqual(statement_timer.in_flight(connection), 0)
+            db.session.execute(text("SELECT 1"))
+
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            self.audit(queries)
+
+        self.assertIn("SELECT ?", logs.output[0])
+        self.assertIn("from test_query_audit.py", logs.output[0])
+        self.assertNotIn("no_such_table", logs.output[0])
@@ -0,0 +1,87 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+import tempfile
+
+from app import app, db
+from cache import page_cache
+from models import User
+from replicas import replicas
+from testing import DatabaseTestCase
+
+
+class ReplicaTestCase(DatabaseTestCase):
+    """Test read-replica routing, with a SQLite file as the replica."""
+
+    def setUp(self):
+        """Add a user to the primary and a differently named copy to the
+        replica, so each page shows which database it read."""
+
+        super().setUp()
+
+        user = User(first_name='primary', last_name='copy', image_url='')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+        self.tmp = tempfile.TemporaryDirectory()
+        replicas.set_replicas([f'sqlite:///{self.tmp.name}/replica.db'])
+        replica = replicas.engines[0]
+        db.metadata.create_all(replica)
+
+        with replica.begin() as conn:
+            conn.execute(User.__table__.insert(), {
+                'id': self.user_id, 'first_name': 'replica',
+                'last_name': 'copy', 'image_url': '', 'version': 1})
+
+        # drop the primary's copy from the identity map
+        db.session.expunge_all()
+
+    def tearDown(self):
+        """Go back to the primary alone."""
+
+        db.session.rollback()
+        replicas.set_replicas([])
+        self.tmp.cleanup()
+
+    def test_get_reads_from_replica(self):
+        """GET pages should come from the replica"""
+
+        with app.test_client() as c:
+            html = c.get(f"/users/{self.user_id}").get_data(as_text=True)
+
+        self.assertIn("replica copy", html)
+        self.assertNotIn("primary copy", html)
+
+    def test_reads_after_write_use_primary(self):
+        """A browser that just wrote should read its writes"""
+
+        with app.test_client() as writer:
+            resp = writer.post(f"/users/{self.user_id}/posts/new", data={
+                'title': 'fresh', 'content': 'post', 'tags': ''})
+            self.assertEqual(resp.status_code, 302)
+
+            html = writer.get(f"/users/{self.user_id}").get_data(as_text=True)
+            self.assertIn("primary copy", html)
+            self.assertIn("fresh", html)
+
+        # (a cached page would hide which database the next read used)
+        page_cache.clear()
+        db.session.expunge_all()
+
+        with app.test_client() as other:
+            html = other.get(f"/users/{self.user_id}").get_data(as_text=True)
+            self.assertIn("replica copy", html)
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """Reads should use the primary when no replica answers"""
+
+        replicas.set_replicas(['sqlite:////nonexistent/dir/replica.db'])
+
+        with app.test_client() as c:
+            html = c.get(f"/users/{self.user_id}").get_data(as_text=True)
+
+        self.assertIn("primary copy", html)
+        self.assertTrue(replicas.engines[0] in replicas._down_until)
@@ -0,0 +1,87 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+import random
+from collections import Counter
+
+from app import db
+from models import Post, PostTag, Tag, User
+from synthetic import generate, zipf_rank
+from testing import DatabaseTestCase
+
+
+def snapshot():
+    """Every generated row, without ids, in insertion order."""
+
+    return (
+        db.session.execute(db.select(
+            User.first_name, User.last_name).order_by(User.id)).all(),
+        db.session.execute(db.select(
+            Post.title, Post.content, Post.created_at).order_by(Post.id)
+        ).all(),
+        db.session.execute(db.select(Tag.name).order_by(Tag.id)).all(),
+        db.session.execute(db.select(db.func.count()).select_from(PostTag)
+                           ).scalar(),
+    )
+
+
+class SyntheticTestCase(DatabaseTestCase):
+    """Test the synthetic data generator."""
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_generate_is_deterministic(self):
+        """The same seed should produce the same data"""
+
+        inserted = generate(users=20, posts=200, tags=30, seed=7,
+                            batch_size=50)
+        first = snapshot()
+
+        self.assertEqual(inserted['users'], 20)
+        self.assertEqual(inserted['posts'], 200)
+        self.assertEqual(inserted['tags'], 30)
+        self.assertEqual(inserted['post_tags'], first[3])
+
+        PostTag.query.delete()
+        Tag.query.delete()
+        Post.query.delete()
+        User.query.delete()
+        generate(users=20, posts=200, tags=30, seed=7, batch_size=50)
+        self.assertEqual(snapshot(), first)
+
+    def test_generate_appends(self):
+        """A second run should add to, not clash with, existing rows"""
+
+        generate(users=5, posts=10, tags=5, seed=1)
+        generate(users=5, posts=10, tags=5, seed=2)
+
+        self.assertEqual(User.query.count(), 10)
+        self.assertEqual(Post.query.count(), 20)
+        self.assertEqual(Tag.query.count(), 10)
+
+    def test_zipf_rank_is_skewed(self):
+        """Low ranks should be drawn far more often than high ones"""
+
+        rng = random.Random(0)
+        counts = Counter(zipf_rank(rng, 1000) for _ in range(20000))
+
+        self.assertTrue(all(1 <= rank <= 1000 for rank in counts))
+        self.assertGreater(counts[1], 10 * counts[500])
+
+    def test_generated_values_fit_columns(self):
+        """Titles and tag names should fit their columns, which PostgreSQL
+        enforces"""
+
+        generate(users=5, posts=2000, tags=50, seed=3, batch_size=500)
+
+        longest_title = db.session.scalar(
+            db.select(db.func.max(db.func.length(Post.title))))
+        longest_tag = db.session.scalar(
+            db.select(db.func.max(db.func.length(Tag.name))))
+
+        self.assertLessEqual(longest_title, Post.title.type.length)
+        self.assertLessEqual(longest_tag, Tag.name.type.length)
@@ -0,0 +1,52 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+import tempfile
+from unittest import TestCase, mock
+
+from jinja2 import FileSystemBytecodeCache
+
+from app import app
+from template_cache import template_cache
+
+
+class TemplateCacheTestCase(TestCase):
+    """Test template precompilation and warm-up."""
+
+    def test_compile_all_fills_bytecode_cache(self):
+        """A new worker should load precompiled templates without compiling"""
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = FileSystemBytecodeCache(directory)
+
+            with mock.patch.object(app.jinja_env, 'bytecode_cache', cache):
+                names = template_cache.compile_all(app)
+
+            self.assertIn('base.html', names)
+            self.assertIn('user/detail.html', names)
+            self.assertEqual(len(os.listdir(directory)), len(names))
+
+            env = app.create_jinja_environment()
+            env.bytecode_cache = cache
+            with mock.patch.object(env, 'compile',
+                                   side_effect=AssertionError('compiled')):
+                env.get_template('user/detail.html')
+
+    def test_compile_all_needs_cache_dir(self):
+        """Without TEMPLATE_CACHE_DIR there is nowhere to compile to"""
+
+        with self.assertRaises(ValueError):
+            template_cache.compile_all(app)
+
+    def test_warm_up_loads_every_template(self):
+        """Warm-up should leave every template in the template cache"""
+
+        env = app.create_jinja_environment()
+
+        with mock.patch.object(app, 'jinja_env', env):
+            count = template_cache.warm_up(app)
+
+        self.assertEqual(count, len(template_cache.template_names(app)))
+        self.assertEqual(len(env.cache), count)
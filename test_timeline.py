@@ -0,0 +1,137 @@
+import os
+
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
+
+from datetime import datetime
+from unittest import mock
+
+from app import app, db
+from models import Post, User
+from testing import DatabaseTestCase, QueryCounter
+from timeline import Timeline, TimelineEntry, timeline
+
+
+class TimelineTestCase(DatabaseTestCase):
+    """Test the home page's latest posts timeline."""
+
+    def setUp(self):
+        """Add a user with an old post."""
+
+        super().setUp()
+
+        user = User(first_name='time', last_name='line', image_url='')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+        db.session.add(Post(title='old post', content='old',
+                            created_at=datetime(2020, 1, 1), user_id=user.id))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+
+    def test_home_page_follows_writes_without_queries(self):
+        """Writes should update the timeline in place; reads cost nothing"""
+
+        with app.test_client() as c:
+            self.assertIn('old post', c.get("/").get_data(as_text=True))
+
+            c.post(f"/users/{self.user_id}/posts/new",
+                   data={'title': 'new post', 'content': 'new', 'tags': ''})
+            post_id = Post.query.filter_by(title='new post').one().id
+            c.post(f"/posts/{post_id}/edit",
+                   data={'title': 'edited post', 'content': 'new',
+                         'tags': ''})
+            c.post(f"/users/{self.user_id}/edit",
+                   data={'first_name': 'renamed', 'last_name': 'author',
+                         'image_url': ''})
+
+            # shows (and so clears) the flashed messages
+            c.get("/")
+
+            with QueryCounter(db.engine) as counter:
+                resp = c.get("/")
+            html = resp.get_data(as_text=True)
+
+            self.assertEqual(counter.count, 0)
+            self.assertLess(html.index('edited post'), html.index('old post'))
+            self.assertIn('renamed author', html)
+
+            resp = c.get("/", headers={'If-None-Match': resp.headers['ETag']})
+            self.assertEqual(resp.status_code, 304)
+
+            c.post(f"/posts/{post_id}/delete")
+            html = c.get("/").get_data(as_text=True)
+            self.assertNotIn('edited post', html)
+
+            c.post(f"/users/{self.user_id}/delete")
+            html = c.get("/").get_data(as_text=True)
+            self.assertNotIn('old post', html)
+
+    def test_rebuilt_after_max_age(self):
+        """Posts written by another worker should show up once this
+        worker's copy is TIMELINE_MAX_AGE old"""
+
+        with app.test_client() as c:
+            c.get("/")
+
+            # straight to the database, as another process would
+            db.session.add(Post(title='elsewhere', content='x',
+                                user_id=self.user_id))
+            db.session.commit()
+            self.assertNotIn('elsewhere', c.get("/").get_data(as_text=True))
+
+            later = timeline._built_at + timeline.max_age
+            with mock.patch('timeline.time.monotonic', return_value=later):
+                html = c.get("/").get_data(as_text=True)
+            self.assertIn('elsewhere', html)
+
+    def test_ring_buffer(self):
+        """A full buffer drops its oldest entry; deletes past the spare
+        entries fall back to the database"""
+
+        ring = Timeline(size=2)
+        ring.rebuild([
+            TimelineEntry(post_id, f'post {post_id}',
+                          datetime(2024, 1, post_id), 1, 'a', 'b')
+            for post_id in (4, 3, 2, 1)])
+
+        ring.add(TimelineEntry(5, 'post 5', datetime(2024, 1, 5), 1, 'a', 'b'))
+        # older than everything kept
+        ring.add(TimelineEntry(9, 'post 9', datetime(2023, 1, 1), 1, 'a', 'b'))
+        self.assertEqual([entry.id for entry in ring.latest()], [5, 4])
+        self.assertEqual([entry.id for entry in ring._entries], [5, 4, 3, 2])
+
+        ring.remove(5)
+        ring.remove(4)
+        self.assertTrue(ring.built)
+        ring.remove(3)
+        self.assertFalse(ring.built)
+
+    def test_timeline_size(self):
+        """The home page should show only TIMELINE_SIZE posts"""
+
+        db.session.add_all([
+            Post(title=f'post {n}', content='x',
+                 created_at=datetime(2021, 1, n), user_id=self.user_id)
+            for n in range(1, 6)
+        ])
+        db.session.commit()
+
+        timeline.size = 3
+        timeline.clear()
+
+        try:
+            with app.test_client() as c:
+                html = c.get("/").get_data(as_text=True)
+        finally:
+            timeline.size = 20
+            timeline.clear()
+
+        self.assertIn('post 5', html)
+        self.assertIn('post 3', html)
+        self.assertNotIn('post 2', html)
+        self.assertNotIn('old post', html)
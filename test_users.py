@@ -1,11 +1,13 @@
 import os
 
-os.environ["DATABASE_URL"] = "postgresql:///blogly_test"
+os.environ.setdefault("TEST_DATABASE_URL", "postgresql:///blogly_test")
+os.environ["BLOGLY_CONFIG"] = "test"
 
-from unittest import TestCase
+from sqlalchemy.orm import Session
 
 from app import app, db
-from models import  User
+from models import  Post, User, touch
+from testing import DatabaseTestCase
 # from models import  DEFAULT_IMAGE_URL
 
 
@@ -15,23 +17,13 @@ app.config['TESTING'] = True
 # This is a bit of hack, but don't use Flask DebugToolbar
 app.config['DEBUG_TB_HOSTS'] = ['dont-show-debug-toolbar']
 
-# Create our tables (we do this here, so we only create the tables
-# once for all tests --- in each test, we'll delete the data
-# and create fresh new clean test data
-
-db.drop_all()
-db.create_all()
-
-class UsersTestCase(TestCase):
+class UsersTestCase(DatabaseTestCase):
     """Test views for users."""
 
     def setUp(self):
         """Create test client, add sample data."""
 
-        # As you add more models later in the exercise, you'll want to delete
-        # all of their records before each test just as we're doing with the
-        # User model below.
-        User.query.delete()
+        super().setUp()
 
         self.user_1_first_name = "test1_first"
         self.user_1_last_name = "test1_last"
@@ -228,4 +220,171 @@ class UsersTestCase(TestCase):
             self.assertNotIn(self.user_1_last_name, html)
 
             resp = c.post("/users/9999999999/delete")
-            self.assertEqual(resp.status_code, 404)
\ No newline at end of file
+            self.assertEqual(resp.status_code, 404)
+
+    def test_list_users_paginated(self):
+        """Listing should page through users with next/prev cursors"""
+
+        app.config['USERS_PER_PAGE'] = 1
+
+        try:
+            with app.test_client() as c:
+                resp = c.get("/users")
+                html = resp.get_data(as_text=True)
+
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn(self.user_1_first_name, html)
+                self.assertNotIn(self.user_2_first_name, html)
+                self.assertIn(f'/users?after={self.user_1_id}', html)
+
+                resp = c.get(f"/users?after={self.user_1_id}")
+                html = resp.get_data(as_text=True)
+
+                self.assertEqual(resp.status_code, 200)
+                self.assertIn(self.user_2_first_name, html)
+                self.assertNotIn(self.user_1_first_name, html)
+                self.assertIn(f'/users?before={self.user_2_id}', html)
+                self.assertNotIn('/users?after=', html)
+
+                resp = c.get(f"/users?before={self.user_2_id}")
+                html = resp.get_data(as_text=True)
+
+                self.assertIn(self.user_1_first_name, html)
+                self.assertNotIn(self.user_2_first_name, html)
+                self.assertNotIn('/users?before=', html)
+        finally:
+            app.config['USERS_PER_PAGE'] = 50
+
+    def test_list_users_empty_page_not_cached_as_first(self):
+        """An empty ?after= page mustn't be served for the first page"""
+
+        with app.test_client() as c:
+            for empty, first in (
+                    ("/users?after=99999999", "/users"),
+                    ("/users?sort=popular&after=0_0",
+                     "/users?sort=popular")):
+                html = c.get(empty).get_data(as_text=True)
+                self.assertNotIn(self.user_1_first_name, html)
+
+                html = c.get(first).get_data(as_text=True)
+                self.assertIn(self.user_1_first_name, html)
+                self.assertIn(self.user_2_first_name, html)
+
+    def test_list_users_by_popularity(self):
+        """sort=popular should page users by post_count, most first"""
+
+        db.session.add_all([
+            Post(title='one', content='one', user_id=self.user_2_id),
+            Post(title='two', content='two', user_id=self.user_2_id),
+        ])
+        db.session.commit()
+        User.recount_posts()
+        db.session.commit()
+
+        app.config['USERS_PER_PAGE'] = 1
+
+        try:
+            with app.test_client() as c:
+                resp = c.get("/users?sort=popular")
+                html = resp.get_data(as_text=True)
+
+                self.assertIn(self.user_2_first_name, html)
+                self.assertIn('(2 posts)', html)
+                self.assertNotIn(self.user_1_first_name, html)
+                self.assertIn(
+                    f'/users?sort=popular&amp;after=2_{self.user_2_id}', html)
+
+                resp = c.get(f"/users?sort=popular&after=2_{self.user_2_id}")
+                html = resp.get_data(as_text=True)
+
+                self.assertIn(self.user_1_first_name, html)
+                self.assertIn('(0 posts)', html)
+                self.assertNotIn(self.user_2_first_name, html)
+        finally:
+            app.config['USERS_PER_PAGE'] = 50
+
+    def test_list_users_skips_orm_hydration(self):
+        """Listing should read projected rows, not identity-mapped Users"""
+
+        db.session.expunge_all()
+
+        with app.test_client() as c:
+            resp = c.get("/users")
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(any(
+                isinstance(obj, User)
+                for obj in db.session.identity_map.values()))
+
+    def test_user_page_cache_invalidated_by_edit(self):
+        """Cached user page should refresh after an edit and keep flashes"""
+
+        with app.test_client() as c:
+            resp = c.get(f"/users/{self.user_1_id}")
+            self.assertIn(self.user_1_first_name, resp.get_data(as_text=True))
+
+            resp = c.post(
+                f"/users/{self.user_1_id}/edit",
+                data={
+                    'first_name': 'cached first',
+                    'last_name': self.user_1_last_name,
+                    'image_url': ''
+                },
+                follow_redirects=True)
+            html = resp.get_data(as_text=True)
+
+            self.assertIn('cached first', html)
+            self.assertIn('User successfully edited!', html)
+
+            resp = c.get(f"/users/{self.user_1_id}")
+            html = resp.get_data(as_text=True)
+
+            self.assertIn('cached first', html)
+            self.assertNotIn('User successfully edited!', html)
+
+    def test_list_users_conditional_get(self):
+        """Listing should 304 until a user is added"""
+
+        with app.test_client() as c:
+            resp = c.get("/users")
+            etag = resp.headers['ETag']
+
+            resp = c.get("/users", headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 304)
+
+            resp = c.post(
+                "/users/new",
+                data={
+                    'first_name': 'etag',
+                    'last_name': 'user',
+                    'image_url': ''
+                },
+                follow_redirects=True)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('User successfully added!', resp.get_data(as_text=True))
+            self.assertNotIn('ETag', resp.headers)
+
+            resp = c.get("/users", headers={'If-None-Match': etag})
+            self.assertEqual(resp.status_code, 200)
+
+    def test_overlapping_writers_both_count(self):
+        """Two sessions bumping the same user should both succeed"""
+
+        # joining the test's transaction rather than committing it
+        sessions = [
+            Session(self.connection, join_transaction_mode='rollback_only')
+            for _ in range(2)]
+        for session in sessions:
+            self.addCleanup(session.close)
+
+        # both load version 1 before either writes, as two requests would
+        users = [session.get(User, self.user_1_id) for session in sessions]
+        for session, user in zip(sessions, users):
+            touch(user)
+            user.post_count = User.post_count + 1
+            session.commit()
+
+        db.session.expire_all()
+        user = db.session.get(User, self.user_1_id)
+        self.assertEqual(user.post_count, 2)
+        self.assertEqual(user.version, 3)
@@ -0,0 +1,170 @@
+"""Helpers shared by the Blogly test suites.
+
+Run the suites with `pytest`, or across processes with `pytest -n auto`
+(pytest-xdist; each worker gets its own database). They use
+postgresql:///blogly_test unless TEST_DATABASE_URL says otherwise, e.g.
+TEST_DATABASE_URL=sqlite:////tmp/blogly_test.db to run without PostgreSQL.
+"""
+
+from contextlib import contextmanager
+from unittest import TestCase
+
+from sqlalchemy import create_engine, event, text
+
+from cache import page_cache
+from config import TestConfig
+from models import db
+from search import search_index
+from tagging import tag_cache
+from timeline import timeline
+
+_schema_ready = False
+
+# for requests to operator-only routes (see admin.py)
+ADMIN_HEADERS = {'Authorization': f'Bearer {TestConfig.ADMIN_TOKEN}'}
+
+
+# savepoint bookkeeping, e.g. from DatabaseTestCase, isn't a query
+SAVEPOINT_PREFIXES = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryCounter:
+    """Record every SQL statement the engine executes while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context,
+                executemany):
+        if not statement.startswith(SAVEPOINT_PREFIXES):
+            self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+class QueryCountMixin:
+    """TestCase mixin for asserting a route's SQL statement budget."""
+
+    @contextmanager
+    def assertMaxQueries(self, max_count):
+        """Fail if the block runs more than `max_count` SQL statements."""
+
+        with QueryCounter(db.engine) as counter:
+            yield counter
+
+        if counter.count > max_count:
+            self.fail(
+                f"{counter.count} queries executed, expected at most "
+                f"{max_count}:\n" + "\n".join(counter.statements))
+
+
+def create_database(url):
+    """Create the PostgreSQL database `url` names, if it doesn't exist."""
+
+    if url.get_backend_name() != 'postgresql':
+        return
+
+    server = create_engine(
+        url.set(database='postgres'), isolation_level='AUTOCOMMIT')
+    try:
+        with server.connect() as conn:
+            exists = conn.scalar(
+                text('SELECT 1 FROM pg_database WHERE datname = :name'),
+                {'name': url.database})
+            if not exists:
+                conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+    finally:
+        server.dispose()
+
+
+def _use_sqlite_savepoints(engine):
+    """Let pysqlite nest SAVEPOINTs inside an explicit outer transaction.
+
+    By default pysqlite only opens transactions lazily before DML, so a
+    SAVEPOINT issued first would start (and its RELEASE commit) a real
+    transaction. Hand transaction control to SQLAlchemy instead.
+    """
+
+    @event.listens_for(engine, 'connect')
+    def _no_implicit_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def _explicit_begin(conn):
+        conn.exec_driver_sql('BEGIN')
+
+    # connections made before the listeners existed lack the setting
+    engine.dispose()
+
+
+def ensure_schema():
+    """Create the test database and schema once per process."""
+
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    create_database(db.engine.url)
+    if db.engine.dialect.name == 'sqlite':
+        _use_sqlite_savepoints(db.engine)
+
+    db.drop_all()
+    db.create_all()
+    _schema_ready = True
+
+
+def reset_caches():
+    """Forget in-process state derived from the database."""
+
+    page_cache.clear()
+    tag_cache.clear()
+    search_index.built = False
+    timeline.clear()
+
+
+class DatabaseTestCase(TestCase):
+    """TestCase running every test inside a transaction that is rolled back.
+
+    The schema is created once per process, not per module or test. Each
+    test gets its own connection and outer transaction, and the session
+    joins it through savepoints: code under test can commit and roll back
+    as usual, yet every test starts from empty tables and leaves nothing
+    behind, with no per-test DELETEs. Tests wanting sessions of their own,
+    e.g. to interleave writers, can bind them to `self.connection`.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ensure_schema()
+
+    def setUp(self):
+        super().setUp()
+
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        self.connection = connection
+
+        db.session.remove()
+        db.session.configure(
+            bind=connection, join_transaction_mode='create_savepoint')
+        reset_caches()
+
+        self.addCleanup(self._end_transaction, connection, transaction)
+
+    def _end_transaction(self, connection, transaction):
+        db.session.remove()
+        db.session.configure(
+            bind=None, join_transaction_mode='conditional_savepoint')
+        transaction.rollback()
+        connection.close()
@@ -0,0 +1,189 @@
+"""The home page's "latest posts" timeline.
+
+The newest posts (with their authors' names) are kept in an in-process ring
+buffer, built from the (created_at, id) index on the first read, or at
+startup with TIMELINE_PRELOAD, and then kept current by the post and user
+write routes, so serving the timeline runs no queries.
+
+The buffer holds twice the TIMELINE_SIZE posts shown, so deletes can eat
+into the spare ones; once they drop below what the page needs while older
+posts may exist, the next read rebuilds it from the database. Like the
+in-memory search index, each process has its own copy, and writes made
+through other processes don't reach it: a buffer older than
+TIMELINE_MAX_AGE seconds is rebuilt on the next read, which bounds how stale
+another worker's home page can be.
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+import sqlalchemy as sa
+
+from models import db, Post, User
+
+log = logging.getLogger(__name__)
+
+TimelineEntry = namedtuple(
+    'TimelineEntry',
+    ('id', 'title', 'created_at', 'user_id', 'first_name', 'last_name'))
+
+
+def _order(entry):
+    return entry.created_at, entry.id
+
+
+class Timeline:
+    """Bounded newest-first buffer of TimelineEntry rows."""
+
+    def __init__(self, size=20):
+        self._lock = threading.RLock()
+        self.size = size
+        self.max_age = None
+        self.built = False
+        self._built_at = 0
+        self._entries = deque(maxlen=2 * size)
+        # whether the database may hold posts older than the oldest entry
+        self._truncated = False
+
+    def init_app(self, app):
+        """Configure from TIMELINE_* settings; build now if asked to."""
+
+        self.size = app.config.get('TIMELINE_SIZE', 20)
+        self.max_age = app.config.get('TIMELINE_MAX_AGE')
+        self.clear()
+
+        if app.config.get('TIMELINE_PRELOAD'):
+            with app.app_context():
+                try:
+                    ensure_timeline_built()
+                except sa.exc.DBAPIError:
+                    # e.g. no tables yet; the first read builds it instead
+                    log.warning("Could not preload the timeline",
+                                exc_info=True)
+                finally:
+                    db.session.remove()
+
+    def clear(self):
+        """Drop the contents; the next read rebuilds from the database."""
+
+        with self._lock:
+            self._entries = deque(maxlen=2 * self.size)
+            self._truncated = False
+            self.built = False
+
+    def rebuild(self, rows):
+        """Replace the contents with TimelineEntry-shaped `rows`, newest
+        first, as many as the buffer holds."""
+
+        with self._lock:
+            self._entries = deque(
+                (TimelineEntry(*row) for row in rows), maxlen=2 * self.size)
+            self._truncated = len(self._entries) == self._entries.maxlen
+            self._built_at = time.monotonic()
+            self.built = True
+
+    def current(self):
+        """True if built, and built less than `max_age` seconds ago."""
+
+        return self.built and (
+            not self.max_age
+            or time.monotonic() - self._built_at < self.max_age)
+
+    def latest(self):
+        """The newest TIMELINE_SIZE entries."""
+
+        with self._lock:
+            return list(self._entries)[:self.size]
+
+    def add(self, entry):
+        """Insert a new post in created_at order."""
+
+        with self._lock:
+            if not self.built:
+                return
+
+            entries = self._entries
+            if len(entries) == entries.maxlen:
+                if _order(entry) < _order(entries[-1]):
+                    return
+                # the ring is full: the oldest entry falls off the end
+                entries.pop()
+                self._truncated = True
+
+            position = 0
+            while (position < len(entries)
+                   and _order(entries[position]) > _order(entry)):
+                position += 1
+            entries.insert(position, entry)
+
+    def update(self, post_id, title):
+        """Retitle a post, if it's in the buffer."""
+
+        self._replace(
+            lambda entry: entry.id == post_id,
+            lambda entry: entry._replace(title=title))
+
+    def rename_user(self, user_id, first_name, last_name):
+        """Update an author's name on their entries."""
+
+        self._replace(
+            lambda entry: entry.user_id == user_id,
+            lambda entry: entry._replace(
+                first_name=first_name, last_name=last_name))
+
+    def remove(self, post_id):
+        self._discard(lambda entry: entry.id == post_id)
+
+    def remove_user(self, user_id):
+        self._discard(lambda entry: entry.user_id == user_id)
+
+    def _replace(self, matches, change):
+        with self._lock:
+            self._entries = deque(
+                (change(entry) if matches(entry) else entry
+                 for entry in self._entries),
+                maxlen=self._entries.maxlen)
+
+    def _discard(self, matches):
+        with self._lock:
+            if not self.built:
+                return
+
+            self._entries = deque(
+                (entry for entry in self._entries if not matches(entry)),
+                maxlen=self._entries.maxlen)
+
+            if self._truncated and len(self._entries) < self.size:
+                # not enough left to fill the page: reload on next read
+                self.built = False
+
+
+timeline = Timeline()
+
+
+def ensure_timeline_built():
+    """Load the newest posts into the timeline if it isn't built, or is
+    older than TIMELINE_MAX_AGE."""
+
+    if timeline.current():
+        return
+
+    with timeline._lock:
+        if not timeline.current():
+            timeline.rebuild(db.session.execute(
+                db.select(
+                    Post.id, Post.title, Post.created_at, Post.user_id,
+                    User.first_name, User.last_name)
+                .join(Post.user)
+                .order_by(Post.created_at.desc(), Post.id.desc())
+                .limit(2 * timeline.size)))
+
+
+def latest_posts():
+    """The timeline's entries, newest first; the database fallback runs
+    only when the buffer needs (re)building."""
+
+    ensure_timeline_built()
+    return timeline.latest()